@@ -0,0 +1,64 @@
+"""
+Compares the accuracy and the wall-clock cost of the ODE solvers in gncgym.simulator.solvers, for the models in
+gncgym.models. Each model is driven open loop with the same input sequence, starting from the same state, and
+the final state is compared against a reference solution computed with a tight dopri5.
+
+Run from the repository root:
+    python benchmarks/solvers.py
+"""
+import time
+import numpy as np
+import gncgym.simulator as sim
+from gncgym.models.supplyship3DOF import SupplyShip3DOF
+from gncgym.models.auv import AUV2D
+
+DURATION = 60.0
+SOLVERS = ('fixed_step', 'semi_implicit_euler', 'rk4', 'dopri5')
+STEP_SIZES = (0.05, 0.1, 0.25, 0.5)
+HOLD = max(STEP_SIZES)
+
+
+def inputs(t):
+    """
+    Full thrust with a slow rudder sweep, so that the yaw and sway dynamics are excited. The input is held
+    constant over intervals of the largest step size, so every solver sees exactly the same input signal.
+    """
+    t = HOLD * np.floor(t / HOLD + 1e-9)
+    return np.array([1.0, 0.8 * np.sin(0.2 * t)])
+
+
+def simulate(model_cls, solver, step_size, **options):
+    model = model_cls()
+    model.sim_context = sim.SimContext(solver=solver, step_size=step_size, **options)
+    model.reset_model([0, 0, 0, 1, 0, 0])
+    n = int(round(DURATION / step_size))
+
+    start = time.perf_counter()
+    for i in range(n):
+        state = model.step_model(inputs(i * step_size))
+    elapsed = time.perf_counter() - start
+    return np.array(state, dtype=float).flatten(), elapsed
+
+
+def position_error(state, reference):
+    return float(np.hypot(state[0] - reference[0], state[1] - reference[1]))
+
+
+def main():
+    for model_cls in (SupplyShip3DOF, AUV2D):
+        reference, _ = simulate(model_cls, 'dopri5', 0.01, rtol=1e-10, atol=1e-10)
+        print('\n{} ({:.0f} s simulated)'.format(model_cls.__name__, DURATION))
+        print('{:<20} {:>8} {:>16} {:>14}'.format('solver', 'dt [s]', 'pos. error [m]', 'wall time [ms]'))
+        for solver in SOLVERS:
+            for step_size in STEP_SIZES:
+                try:
+                    state, elapsed = simulate(model_cls, solver, step_size)
+                    error = position_error(state, reference)
+                except (FloatingPointError, OverflowError, RuntimeError):
+                    error, elapsed = float('nan'), float('nan')
+                print('{:<20} {:>8.2f} {:>16.3e} {:>14.2f}'.format(solver, step_size, error, 1000 * elapsed))
+
+
+if __name__ == '__main__':
+    with np.errstate(all='raise'):
+        main()
@@ -0,0 +1,64 @@
+"""
+Compares the throughput of stepping N path following envs in a Python loop over BaseScenario.step() against
+stepping the same envs with VectorScenario and with SubprocVectorScenario, for a few values of N.
+
+Run from the repository root:
+    python benchmarks/vector.py
+"""
+import time
+import numpy as np
+from gncgym.base_env.vector import VectorScenario
+from gncgym.base_env.subproc import SubprocVectorScenario
+from gncgym.scenarios.example_scenarios import ExampleScenario
+
+NUM_ENVS = (1, 8, 64)
+STEPS = 200
+
+
+def loop_steps_per_second(num_envs):
+    envs = [ExampleScenario(headless=True) for _ in range(num_envs)]
+    for i, env in enumerate(envs):
+        env.seed(i)
+        env.reset()
+    action = np.array([1, 0.1])
+
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        for env in envs:
+            _, _, done, _ = env.step(action)
+            if done:
+                env.reset()
+    return num_envs * STEPS / (time.perf_counter() - start)
+
+
+def vector_steps_per_second(num_envs):
+    vec = VectorScenario(ExampleScenario, num_envs, seed=0)
+    vec.reset()
+    actions = np.tile([1, 0.1], (num_envs, 1))
+
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        vec.step(actions)
+    return num_envs * STEPS / (time.perf_counter() - start)
+
+
+def subproc_steps_per_second(num_envs):
+    vec = SubprocVectorScenario(ExampleScenario, num_envs, seed=0)
+    vec.reset()
+    actions = np.tile([1, 0.1], (num_envs, 1))
+
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        vec.step(actions)
+    result = num_envs * STEPS / (time.perf_counter() - start)
+    vec.close()
+    return result
+
+
+if __name__ == '__main__':
+    print('{:>6} {:>14} {:>14} {:>15}'.format('envs', 'loop steps/s', 'vector steps/s', 'subproc steps/s'))
+    for n in NUM_ENVS:
+        loop = loop_steps_per_second(n)
+        vector = vector_steps_per_second(n)
+        subproc = subproc_steps_per_second(n)
+        print('{:>6} {:>14.0f} {:>14.0f} {:>15.0f}'.format(n, loop, vector, subproc))
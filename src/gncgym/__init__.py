@@ -2,53 +2,31 @@ from gym.envs.registration import register
 from gym.error import Error as GymError
 import gncgym.scenarios as scenarios
 from .base_env.base import BaseScenario
+from .base_env.vector import VectorScenario
+from .base_env.subproc import SubprocVectorScenario
 
 
 """
 Wrap in a try-catch block because gym complains about re-registering 
-environments when running tests.
+environments when running tests. Every scenario is also registered with a Headless suffix, e.g.
+shipExampleScenarioHeadless-v0, which creates the env with headless=True.
 """
-try:
-    register(
-        id='shipExampleScenario-v0',
-        entry_point='gncgym.scenarios.example_scenarios:ExampleScenario',
-    )
-
-    register(
-        id='shipStraightPathFollowing-v0',
-        entry_point='gncgym.scenarios.example_scenarios:StraightPathScenario',
-    )
-
-    register(
-        id='shipCurvedPathFollowing-v0',
-        entry_point='gncgym.scenarios.example_scenarios:CurvedPathScenario',
-    )
-
-    register(
-        id='shipStraightPathFollowingWithOvertaking-v0',
-        entry_point='gncgym.scenarios.example_scenarios:StraightPathOvertakingScenario',
-    )
-
-    register(
-        id='shipCurvedPathFollowingWithOvertaking-v0',
-        entry_point='gncgym.scenarios.example_scenarios:CurvedPathOvertakingScenario',
-    )
+SCENARIOS = {
+    'shipExampleScenario': 'ExampleScenario',
+    'shipStraightPathFollowing': 'StraightPathScenario',
+    'shipCurvedPathFollowing': 'CurvedPathScenario',
+    'shipStraightPathFollowingWithOvertaking': 'StraightPathOvertakingScenario',
+    'shipCurvedPathFollowingWithOvertaking': 'CurvedPathOvertakingScenario',
+    'shipCurvedPathFollowingWithShipCollision': 'CurvedPathShipCollisionScenario',
+    'shipCurvedPathStaticObstacles': 'CurvedPathStaticObstacles',
+    'shipCurvedPathStaticDynamicObstacles': 'CurvedPathStaticDynamicObstacles',
+}
 
-    register(
-        id='shipCurvedPathFollowingWithShipCollision-v0',
-        entry_point='gncgym.scenarios.example_scenarios:CurvedPathShipCollisionScenario',
-    )
-
-    register(
-        id='shipCurvedPathStaticObstacles-v0',
-        entry_point='gncgym.scenarios.example_scenarios:CurvedPathStaticObstacles',
-    )
-
-    register(
-        id='shipCurvedPathStaticDynamicObstacles-v0',
-        entry_point='gncgym.scenarios.example_scenarios:CurvedPathStaticDynamicObstacles',
-    )
+try:
+    for name, cls in SCENARIOS.items():
+        entry_point = 'gncgym.scenarios.example_scenarios:' + cls
+        register(id=name + '-v0', entry_point=entry_point)
+        register(id=name + 'Headless-v0', entry_point=entry_point, kwargs={'headless': True})
 
 except GymError as e:
     print(e)
-
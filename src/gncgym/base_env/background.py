@@ -0,0 +1,78 @@
+import functools
+import numpy as np
+
+"""
+Procedural ocean background, drawn behind the scenario so that it is possible to see that the vessel is moving.
+
+The texture is a small tile of randomly shaded squares that is repeated over the whole playfield by the GPU, so only
+the tile has to be generated and uploaded. Tiles are generated with a single vectorised NumPy expression and cached,
+and the env's RNG only picks which of the TILE_VARIANTS cached tiles is used, so creating an env that renders costs
+next to nothing after the first one in the process.
+"""
+
+TILE_SIZE = 256                 # Size of the tile in pixels (and world units), a power of two for the texture
+CELL_SIZE = 16                  # Size of the shaded squares in pixels
+TILE_VARIANTS = 8               # Number of different tiles that the envs choose from
+BASE_COLOR = (0.3, 0.7, 0.8)    # Mean colour of the ocean
+COLOR_NOISE = 0.025             # Amplitude of the random shading of the squares
+
+
+@functools.lru_cache(maxsize=TILE_VARIANTS)
+def make_tile(variant=0, size=TILE_SIZE, cell_size=CELL_SIZE):
+    """
+    :param variant: Seed of the tile
+    :return: (size, size, 3) read-only uint8 array of RGB values
+    """
+    cells = size // cell_size
+    rng = np.random.RandomState(variant)
+    colors = np.minimum(1.0, np.array(BASE_COLOR) + COLOR_NOISE * (rng.random_sample((cells, cells, 3)) - 0.5))
+    tile = np.repeat(np.repeat((255 * colors).astype(np.uint8), cell_size, axis=0), cell_size, axis=1)
+    tile.flags.writeable = False
+    return tile
+
+
+def choose_variant(rng):
+    """
+    Picks a tile with rng and restores its state afterwards, so that the random numbers used to generate the
+    scenario are not affected.
+    """
+    state = rng.get_state()
+    variant = rng.randint(TILE_VARIANTS)
+    rng.set_state(state)
+    return int(variant)
+
+
+class Background:
+    """A tile repeated over the square [-extent, extent]^2, drawn as a single textured quad."""
+    def __init__(self, tile, extent):
+        import pyglet
+        from pyglet import gl
+
+        h, w, _ = tile.shape
+        image = pyglet.image.ImageData(w, h, 'RGB', np.ascontiguousarray(tile[::-1]).tobytes(), pitch=3 * w)
+        self.texture = image.get_texture()
+        gl.glBindTexture(self.texture.target, self.texture.id)
+        gl.glTexParameteri(self.texture.target, gl.GL_TEXTURE_WRAP_S, gl.GL_REPEAT)
+        gl.glTexParameteri(self.texture.target, gl.GL_TEXTURE_WRAP_T, gl.GL_REPEAT)
+        gl.glTexParameteri(self.texture.target, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+        gl.glBindTexture(self.texture.target, 0)
+
+        # Texture coordinates beyond 1 repeat the tile
+        ru, rv = 2 * extent / w, 2 * extent / h
+        self.vertex_list = pyglet.graphics.vertex_list(
+            4,
+            ('v2f', (-extent, -extent, extent, -extent, extent, extent, -extent, extent)),
+            ('t2f', (0, 0, ru, 0, ru, rv, 0, rv)))
+
+    def draw(self):
+        from pyglet import gl
+        gl.glColor4f(1, 1, 1, 1)
+        gl.glEnable(self.texture.target)
+        gl.glBindTexture(self.texture.target, self.texture.id)
+        self.vertex_list.draw(gl.GL_QUADS)
+        gl.glBindTexture(self.texture.target, 0)
+        gl.glDisable(self.texture.target)
+
+    def delete(self):
+        self.vertex_list.delete()
+        self.texture.delete()
@@ -1,26 +1,24 @@
-import os
 import gym
 import numpy as np
-import pyglet
-from pyglet import gl
 from gym import spaces
 from numpy import pi, sin, cos, arctan2
 from collections import namedtuple
 
 from gncgym import simulator as sim
 from gncgym.definitions import State6DOF, EnvSnapshot, ModuleSnapshot
-from . import rendering
-from .objects import Vessel2D # , MAX_SURGE
+from .objects import Vessel2D, make_hull # , MAX_SURGE
+from .background import Background, make_tile, choose_variant
+from .raster import Rasteriser, Scene
+from .history import EnvHistory
 from gncgym.utils import distance, rotate, angwrap
+from gncgym.collision import Body
 from gym.utils import seeding, EzPickle
 
 from types import SimpleNamespace
-from numpy.random import random
-
-from .indicators import Dashboard, VerticalIndicator, TextLabel, ObstacleVectorsIndicator
 
 """
-    
+pyglet and the rendering modules are only imported when the first viewer is created, so that headless envs can be
+created and stepped on machines without a display, and without the cost of loading OpenGL.
 """
 
 # TODO make window resizable
@@ -44,6 +42,8 @@ LOS_DISTANCE = 75
 OBST_RANGE = 150
 OBST_PENALTY = 25
 DETECTED_OBST_COLOR = (0.1, 0.7, 0.2)
+VESSEL_COLOR = (0.6, 0.6, 0.6)
+VESSEL_HULL = make_hull(4)
 
 # TODO Try alternative observation methods
 NR = 0  # Number of elements in reference obs
@@ -64,26 +64,89 @@ else:
     OBS_SPACE = np.concatenate([STATE_SPACE, STATIC_OBST_SPACE, DYNAMIC_OBST_SPACE], axis=1)
 
 
+# Numeric state of an env, saved by BaseScenario.get_state(). values is a flat array of the parts in STATE_PARTS, whose
+# lengths are given by sizes, and episode is the episode that the state was saved in.
+EnvState = namedtuple('EnvState', ['episode', 'sizes', 'values'])
+STATE_PARTS = ('time', 'model', 'action', 'obs', 'objective', 'objects', 'rng')
+
+
+def camera_zoom(t):
+    """Zoom of the camera at time t, which zooms in during the first second."""
+    return 0.1 * SCALE * max(1 - t, 0) + ZOOM * SCALE * min(t, 1)
+
+
+def apply_camera(transform, camera):
+    """Sets a rendering.Transform so that the camera (x, y, angle, zoom) is centred in the window."""
+    x, y, angle, zoom = camera
+    transform.set_scale(zoom, zoom)
+    transform.set_translation(
+        WINDOW_W/2 - (x*zoom*cos(angle) - y*zoom*sin(angle)),
+        WINDOW_H/2 - (x*zoom*sin(angle) + y*zoom*cos(angle))
+    )
+    transform.set_rotation(angle)
+
+
+def make_indicators(reward_fn, surge_fn):
+    """The obstacle indicator and the list of other indicators drawn below the scene, shared with RemoteViewer."""
+    from .indicators import Dashboard, VerticalIndicator, TextLabel, ObstacleVectorsIndicator
+
+    # TODO Fix scaling issues, need max surge
+    obs_indicator = ObstacleVectorsIndicator(position=(20 * s, h), dim=(s, h), veclen=1)
+    indicators = [
+        Dashboard(width=WINDOW_W, height=h),
+        TextLabel((20, WINDOW_H * 2.5 / 40.00), fontsize=36,
+                  color=(255, 255, 255, 255), val_fn=reward_fn),
+        VerticalIndicator(position=(s * 14, 1.6 * h),
+                          dim=(1.5 * s, 1.5 * h),
+                          val_range=(0, 1),
+                          goal_val=4,
+                          color_range=((0, 0.6, 0.1), (1, 0.6, 0.1)),
+                          val_fn=surge_fn)]
+    return obs_indicator, indicators
+
+
 class BaseScenario(gym.Env, EzPickle):
     """BaseShipScenario"""
 
     """Default values"""
     sim_t = 0                       # Time
+    sim_context = None              # SimContext owned by this env, holds the clock and the blocks of the simulation
+    sim_solver = 'fixed_step'       # ODE solver used by the model, see SimContext.init() for the options
+    sim_step_size = 0.05            # Time step of the simulation
     bg = None                       # Background
+    background_variant = None       # Tile of the background, see background.choose_variant()
     objective = SimpleNamespace()   # Namespace for variables related to the objective
     viewer = None                   # Renderer, draw shapes
     last_obs = None                 # Last observation made
+    last_state = None               # Last state of the model
+    last_action = None              # Last input to the model
+    camera_angle = 0.0              # Rotation of the view, set from the initial heading of the vessel
     np_random = None                # Random number generator used for generation, ensures reproducibility with seed()
     objects = []                    # Contains objects in the environment
     vessel = None                   # Object for visualising the model state
     indicators = []                 # List of Indicators that display custom information
     base_initialised = False        # Flag to check that the user initialises the env using env.reset()
+    episode = 0                     # Number of times the env has been reset
+    headless = False                # If True, nothing is drawn and pyglet is never imported
+    human_render = False            # Set when the env has been rendered in a window with mode='human'
+    async_readback = False          # render('rgb_array') returns the previous frame, see flush_frame()
+    snapshots = None                # SnapshotPublisher, set by publish_snapshots()
+    history = None                  # EnvHistory, set by record_history()
 
     metadata = {
         'render.modes': ['human', 'rgb_array', 'state_pixels'],
         'video.frames_per_second': FPS
     }
 
+    def __init__(self, headless=False):
+        """
+        :param headless: Skip the viewer, indicators, background and the drawing state of the vessel. The env then
+                         can't be rendered, but returns the same observations and rewards.
+        """
+        EzPickle.__init__(self, headless=headless)
+        self.headless = headless
+        self._rasterisers = {}      # Software rasterisers for pixel observations, by render mode
+
     """
     ### User defined functions ###
     
@@ -115,6 +178,27 @@ class BaseScenario(gym.Env, EzPickle):
     def render_objective(self, namespace, viewer):
         raise NotImplementedError
 
+    def get_objective_state(self, namespace):
+        """
+        Optional, the values of the objective that change during an episode, saved by get_state(). Defaults to all
+        of the int and float attributes of the namespace.
+        """
+        return [v for _, v in sorted(vars(namespace).items()) if isinstance(v, (int, float))]
+
+    def set_objective_state(self, namespace, values):
+        """Optional, restores the values returned by get_objective_state()."""
+        keys = [k for k, v in sorted(vars(namespace).items()) if isinstance(v, (int, float))]
+        for k, v in zip(keys, values):
+            setattr(namespace, k, float(v))
+
+    def raster_objective(self, namespace, scene):
+        """Optional, adds the objective to a Scene for the software rasteriser, like render_objective()."""
+        pass
+
+    def snapshot_objective(self, namespace, snapshot):
+        """Optional, writes the path and marker drawn by RemoteViewer into a snapshot, see remote.SNAPSHOT_DTYPE."""
+        pass
+
     def navigate(self, state):
         pass
 
@@ -137,9 +221,12 @@ class BaseScenario(gym.Env, EzPickle):
         self.model_init(initial_state)
         :return:
         """
-        sim.init(
-            solver='fixed_step',
-            step_size=0.05,
+        if self.sim_context is None:
+            self.sim_context = sim.SimContext()
+
+        self.sim_context.init(
+            solver=self.sim_solver,
+            step_size=self.sim_step_size,
         )
 
         if self.np_random is None:
@@ -148,8 +235,10 @@ class BaseScenario(gym.Env, EzPickle):
         # Generate scenario using the seeded RNG
         # self.generate(self.np_random)
 
-        # Initialise the objective
-        action = np.zeros(self._model_input_space.shape)
+        # Initialise the objective in a fresh namespace, so that envs don't share objective variables
+        self.objective = SimpleNamespace()
+        self.episode += 1
+        action = np.zeros(self.model_specs.input_shape)
         initial_state = self.reset_objective(self.objective, self.np_random)
 
         # Initialise the model and get initial observation
@@ -157,32 +246,32 @@ class BaseScenario(gym.Env, EzPickle):
         state = self._model(action)
         state_est = self.navigate(state)
         self.last_obs, _, _ = self.eval_objective(self.objective, action, state_est, state)
+        self.last_state = state
+        self.last_action = action
+        self.camera_angle = -float(state.yaw)
+        if self.background_variant is None:
+            self.background_variant = choose_variant(self.np_random)
+
+        self.base_initialised = True
+        if self.snapshots is not None:
+            self.snapshots.publish(self, reset=True)
+        if self.history is not None:
+            self.history.add(self, reset=True)
+        if self.headless:
+            return self.last_obs
 
         # Create Vessel object for drawing
         self.vessel = Vessel2D(state)
-
-        # Create indicators
-        # TODO Fix scaling issues, need max surge 
-        self.obs_indicator = ObstacleVectorsIndicator(position=(20 * s, h), dim=(s, h), veclen=1)
-        self.indicators = [
-            Dashboard(width=WINDOW_W, height=h),
-            TextLabel((20, WINDOW_H * 2.5 / 40.00), fontsize=36,
-                      color=(255, 255, 255, 255), val_fn=lambda: self.objective.reward),
-            VerticalIndicator(position=(s * 14, 1.6 * h),
-                              dim=(1.5 * s, 1.5 * h),
-                              val_range=(0, 1),
-                              goal_val=4,
-                              color_range=((0, 0.6, 0.1), (1, 0.6, 0.1)),
-                              val_fn=lambda: self.vessel.state.surge)]
+        self._init_indicators()
 
         # One time setups
         if self.viewer is None:
             self._init_viewer()
+        self.viewer.reset_retained()
 
         if self.bg is None:
             self._init_background()
 
-        self.base_initialised = True
         return self.last_obs
 
     def step(self, action):
@@ -202,7 +291,7 @@ class BaseScenario(gym.Env, EzPickle):
         """
 
         # Step the simulation
-        sim.env.step()  # Updates dt
+        self.sim_context.step()  # Updates time
         state = self._model(action)
 
         # Get a state estimate using the Navigator
@@ -212,16 +301,30 @@ class BaseScenario(gym.Env, EzPickle):
         self.last_obs, sr, done = self.eval_objective(self.objective, action, state_est, state)
 
         # Update drawing objects
-        self.vessel.update(state, action)
+        self.last_state = state
+        if self.vessel is not None:
+            self.vessel.update(state, action)
         for o in self.objects:
-            o.update()
+            o.update(self.sim_context)
 
-        # TODO After updating, put all of the objects into a snapshot that the render function will take in
+        self.last_action = action
+        if self.snapshots is not None:
+            self.snapshots.publish(self)
+        if self.history is not None:
+            self.history.add(self, sr)
 
-        return self.last_obs, sr, done, {}
+        info = {}
+        if hasattr(self.objective, 'contacts'):
+            info['contacts'] = self.objective.contacts
+        return self.last_obs, sr, done, info
 
     def close(self):
         self.destroy()
+        if self.sim_context is not None:
+            self.sim_context.close()
+        if self.snapshots is not None:
+            self.snapshots.close()
+            self.snapshots = None
         if self.viewer is not None:
             self.viewer.close()
             self.viewer = None
@@ -233,51 +336,107 @@ class BaseScenario(gym.Env, EzPickle):
         self.np_random, seed = seeding.np_random(seed)
         return [seed]
 
+    def publish_snapshots(self, name=None):
+        """
+        Publishes a snapshot of every step to shared memory, where it can be drawn by a viewer in another process
+        with `gncgym watch <name>`, see remote.py. Nothing is written while no viewer is watching.
+        :param name: Name of the shared memory block, a random one is chosen if None
+        :return: Name of the shared memory block
+        """
+        from .remote import SnapshotPublisher
+        if self.snapshots is None:
+            self.snapshots = SnapshotPublisher(name)
+        return self.snapshots.name
+
+    def get_state(self, rng=True):
+        """
+        Saves the numeric state of the simulation, so that it can be restored with set_state(), e.g. to run many
+        rollouts from the same point. Only numbers are copied; the paths, obstacles and viewer are shared, so the
+        state can only be restored in the episode it was saved in. The step size of the dopri5 solver is not saved.
+        :param rng: Include the state of np_random, so that the random numbers drawn after set_state() are repeated
+        :return: EnvState
+        """
+        parts = [
+            (self.sim_context.time,),
+            self.get_model_state(),
+            np.ravel(self.last_action),
+            np.ravel(self.last_obs),
+            self.get_objective_state(self.objective),
+            [v for o in self.objects for v in o.get_state()],
+            _get_rng_state(self.np_random) if rng else (),
+        ]
+        return EnvState(self.episode, tuple(len(p) for p in parts), np.concatenate(parts).astype(float, copy=False))
+
+    def set_state(self, state):
+        """
+        Restores a state saved by get_state() in the current episode. A recorded history keeps the steps that were
+        taken since, and the steps that follow are appended after them, so the episode is no longer ordered by time.
+        """
+        if state.episode != self.episode:
+            raise ValueError('The state was saved in episode {}, but the env is in episode {}. States can only be '
+                             'restored in the episode they were saved in.'.format(state.episode, self.episode))
+        parts, start = [], 0
+        for size in state.sizes:
+            parts.append(state.values[start:start + size])
+            start += size
+        time, model, action, obs, objective, objects, rng = parts
+
+        self.sim_context.time = float(time[0])
+        self.set_model_state(model)
+        self.last_action = action.copy()
+        self.last_obs = obs.copy()
+        self.set_objective_state(self.objective, objective)
+        i = 0
+        for o in self.objects:
+            o.set_state(objects[i:i + o.state_size])
+            i += o.state_size
+        if len(rng) > 0:
+            _set_rng_state(self.np_random, rng)
+        if self.vessel is not None:
+            self.vessel.update(self.last_state, self.last_action)
+
+    def record_history(self, **kwargs):
+        """
+        Records every step from the next reset() on, see EnvHistory.
+        :param kwargs: Passed on to EnvHistory
+        :return: The EnvHistory, which is kept when the env is closed
+        """
+        if self.history is None:
+            self.history = EnvHistory(**kwargs)
+        return self.history
+
     def render(self, mode='human'):
         if not self.base_initialised:
             raise AttributeError('The environment has not been initialised. '
                                  'Call env.reset() before running the environment')
+        # Pixel observations are drawn by the software rasteriser, which doesn't need a display
+        if mode == 'state_pixels' or (mode == 'rgb_array' and self.headless):
+            return self.render_pixels(mode)
+        if self.headless:
+            raise RuntimeError('The environment was created with headless=True, and can only be rendered with '
+                               'mode="state_pixels" or mode="rgb_array".')
+        from pyglet import gl
 
-        zoom = 0.1 * SCALE * max(1 - sim.env.time, 0) + ZOOM * SCALE * min(sim.env.time, 1)   # Animate zoom first second
-
-        scroll_x = self.vessel.state.position.x
-        scroll_y = self.vessel.state.position.y
-        angle = -self.vessel.angle
-        vel = self.vessel.linearVelocity
-
-        if np.linalg.norm(vel) > 0.5:
-            angle = arctan2(vel[0], vel[1])
-        self.transform.set_scale(zoom, zoom)
-
-        self.transform.set_translation(
-            WINDOW_W/2 - (scroll_x*zoom*cos(angle) - scroll_y*zoom*sin(angle)),
-            WINDOW_H/2 - (scroll_x*zoom*sin(angle) + scroll_y*zoom*cos(angle))
-        )
-        self.transform.set_rotation(angle)
+        apply_camera(self.transform, self._camera())
 
         arr = None
         win = self.viewer.window
-        if mode != 'state_pixels':
-            win.switch_to()
-            win.dispatch_events()
+        win.switch_to()
+        win.dispatch_events()
 
-        if mode=="rgb_array" or mode=="state_pixels":
+        if mode == 'rgb_array':
             win.clear()
-            t = self.transform
-            if mode=='rgb_array':
-                VP_W = VIDEO_W
-                VP_H = VIDEO_H
-            else:
-                VP_W = STATE_W
-                VP_H = STATE_H
-            gl.glViewport(0, 0, VP_W, VP_H)
+            gl.glViewport(0, 0, VIDEO_W, VIDEO_H)
 
             self._render_objects()
 
-            image_data = pyglet.image.get_buffer_manager().get_color_buffer().get_image_data()
-            arr = np.fromstring(image_data.data, dtype=np.uint8, sep='')
-            arr = arr.reshape(VP_H, VP_W, 4)
-            arr = arr[::-1, :, 0:3]
+            # Flipped view of an array that is reused by the next frame
+            reader = self.viewer.frame_reader(VIDEO_W, VIDEO_H)
+            if self.async_readback:
+                # The GPU copies this frame while the next one is drawn
+                arr = reader.read_async()
+            else:
+                arr = reader.read()
 
         if mode=="rgb_array" and not self.human_render: # agent can call or not call env.render() itself when recording video.
             win.flip()
@@ -294,6 +453,48 @@ class BaseScenario(gym.Env, EzPickle):
         self.viewer.onetime_geoms = []
         return arr
 
+    def flush_frame(self):
+        """
+        With async_readback, render('rgb_array') returns the frame drawn by the previous call, None the first time.
+        This returns the last frame that was drawn, or None if it has already been returned. Frames that haven't been
+        returned when the env is closed are dropped.
+        """
+        if self.viewer is None or (VIDEO_W, VIDEO_H) not in self.viewer.frame_readers:
+            return None
+        return self.viewer.frame_readers[(VIDEO_W, VIDEO_H)].flush()
+
+    def render_pixels(self, mode='state_pixels'):
+        """
+        Draws the path, obstacles and vessel with the software rasteriser, without OpenGL. The array is reused by
+        the next call with the same mode.
+        :param mode: 'state_pixels' for STATE_W x STATE_H images, or 'rgb_array' for VIDEO_W x VIDEO_H images
+        :return: (H, W, 3) uint8 array
+        """
+        if mode not in self._rasterisers:
+            size = (STATE_W, STATE_H) if mode == 'state_pixels' else (VIDEO_W, VIDEO_H)
+            self._rasterisers[mode] = Rasteriser(*size, window=(WINDOW_W, WINDOW_H))
+        return self._rasterisers[mode].render(self.raster_scene(), self._camera())
+
+    def raster_scene(self):
+        """The scene drawn by render_pixels(), in world coordinates."""
+        scene = Scene()
+        self.raster_objective(self.objective, scene)
+        for o in self.objects:
+            body = Body.of(o)
+            color = getattr(o, 'color', (0.6, 0, 0))
+            if body.vertices is None:
+                scene.circle(body.position, body.radius, color)
+            else:
+                scene.polygon(body.polygon(), color)
+        state = self.last_state
+        scene.polygon(Body((state.x, state.y), angle=state.yaw, vertices=VESSEL_HULL).polygon(), VESSEL_COLOR)
+        return scene
+
+    def _camera(self):
+        """Position at the centre of the view, rotation and zoom, shared by the viewer and the rasteriser."""
+        zoom = camera_zoom(self.sim_context.time)
+        return self.last_state.x, self.last_state.y, self.camera_angle, zoom
+
     def _render_objects(self):
         # Draw objects with coordinate transform
         self.transform.enable()
@@ -303,8 +504,9 @@ class BaseScenario(gym.Env, EzPickle):
         self.vessel.draw(self.viewer)
 
         for o in self.objects:
-            o.draw()
+            o.draw(self.viewer)
 
+        self.viewer.draw_retained()
         for geom in self.viewer.onetime_geoms:
             geom.render()
 
@@ -315,7 +517,13 @@ class BaseScenario(gym.Env, EzPickle):
         for i in self.indicators:
             i.draw()
 
+    def _init_indicators(self):
+        self.obs_indicator, self.indicators = make_indicators(reward_fn=lambda: self.objective.reward,
+                                                              surge_fn=lambda: self.vessel.state.surge)
+
     def _init_viewer(self):
+        import pyglet
+        from . import rendering
         self.viewer = rendering.Viewer(WINDOW_W, WINDOW_H)
         self.score_label = pyglet.text.Label('0000', font_size=36,
                                              x=20, y=WINDOW_H * 2.5 / 40.00, anchor_x='left', anchor_y='center',
@@ -337,33 +545,6 @@ class BaseScenario(gym.Env, EzPickle):
         for i, o in enumerate(self.dynamic_obstacles):
             o.draw(self.viewer, color=DETECTED_OBST_COLOR if i in self.active_dynamic else None)
 
-    def _render_tiles(self, win):
-        if self.bg is None:
-            # Initialise background
-            from pyglet.gl.gl import GLubyte
-            data = np.zeros((int(2*PLAYFIELD), int(2*PLAYFIELD), 3))
-            self.bg_h = data.shape[0]
-            self.bg_w = data.shape[1]
-            k = self.bg_h//100
-            for x in range(0, data.shape[0], k):
-                for y in range(0, data.shape[1], k):
-                    data[x:x+k, y:y+k, :] = np.array((
-                        int(255*min(1.0, 0.3 + 0.025 * (random() - 0.5))),
-                        int(255*min(1.0, 0.7 + 0.025 * (random() - 0.5))),
-                        int(255*min(1.0, 0.8 + 0.025 * (random() - 0.5)))
-                    ))
-
-            pixels = data.flatten().astype('int').tolist()
-            raw_data = (GLubyte * len(pixels))(*pixels)
-            bg = pyglet.image.ImageData(width=self.bg_w, height=self.bg_h, format='RGB', data=raw_data)
-            if not os.path.exists('.tmp/'):
-                os.mkdir('./tmp')
-            bg.save('./tmp/bg.png')
-            self.bg = pyglet.sprite.Sprite(bg, x=-self.bg_w/2, y=-self.bg_h/2)
-            self.bg.scale = 1
-
-        self.bg.draw()
-
     # def _render_progress(self):
     #     # self.viewer.draw_circle(self.path(self.ideal_s), radius=1, res=30, color=(0.3, 0.8, 0.3))
     #     p = self.path(self.s).flatten()
@@ -379,29 +560,11 @@ class BaseScenario(gym.Env, EzPickle):
 
     def _init_background(self):
         """ Generate background texture so that we can see that the vessel is moving"""
-        from pyglet.gl.gl import GLubyte
-        # TODO make background texture tiling
-        data = np.zeros((int(2*PLAYFIELD), int(2*PLAYFIELD), 3))
-        self.bg_h = data.shape[0]
-        self.bg_w = data.shape[1]
-        k = self.bg_h//100
-        for x in range(0, data.shape[0], k):
-            for y in range(0, data.shape[1], k):
-                data[x:x+k, y:y+k, :] = np.array((
-                    int(255*min(1.0, 0.3 + 0.025 * (random() - 0.5))),
-                    int(255*min(1.0, 0.7 + 0.025 * (random() - 0.5))),
-                    int(255*min(1.0, 0.8 + 0.025 * (random() - 0.5)))
-                ))
-
-        pixels = data.flatten().astype('int').tolist()
-        raw_data = (GLubyte * len(pixels))(*pixels)
-        bg = pyglet.image.ImageData(width=self.bg_w, height=self.bg_h, format='RGB', data=raw_data)
-        bg.save('/tmp/bg.png')
-        self.bg = pyglet.sprite.Sprite(bg, x=-self.bg_w/2, y=-self.bg_h/2)
-        self.bg.scale = 1
+        self.bg = Background(make_tile(self.background_variant), extent=PLAYFIELD)
 
     # TODO Move obstacle indicators to objective.py
     def _render_indicators(self, W, H):
+        from pyglet import gl
 
         s = W/40.0
         h = H/40.0
@@ -467,16 +630,10 @@ class BaseScenario(gym.Env, EzPickle):
         obst_ind(place=20)
 
 
-class EnvHistory:
-    Snapshots = namedtuple('Snapshots', ['env', 'modules'])
+def _get_rng_state(rng):
+    _, keys, pos, has_gauss, cached_gaussian = rng.get_state()
+    return np.concatenate([keys, (pos, has_gauss, cached_gaussian)])
 
-    def __init__(self):
-        self.timestamps = []
-        self.snapshots = []
-        self.modules = []
-        self.metadata = {}
 
-    def add(self, env_snapshot, module_snapshot):
-        assert env_snapshot.timestamp == module_snapshot.timestamp
-        self.timestamps.append(env_snapshot.timestamp)
-        self.snapshots.append(type(self).Snapshots(env=env_snapshot, modules=module_snapshot))
+def _set_rng_state(rng, values):
+    rng.set_state(('MT19937', values[:-3].astype(np.uint32), int(values[-3]), int(values[-2]), float(values[-1])))
@@ -0,0 +1,199 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+
+"""
+Recording of the steps of an env in columns of NumPy arrays.
+
+Every column holds one value per step (the state, the action, the observation, ...) in a preallocated array that
+grows by chunk_size rows when it is full, so recording a step only copies a few numbers into the next row. Once the
+columns would take more than spill_size bytes, they are moved to np.memmap files, after which they keep growing on
+disk and only the pages that are in use are kept in memory by the OS.
+
+Rows are ordered by episode and then by time, so the steps of an episode, or of a time range within it, are found
+with a binary search and returned as views of the columns, without copying. Restoring an earlier state with
+BaseScenario.set_state() while recording rewinds the time within an episode, after which the steps of that episode
+are no longer ordered by time, and time ranges within it are found with a mask and copied instead.
+"""
+
+CHUNK_SIZE = 4096           # Rows added to the columns each time they are full
+SPILL_SIZE = 64 * 2**20     # Bytes of all columns together beyond which they are moved to memory mapped files
+MAX_OBJECTS = 16            # Default number of objects whose poses are recorded per step
+
+
+class EnvHistory:
+    """
+    Columns of the steps recorded by add(), see BaseScenario.record_history():
+        episode     (n,) int, counted from 1
+        time        (n,) float, simulation time
+        state       (n, 12) float, in the order of gncgym.definitions.variables
+        action      (n, m) float
+        reward      (n,) float, reward of the step, 0 for the first step of an episode
+        obs         (n, k) float
+        num_objects (n,) int
+        objects     (n, max_objects, 3) float, x, y and angle of each object, zero for missing objects
+    The sizes m and k are taken from the first step that is added.
+    """
+    def __init__(self, max_objects=MAX_OBJECTS, chunk_size=CHUNK_SIZE, spill_size=SPILL_SIZE, directory=None):
+        """
+        :param max_objects: Objects beyond this number are not recorded
+        :param chunk_size: Rows added to the columns each time they are full
+        :param spill_size: Size in bytes beyond which the columns are moved to files, None to always keep them in
+                           memory
+        :param directory: Directory of the files, a temporary directory that is removed by close() if None
+        """
+        self.max_objects = max_objects
+        self.chunk_size = chunk_size
+        self.spill_size = spill_size
+        self.directory = directory
+        self.episode = 0
+        self.spilled = False
+        self._owns_directory = False
+        self._arrays = {}
+        self._shapes = self._dtypes = None
+        self._unordered = set()     # Episodes in which the time went back, see between()
+        self._capacity = 0
+        self._length = 0
+
+    def add(self, env, reward=0.0, reset=False):
+        """
+        Records the current step of env.
+        :param reward: Reward of the step
+        :param reset: Set when env has just been reset, which starts a new episode
+        """
+        if reset or self.episode == 0:
+            self.episode += 1
+        objects = env.objects[:self.max_objects]
+        row = dict(
+            episode=self.episode,
+            time=env.sim_context.time,
+            state=env.last_state.vector,
+            action=np.ravel(env.last_action),
+            reward=reward,
+            obs=np.ravel(env.last_obs),
+            num_objects=len(objects),
+        )
+        if not self._arrays:
+            self._allocate(row)
+        if self._length == self._capacity:
+            self._grow()
+
+        i = self._length
+        if i > 0 and self._arrays['episode'][i - 1] == self.episode and self._arrays['time'][i - 1] > row['time']:
+            self._unordered.add(self.episode)
+        for name, value in row.items():
+            self._arrays[name][i] = value
+        n = len(objects)
+        poses = self._arrays['objects'][i]
+        poses[n:] = 0
+        if n > 0:
+            poses[:n, :2] = [np.ravel(o.position)[:2] for o in objects]
+            poses[:n, 2] = [np.ravel(o.angle)[0] for o in objects]
+        self._length += 1
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, name):
+        """View of the recorded rows of a column."""
+        return self._arrays[name][:self._length]
+
+    @property
+    def columns(self):
+        return {name: a[:self._length] for name, a in self._arrays.items()}
+
+    @property
+    def nbytes(self):
+        """Bytes allocated for the columns, in memory or on disk."""
+        return sum(a.nbytes for a in self._arrays.values())
+
+    def episodes(self):
+        """Numbers of the episodes that have been recorded."""
+        return np.unique(self['episode'])
+
+    def get_episode(self, episode):
+        """Views of the columns for the steps of an episode."""
+        return self.between(-np.inf, np.inf, episode=episode)
+
+    def between(self, t_start, t_end, episode=None):
+        """
+        Steps with t_start <= time < t_end.
+        :param episode: Only this episode, in which case views of the columns are returned, unless the time of the
+                        episode went back. Otherwise the steps of all episodes in the time range are copied.
+        :return: Dict of column arrays
+        """
+        time = self['time']
+        if episode is None:
+            mask = (time >= t_start) & (time < t_end)
+            return {name: a[mask] for name, a in self.columns.items()}
+
+        episodes = self['episode']
+        lo, hi = np.searchsorted(episodes, [episode, episode + 1])
+        if episode in self._unordered:
+            mask = (time[lo:hi] >= t_start) & (time[lo:hi] < t_end)
+            return {name: a[lo:hi][mask] for name, a in self.columns.items()}
+        start, end = lo + np.searchsorted(time[lo:hi], [t_start, t_end])
+        return {name: a[start:end] for name, a in self.columns.items()}
+
+    def flush(self):
+        for a in self._arrays.values():
+            if isinstance(a, np.memmap):
+                a.flush()
+
+    def close(self):
+        """
+        Drops the columns, and removes the files if they are in a temporary directory. Steps that are added afterwards
+        start a new, empty history.
+        """
+        self.flush()
+        self._arrays = {}
+        self._shapes = self._dtypes = None
+        self._unordered = set()
+        self._capacity = self._length = 0
+        self.episode = 0
+        self.spilled = False
+        if self._owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+            self._owns_directory = False
+
+    def _allocate(self, row):
+        self._shapes = {name: np.shape(value) for name, value in row.items()}
+        self._shapes['objects'] = (self.max_objects, 3)
+        self._dtypes = {name: float for name in self._shapes}
+        self._dtypes.update(episode=np.int64, num_objects=np.int32)
+        self._arrays = {name: np.zeros((0,) + shape, dtype=self._dtypes[name]) for name, shape in self._shapes.items()}
+
+    def _grow(self):
+        capacity = self._capacity + self.chunk_size
+        row_bytes = sum(np.dtype(self._dtypes[name]).itemsize * int(np.prod(shape))
+                        for name, shape in self._shapes.items())
+        if not self.spilled and self.spill_size is not None and capacity * row_bytes > self.spill_size:
+            self._spill()
+
+        for name, a in self._arrays.items():
+            if self.spilled:
+                # Opening the file with a larger shape extends it, the rows that were written stay in place
+                self._arrays[name] = np.memmap(self._path(name), dtype=self._dtypes[name], mode='r+',
+                                               shape=(capacity,) + self._shapes[name])
+            else:
+                grown = np.zeros((capacity,) + self._shapes[name], dtype=self._dtypes[name])
+                grown[:self._length] = a[:self._length]
+                self._arrays[name] = grown
+        self._capacity = capacity
+
+    def _spill(self):
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix='gncgym-history-')
+            self._owns_directory = True
+        os.makedirs(self.directory, exist_ok=True)
+        for name, a in self._arrays.items():
+            spilled = np.memmap(self._path(name), dtype=self._dtypes[name], mode='w+',
+                                shape=(max(self._capacity, 1),) + self._shapes[name])
+            spilled[:self._length] = a[:self._length]
+            self._arrays[name] = spilled
+        self.spilled = True
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + '.dat')
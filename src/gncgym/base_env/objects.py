@@ -17,7 +17,25 @@ import gncgym.simulator as sim
 # Created by Haakon Robinson.
 
 
+def make_hull(width):
+    """Vertices of the pointed hull used to draw vessels, in body coordinates with the bow along the x axis."""
+    return [
+        (-width, -width),
+        (-width, width),
+        (2 * width, width),
+        (3 * width, 0),
+        (2 * width, -width),
+    ]
+
+
+# Arrow that shows the rudder angle of the vessel, a line along the x axis with a triangular head
+ARROW_LENGTH = 2
+ARROW_HEAD = [(ARROW_LENGTH - 0.7, 0.7), (ARROW_LENGTH - 0.7, -0.7), (ARROW_LENGTH + 0.7, 0)]
+
+
 class EnvObject:
+    state_size = 0  # Number of values returned by get_state()
+
     def __init__(self, radius, angle=0.0, position=(0.0, 0.0), linearVelocity=(0.0, 0.0), angularVelocity=0):
         if not isinstance(position, np.ndarray):
             position = np.array(position)
@@ -35,6 +53,13 @@ class EnvObject:
     def draw(self, viewer):
         raise NotImplemented
 
+    def get_state(self):
+        """The values that update() changes, saved by BaseScenario.get_state()."""
+        return ()
+
+    def set_state(self, values):
+        pass
+
     def destroy(self):
         pass
 
@@ -44,15 +69,19 @@ class StaticObstacle(EnvObject):
         self.color = color
         super().__init__(radius=radius, position=position)
 
-    def update(self):
+    def update(self, ctx=None):
         pass
 
     def draw(self, viewer, color=None):
-        viewer.draw_circle(self.position, self.radius, color=self.color if color is None else color)
+        shape = viewer.retained(self, lambda v: v.make_circle_shape(self.radius, self.color, origin=self.position,
+                                                                    dynamic=False))
+        shape.set_color(self.color if color is None else color)
 
 
 # TODO Replace path, speed, and init_s with Trajectory object
 class DynamicObstacle(EnvObject):
+    state_size = 1
+
     def __init__(self, path, speed, init_s=0, color=(0.6, 0, 0), width=5):
         # Create body
         self.s = init_s
@@ -61,22 +90,30 @@ class DynamicObstacle(EnvObject):
         self.color = color
         x, y = self.path(0)
         angle = self.path.get_angle(0)
-        self.vertices = [
-            (-width, -width),
-            (-width, width),
-            (2 * width, width),
-            (3 * width, 0),
-            (2 * width, -width),
-        ]
+        self.vertices = make_hull(width)
         super().__init__(radius=width, angle=angle, position=(x, y), linearVelocity=(speed*cos(angle), speed*sin(angle)))
 
-    def update(self):
-        self.s += self.speed * sim.env.dt
-        self.position = self.path(self.s).flatten()
-        self.angle = self.path.get_angle(self.s)
+    def update(self, ctx=None):
+        if ctx is None:
+            ctx = sim.env.default_context
+        self.s += self.speed * ctx.dt
+        self._move()
+
+    def get_state(self):
+        return (self.s,)
+
+    def set_state(self, values):
+        self.s = float(values[0])
+        self._move()
+
+    def _move(self):
+        position, self.angle, _ = self.path.pose_at(self.s)
+        self.position = position.flatten()
 
     def draw(self, viewer, color=None):
-        viewer.draw_shape(self.vertices, self.position, self.angle, self.color if color is None else color)
+        shape = viewer.retained(self, lambda v: v.make_shape(self.vertices, self.color, linewidth=2))
+        shape.set_transform(self.position, self.angle)
+        shape.set_color(self.color if color is None else color)
 
 
 class Vessel2D(EnvObject):
@@ -87,24 +124,29 @@ class Vessel2D(EnvObject):
 
         self.path_taken = []
         self.color = (0.6, 0.6, 0.6)
-        self.vertices = [
-            (-width, -width),
-            (-width, width),
-            (2 * width, width),
-            (3 * width, 0),
-            (2 * width, -width),
-        ]
+        self.vertices = make_hull(width)
 
-        super().__init__(radius=width, angle=state.orientation.yaw, position=(state.position.x, state.position.y))
+        super().__init__(radius=width, angle=state.yaw, position=(state.x, state.y))
 
     def update(self, state, ref):
         self.state = state
         self.ref = ref
 
     def draw(self, viewer):
-        position = self.state.position[0:2]
-        orientation = self.state.orientation
-        # print(orientation)
-        viewer.draw_polyline(self.path_taken, linewidth=3, color=(0.8, 0, 0))  # previous positions
-        viewer.draw_shape(self.vertices, position, orientation.yaw, self.color)  # ship
-        viewer.draw_arrow(position, orientation.yaw + pi + self.ref[1]/2, length=2)
+        position = (self.state.x, self.state.y)
+        yaw = self.state.yaw
+        if len(self.path_taken) > 1:
+            viewer.draw_polyline(self.path_taken, linewidth=3, color=(0.8, 0, 0))  # previous positions
+
+        # The shapes are uploaded once, and only their transforms are updated
+        ship = viewer.retained((self, 'ship'), lambda v: v.make_shape(self.vertices, self.color, linewidth=2,
+                                                                      layer=v.LAYER_VESSEL))
+        ship.set_transform(position, yaw)
+
+        arrow_angle = yaw + pi + self.ref[1]/2
+        for part, factory in (
+                ('arrow', lambda v: v.make_polyline_shape([(0, 0), (ARROW_LENGTH, 0)], color=(0, 0, 0), linewidth=2,
+                                                          layer=v.LAYER_VESSEL, dynamic=True)),
+                ('arrow_head', lambda v: v.make_shape(ARROW_HEAD, color=(0, 0, 0), outline=None,
+                                                      layer=v.LAYER_VESSEL))):
+            viewer.retained((self, part), factory).set_transform(position, arrow_angle)
@@ -0,0 +1,181 @@
+import numpy as np
+
+"""
+Software rasteriser for pixel observations, which draws the scene straight into NumPy arrays without OpenGL, so it
+works on machines without a display or GPU.
+
+The scene is described in world coordinates by a Scene, with filled polygons, circles and polylines. The Rasteriser
+transforms every primitive into pixel coordinates with the same camera as the viewer, turns circles and the
+segments of polylines into convex polygons, and fills all of the polygons of all of the scenes with one vectorised
+scanline pass: the span of each polygon on each row of pixels is found from the crossings of its edges with the row.
+Later primitives are drawn over earlier ones.
+"""
+
+BACKGROUND_COLOR = (0.3, 0.7, 0.8)  # Mean colour of the background tile
+CIRCLE_RES = 16                     # Number of vertices of circles
+
+
+class Scene:
+    """Primitives to draw, in world coordinates and in drawing order."""
+    def __init__(self):
+        self.primitives = []
+
+    def polygon(self, vertices, color):
+        """Filled convex polygon."""
+        self.primitives.append(('polygon', np.asarray(vertices, dtype=float).reshape(-1, 2), color, None))
+
+    def circle(self, center, radius, color, res=CIRCLE_RES):
+        ang = 2 * np.pi * np.arange(res) / res
+        vertices = radius * np.stack([np.cos(ang), np.sin(ang)], axis=1) + np.ravel(center)[:2]
+        self.polygon(vertices, color)
+
+    def polyline(self, points, color, linewidth=1):
+        """Open polyline. The width is given in pixels of the viewer window, like the line widths of the viewer."""
+        self.primitives.append(('polyline', np.asarray(points, dtype=float).reshape(-1, 2), color, linewidth))
+
+
+class Rasteriser:
+    """
+    Draws scenes into preallocated uint8 arrays. render() and render_batch() return views of the same buffers at
+    every call, so the images must be copied if they are kept.
+    """
+    def __init__(self, width, height, window=None, background=BACKGROUND_COLOR):
+        """
+        :param width: Width of the images in pixels
+        :param height: Height of the images in pixels
+        :param window: (width, height) of the viewer window that the camera is defined for, the window is scaled
+                       to the image like a viewport. Defaults to the size of the image.
+        :param background: RGB colour of the background
+        """
+        self.width = width
+        self.height = height
+        self.window = (width, height) if window is None else window
+        self.background = np.array(background)
+        self._images = np.zeros((0, height, width, 3), dtype=np.uint8)
+        self._labels = np.zeros((0, height, width), dtype=np.int32)
+
+    def render(self, scene, camera):
+        """
+        :param scene: Scene
+        :param camera: (x, y, angle, zoom), the world position at the centre of the view, the rotation of the view
+                       and the number of window pixels per world unit
+        :return: (height, width, 3) uint8 array
+        """
+        return self.render_batch([scene], [camera])[0]
+
+    def render_batch(self, scenes, cameras):
+        """Renders N scenes into an (N, height, width, 3) uint8 array in one pass."""
+        n = len(scenes)
+        if len(self._images) != n:
+            self._images = np.zeros((n, self.height, self.width, 3), dtype=np.uint8)
+            self._labels = np.zeros((n, self.height, self.width), dtype=np.int32)
+
+        groups, owners, colors = [], [], []
+        for i, (scene, camera) in enumerate(zip(scenes, cameras)):
+            for polygons, color in self._to_pixels(scene, camera):
+                groups.append(polygons)
+                owners.append(np.full(len(polygons), i))
+                colors.append(np.tile(color, (len(polygons), 1)))
+
+        # Label 0 is the background and label k the k'th polygon, so the last polygon drawn on a pixel wins
+        labels = self._labels
+        labels.fill(0)
+        colors = np.concatenate(colors) if colors else np.zeros((0, 3))
+        if groups:
+            vertices, owners = _pad(groups), np.concatenate(owners)
+            visible = _visible(vertices, self.width, self.height)
+            values = np.arange(1, len(vertices) + 1)
+            _fill(labels, vertices[visible], owners[visible], values[visible])
+
+        palette = np.vstack([[self.background], colors])
+        palette = np.clip(np.round(255 * palette), 0, 255).astype(np.uint8)
+        np.take(palette, labels, axis=0, out=self._images)
+        return self._images
+
+    def _to_pixels(self, scene, camera):
+        """Yields (polygons, color), with polygons an (M, V, 2) array of convex polygons in pixel coordinates."""
+        x, y, angle, zoom = camera
+        sx, sy = self.width / self.window[0], self.height / self.window[1]
+        c, s = np.cos(angle), np.sin(angle)
+        rotation = zoom * np.array([[c, s], [-s, c]])
+        center = np.array([x, y])
+
+        def transform(points):
+            p = (points - center) @ rotation
+            return np.stack([(p[:, 0] + self.window[0] / 2) * sx, self.height - (p[:, 1] + self.window[1] / 2) * sy],
+                            axis=1)
+
+        for kind, points, color, linewidth in scene.primitives:
+            if kind == 'polygon':
+                yield transform(points)[None], color[:3]
+            elif len(points) > 1:
+                # Each segment of a polyline becomes a thin quad, at least one pixel wide
+                p = transform(points)
+                d = np.diff(p, axis=0)
+                length = np.hypot(d[:, 0], d[:, 1])
+                keep = length > 0
+                if not np.any(keep):
+                    continue
+                normal = np.stack([-d[keep, 1], d[keep, 0]], axis=1) / length[keep, None]
+                offset = normal * max(0.5, linewidth * (sx + sy) / 4)
+                a, b = p[:-1][keep], p[1:][keep]
+                yield np.stack([a + offset, b + offset, b - offset, a - offset], axis=1), color[:3]
+
+
+def _pad(groups):
+    """Stacks (M_i, V_i, 2) arrays of polygons into one array, repeating the last vertex of the shorter polygons."""
+    num_vertices = max(g.shape[1] for g in groups)
+    return np.concatenate([
+        np.concatenate([g, np.repeat(g[:, -1:], num_vertices - g.shape[1], axis=1)], axis=1) for g in groups])
+
+
+def _visible(vertices, width, height):
+    lo, hi = vertices.min(axis=1), vertices.max(axis=1)
+    return (hi[:, 0] >= 0) & (lo[:, 0] <= width) & (hi[:, 1] >= 0) & (lo[:, 1] <= height)
+
+
+def _fill(labels, vertices, owners, values):
+    """
+    Scanline fill of convex polygons. Sets labels[owner, y, x] to the polygon's value for every pixel whose centre
+    lies inside the polygon, keeping the largest value where polygons overlap. Only the rows that a polygon covers
+    are visited, so the cost grows with the number of pixels that are drawn rather than the size of the image.
+
+    :param labels: (N, H, W) int array
+    :param vertices: (M, V, 2) array of polygons in pixel coordinates
+    :param owners: (M,) array, the image each polygon is drawn on
+    :param values: (M,) array of labels
+    """
+    _, height, width = labels.shape
+
+    # Rows whose centres lie between the top and bottom of each polygon
+    y = vertices[..., 1]
+    row_lo = np.clip(np.ceil(y.min(axis=1) - 0.5), 0, height).astype(int)
+    row_hi = np.clip(np.floor(y.max(axis=1) - 0.5) + 1, 0, height).astype(int)
+    poly, rows = _expand(row_lo, np.maximum(row_hi - row_lo, 0))
+
+    # Crossings of each edge of the polygon with each of its rows, horizontal edges never cross
+    v = vertices[poly]
+    x0, y0 = v[..., 0], v[..., 1]
+    x1, y1 = np.roll(x0, -1, axis=1), np.roll(y0, -1, axis=1)
+    yc = rows[:, None] + 0.5
+    crosses = (yc >= np.minimum(y0, y1)) & (yc < np.maximum(y0, y1))
+    dy = np.where(y1 != y0, y1 - y0, 1)
+    xs = x0 + (yc - y0) * (x1 - x0) / dy
+    x_min = np.where(crosses, xs, np.inf).min(axis=1)
+    x_max = np.where(crosses, xs, -np.inf).max(axis=1)
+
+    # Pixels whose centres lie in [x_min, x_max) on each row
+    col_lo = np.clip(np.ceil(x_min - 0.5), 0, width)
+    col_hi = np.clip(np.ceil(x_max - 0.5), 0, width)
+    valid = col_hi > col_lo
+    col_lo, col_hi = col_lo[valid].astype(int), col_hi[valid].astype(int)
+    span, cols = _expand(col_lo, col_hi - col_lo)
+    poly, rows = poly[valid][span], rows[valid][span]
+    np.maximum.at(labels, (owners[poly], rows, cols), values[poly])
+
+
+def _expand(starts, counts):
+    """For ranges of integers given by their starts and lengths, returns (index of the range, integer)."""
+    index = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.arange(len(index)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return index, starts[index] + offsets
@@ -0,0 +1,307 @@
+import sys
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+"""
+Out of process viewer. An env that publishes snapshots writes a compact description of every step (the vessel state,
+the poses of the objects, the reward and the objective) into a ring of slots in shared memory, and a separate viewer
+process draws the latest one with the same Viewer and indicators as BaseScenario.render(). The env never waits for
+the viewer, so training runs at full speed while someone watches it.
+
+The viewer writes the time into the block at every frame, and the env only writes snapshots while that heartbeat is
+recent, so publishing costs next to nothing when nobody is watching. Each slot is guarded by a sequence number that
+is odd while the slot is being written (a seqlock), and the viewer copies a slot and retries if the number changed
+while it was copying, so it never draws a torn snapshot.
+
+    # In the training process
+    env = ExampleScenario(headless=True)
+    print(env.publish_snapshots())
+
+    # In a shell
+    gncgym watch <name>
+"""
+
+NUM_SLOTS = 4           # Snapshots in the ring, the writer moves to the next slot at every step
+MAX_OBJECTS = 64        # Objects beyond this are not drawn
+MAX_VERTICES = 8        # Vertices of the polygon of an object, objects with more are drawn as circles
+MAX_PATH_POINTS = 512   # Points of the path drawn by the objective
+WATCH_TIMEOUT = 1.0     # Seconds since the last heartbeat of the viewer after which snapshots are no longer written
+
+HEADER_DTYPE = np.dtype([
+    ('latest', np.int64),       # Slot of the last complete snapshot, -1 before the first one
+    ('heartbeat', np.float64),  # Wall clock time of the last frame drawn by the viewer
+])
+
+OBJECT_DTYPE = np.dtype([
+    ('position', np.float64, 2),
+    ('angle', np.float64),
+    ('radius', np.float64),
+    ('num_vertices', np.int32),             # 0 for circles
+    ('vertices', np.float64, (MAX_VERTICES, 2)),
+    ('color', np.float64, 3),
+])
+
+SNAPSHOT_DTYPE = np.dtype([
+    ('seq', np.int64),                      # Odd while the slot is being written
+    ('episode', np.int64),
+    ('time', np.float64),
+    ('reward', np.float64),
+    ('state', np.float64, 6),               # x, y, yaw, surge, sway, yaw rate
+    ('action', np.float64, 2),
+    ('camera_angle', np.float64),
+    ('background', np.int32),               # Variant of the background tile
+    ('num_objects', np.int32),
+    ('objects', OBJECT_DTYPE, MAX_OBJECTS),
+    ('num_path_points', np.int32),          # Set by BaseScenario.snapshot_objective()
+    ('path', np.float64, (MAX_PATH_POINTS, 2)),
+    ('marker', np.float64, 2),
+])
+
+BLOCK_SIZE = HEADER_DTYPE.itemsize + NUM_SLOTS * SNAPSHOT_DTYPE.itemsize
+
+_created = set()    # Names of the blocks created by this process
+
+
+def _views(buf):
+    header = np.ndarray((), dtype=HEADER_DTYPE, buffer=buf)
+    slots = np.ndarray((NUM_SLOTS,), dtype=SNAPSHOT_DTYPE, buffer=buf, offset=HEADER_DTYPE.itemsize)
+    return header, slots
+
+
+class SnapshotPublisher:
+    """Writes snapshots of an env into a new shared memory block. Created by BaseScenario.publish_snapshots()."""
+    def __init__(self, name=None):
+        """:param name: Name of the block, a random one is chosen if None"""
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=BLOCK_SIZE)
+        self.name = self.shm.name
+        _created.add(self.name)
+        self.header, self.slots = _views(self.shm.buf)
+        self.slots[:] = np.zeros((), dtype=SNAPSHOT_DTYPE)
+        self.header['latest'] = -1
+        self.header['heartbeat'] = -np.inf
+        self.episode = 0
+        self.published = 0
+        self._slot = 0
+
+    @property
+    def watched(self):
+        return time.time() - float(self.header['heartbeat']) < WATCH_TIMEOUT
+
+    def publish(self, env, reset=False):
+        """
+        Writes a snapshot of env, if a viewer is watching.
+        :param reset: Set when env has just been reset, so that the viewer starts a new episode
+        """
+        if reset:
+            self.episode += 1
+        if not self.watched:
+            return False
+
+        self._slot = (self._slot + 1) % NUM_SLOTS
+        slot = self.slots[self._slot, ...]     # 0-d view, writes go straight to shared memory
+        slot['seq'] += 1
+        self._write(slot, env)
+        slot['seq'] += 1
+        self.header['latest'] = self._slot
+        self.published += 1
+        return True
+
+    def _write(self, slot, env):
+        state = env.last_state
+        slot['episode'] = self.episode
+        slot['time'] = env.sim_context.time
+        slot['reward'] = getattr(env.objective, 'reward', 0.0)
+        slot['state'] = (state.x, state.y, state.yaw, state.surge, state.sway, state.yawrate)
+        slot['action'] = np.ravel(env.last_action)[:2] if env.last_action is not None else 0
+        slot['camera_angle'] = env.camera_angle
+        slot['background'] = env.background_variant
+
+        objects = env.objects[:MAX_OBJECTS]
+        n = len(objects)
+        slot['num_objects'] = n
+        if n > 0:
+            dst = slot['objects']
+            dst['position'][:n] = [np.ravel(o.position)[:2] for o in objects]
+            dst['angle'][:n] = [np.ravel(o.angle)[0] for o in objects]
+            dst['radius'][:n] = [o.radius for o in objects]
+            dst['color'][:n] = [getattr(o, 'color', (0.6, 0, 0)) for o in objects]
+            for i, o in enumerate(objects):
+                vertices = getattr(o, 'vertices', None)
+                k = len(vertices) if vertices is not None and len(vertices) <= MAX_VERTICES else 0
+                dst['num_vertices'][i] = k
+                dst['vertices'][i, :k] = vertices[:k] if k else 0
+
+        slot['num_path_points'] = 0
+        env.snapshot_objective(env.objective, slot)
+
+    def close(self):
+        if self.shm is None:
+            return
+        del self.header, self.slots
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        _created.discard(self.name)
+
+
+class SnapshotReader:
+    """Reads the latest snapshot from the block of a SnapshotPublisher, which may live in another process."""
+    def __init__(self, name):
+        self.shm = shared_memory.SharedMemory(name=name)
+        if sys.version_info < (3, 13) and name not in _created:
+            # Before 3.13 every process that attaches to a block unlinks it on exit, but the block belongs to the env
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.header, self.slots = _views(self.shm.buf)
+        self.snapshot = np.zeros((), dtype=SNAPSHOT_DTYPE)
+        self.torn_reads = 0
+
+    def heartbeat(self):
+        """Tells the env that someone is watching."""
+        self.header['heartbeat'] = time.time()
+
+    def read(self, retries=100):
+        """
+        :return: Copy of the latest snapshot, which is reused by the next call, or None if there is none yet
+        """
+        for _ in range(retries):
+            latest = int(self.header['latest'])
+            if latest < 0:
+                return None
+            seq = int(self.slots['seq'][latest])
+            if seq % 2 == 0:
+                self.snapshot[...] = self.slots[latest]
+                if int(self.slots['seq'][latest]) == seq:
+                    return self.snapshot
+            self.torn_reads += 1
+        return None
+
+    def close(self):
+        if self.shm is None:
+            return
+        del self.header, self.slots
+        self.shm.close()
+        self.shm = None
+
+
+class RemoteViewer:
+    """Window that draws the snapshots read from a SnapshotReader."""
+    def __init__(self, name):
+        from . import rendering
+        from .base import WINDOW_W, WINDOW_H, make_indicators
+
+        self.reader = SnapshotReader(name)
+        self.viewer = rendering.Viewer(WINDOW_W, WINDOW_H)
+        self.transform = rendering.Transform()
+        self.snapshot = None
+        self.obs_indicator, self.indicators = make_indicators(reward_fn=lambda: self.snapshot['reward'],
+                                                              surge_fn=lambda: self.snapshot['state'][3])
+        self.episode = None
+        self.vessel = None
+        self.bg = None
+        self._bg_variant = None
+
+    def run(self, fps=50):
+        """Draws the latest snapshot until the window is closed."""
+        while self.viewer.isopen:
+            self.reader.heartbeat()
+            if not self.draw():
+                self.viewer.window.dispatch_events()
+            time.sleep(1.0 / fps)
+
+    def draw(self):
+        """Draws the latest snapshot, returns False if there is none yet."""
+        from pyglet import gl
+        from .background import Background, make_tile
+        from .base import WINDOW_W, WINDOW_H, PLAYFIELD, camera_zoom, apply_camera
+
+        snapshot = self.reader.read()
+        if snapshot is None:
+            return False
+        self.snapshot = snapshot
+        if int(snapshot['episode']) != self.episode:
+            self._new_episode(snapshot)
+        if int(snapshot['background']) != self._bg_variant:
+            if self.bg is not None:
+                self.bg.delete()
+            self._bg_variant = int(snapshot['background'])
+            self.bg = Background(make_tile(self._bg_variant), extent=PLAYFIELD)
+
+        state = _state(snapshot)
+        self.vessel.update(state, snapshot['action'])
+        apply_camera(self.transform, (state.x, state.y, float(snapshot['camera_angle']),
+                                      camera_zoom(float(snapshot['time']))))
+
+        win = self.viewer.window
+        win.switch_to()
+        win.dispatch_events()
+        win.clear()
+        gl.glViewport(0, 0, WINDOW_W, WINDOW_H)
+
+        self.transform.enable()
+        self.bg.draw()
+        self._draw_objective(snapshot)
+        self.vessel.draw(self.viewer)
+        self._draw_objects(snapshot)
+        self.viewer.draw_retained()
+        self.transform.disable()
+
+        self.obs_indicator.draw()
+        for i in self.indicators:
+            i.draw()
+        win.flip()
+        return True
+
+    def close(self):
+        self.viewer.close()
+        self.reader.close()
+
+    def _new_episode(self, snapshot):
+        from .objects import Vessel2D
+        self.episode = int(snapshot['episode'])
+        self.viewer.reset_retained()
+        self.vessel = Vessel2D(_state(snapshot))
+
+    def _draw_objective(self, snapshot):
+        n = int(snapshot['num_path_points'])
+        if n < 2:
+            return
+        path = snapshot['path'][:n].copy()
+        self.viewer.retained('path', lambda v: v.make_polyline_shape(path, color=(0.3, 0.3, 0.3), linewidth=3))
+        marker = self.viewer.retained('progress', lambda v: v.make_circle_shape(1, color=(0.8, 0.3, 0.3),
+                                                                                layer=v.LAYER_VESSEL))
+        marker.set_transform(snapshot['marker'])
+
+    def _draw_objects(self, snapshot):
+        # The shapes are made when an object is first seen in an episode, and are then only moved and recoloured
+        for i, o in enumerate(snapshot['objects'][:int(snapshot['num_objects'])]):
+            n = int(o['num_vertices'])
+            if n > 0:
+                vertices = o['vertices'][:n].copy()
+                factory = lambda v: v.make_shape(vertices, o['color'], linewidth=2)
+            else:
+                radius = float(o['radius'])
+                factory = lambda v: v.make_circle_shape(radius, o['color'])
+            shape = self.viewer.retained(('object', i), factory)
+            shape.set_transform(o['position'], float(o['angle']))
+            shape.set_color(tuple(o['color']))
+
+
+def _state(snapshot):
+    from gncgym.definitions import State6DOF
+    x, y, yaw, surge, sway, yawrate = (float(v) for v in snapshot['state'])
+    return State6DOF(x=x, y=y, yaw=yaw, surge=surge, sway=sway, yawrate=yawrate)
+
+
+def watch(name, fps=50):
+    """Opens a window that shows the env publishing to the block with the given name, until it is closed."""
+    viewer = RemoteViewer(name)
+    try:
+        viewer.run(fps=fps)
+    finally:
+        viewer.close()
+
+
+if __name__ == '__main__':
+    watch(sys.argv[1])
@@ -5,6 +5,11 @@ Modified version of the classical control module in OpenAI's gym.
 Changes:
     - Added an 'origin' argument to the draw_circle() and make_circle() functions to allow drawing of circles anywhere.
     - Added an 'outline' argument to the draw_circle() function, allows a more stylised render
+    - Added FrameReader, which reads the framebuffer into a reused array and returns flipped views instead of
+      copies, optionally with double buffered asynchronous reads through pixel buffer objects.
+    - Added retained geometry (Shape), which is uploaded once into a pyglet Batch and drawn with a single call per
+      layer. Shapes that move only update their transform. The draw_*() functions still create one-time geoms,
+      which are rebuilt and drawn in immediate mode every frame.
 
 Created by Haakon Robinson, adapted from OpenAI's gym.base_env.classical.rendering.py
 """
@@ -37,12 +42,18 @@ except ImportError as e:
 
 
 import math
+import ctypes
 from math import cos, sin
 import numpy as np
 
 
 RAD2DEG = 57.29577951308232
 
+# Layers of retained geometry, drawn in ascending order
+LAYER_STATIC = 0    # Geometry that doesn't change during an episode, e.g. the path
+LAYER_OBJECTS = 1   # Obstacles and other objects
+LAYER_VESSEL = 2    # The vessel and markers drawn on top of everything else
+
 
 def get_display(spec):
     """Convert a display specification (such as :0) into an actual Display
@@ -59,6 +70,9 @@ def get_display(spec):
 
 
 class Viewer(object):
+    # Layers of retained geometry, so that they can be used without importing this module
+    LAYER_STATIC, LAYER_OBJECTS, LAYER_VESSEL = LAYER_STATIC, LAYER_OBJECTS, LAYER_VESSEL
+
     def __init__(self, width, height, display=None):
         display = get_display(display)
 
@@ -71,11 +85,19 @@ class Viewer(object):
         self.onetime_geoms = []
         self.fixed_geoms = []
         self.transform = Transform()
+        self.batch = pyglet.graphics.Batch()
+        self.retained_shapes = {}
+        self.used_shapes = set()    # Keys of the retained shapes that have been used since the last draw_retained()
+        self.frame_readers = {}
 
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
     def close(self):
+        self.reset_retained()
+        for reader in self.frame_readers.values():
+            reader.delete()
+        self.frame_readers = {}
         self.window.close()
 
     def window_closed_by_user(self):
@@ -111,23 +133,54 @@ class Viewer(object):
         self.transform.disable()
         for geom in self.fixed_geoms:
             geom.render()
-        arr = None
-        if return_rgb_array:
-            buffer = pyglet.image.get_buffer_manager().get_color_buffer()
-            image_data = buffer.get_image_data()
-            arr = np.fromstring(image_data.data, dtype=np.uint8, sep='')
-            # In https://github.com/openai/gym-http-api/issues/2, we
-            # discovered that someone using Xmonad on Arch was having
-            # a window of size 598 x 398, though a 600 x 400 window
-            # was requested. (Guess Xmonad was preserving a pixel for
-            # the boundary.) So we use the buffer height/width rather
-            # than the requested one.
-            arr = arr.reshape(buffer.height, buffer.width, 4)
-            arr = arr[::-1,:,0:3]
+        # A view of an array that is reused by the next frame, see get_array()
+        arr = self.get_array() if return_rgb_array else None
         self.window.flip()
         self.onetime_geoms = []
         return arr if return_rgb_array else self.isopen
 
+    # Retained geometry
+    def retained(self, key, factory):
+        """
+        Returns the retained shape with the given key, and creates it with factory(viewer) the first time. A shape is
+        kept as long as it is asked for before every draw_retained(), and until reset_retained() is called, which the
+        envs do at the start of each episode.
+        """
+        self.used_shapes.add(key)
+        shape = self.retained_shapes.get(key)
+        if shape is None:
+            shape = self.retained_shapes[key] = factory(self)
+        return shape
+
+    def reset_retained(self):
+        for shape in self.retained_shapes.values():
+            shape.delete()
+        self.retained_shapes = {}
+        self.used_shapes = set()
+
+    def draw_retained(self):
+        """Deletes the shapes that weren't asked for since the last call, e.g. of removed objects, and draws the rest."""
+        if len(self.used_shapes) < len(self.retained_shapes):
+            for key in [k for k in self.retained_shapes if k not in self.used_shapes]:
+                self.retained_shapes.pop(key).delete()
+        self.used_shapes = set()
+        self.batch.draw()
+
+    def make_shape(self, vertices, color, outline=(0, 0, 0), linewidth=1, layer=LAYER_OBJECTS, dynamic=True):
+        """Creates a filled convex polygon in this viewer's batch. See Shape."""
+        return Shape(self.batch, vertices, color=color, outline=outline, linewidth=linewidth, layer=layer,
+                     dynamic=dynamic)
+
+    def make_circle_shape(self, radius, color, origin=(0, 0), res=30, outline=(0, 0, 0), layer=LAYER_OBJECTS,
+                          dynamic=True):
+        ang = 2 * np.pi * np.arange(res) / res
+        vertices = np.stack([radius * np.cos(ang), radius * np.sin(ang)], axis=1) + np.ravel(origin)[:2]
+        return self.make_shape(vertices, color=color, outline=outline, layer=layer, dynamic=dynamic)
+
+    def make_polyline_shape(self, vertices, color, linewidth=1, closed=False, layer=LAYER_STATIC, dynamic=False):
+        return Shape(self.batch, vertices, color=None, outline=color, linewidth=linewidth, closed=closed, layer=layer,
+                     dynamic=dynamic)
+
     # Convenience
     def draw_circle(self, origin=(0,0), radius=10, res=30, filled=True, outline=True, **attrs):
         geom = make_circle(origin=origin, radius=radius, res=res, filled=filled)
@@ -158,13 +211,16 @@ class Viewer(object):
         self.add_onetime(geom)
         return geom
 
+    def frame_reader(self, width=None, height=None):
+        """The FrameReader for the bottom left width x height pixels of the window, which is kept between calls."""
+        size = (width or self.width, height or self.height)
+        if size not in self.frame_readers:
+            self.frame_readers[size] = FrameReader(*size)
+        return self.frame_readers[size]
+
     def get_array(self):
-        self.window.flip()
-        image_data = pyglet.image.get_buffer_manager().get_color_buffer().get_image_data()
-        self.window.flip()
-        arr = np.fromstring(image_data.data, dtype=np.uint8, sep='')
-        arr = arr.reshape(self.height, self.width, 4)
-        return arr[::-1,:,0:3]
+        """Reads the back buffer, which holds the frame that was drawn last. The array is reused by the next call."""
+        return self.frame_reader().read()
 
     def transform_vertices(self, points, translation, rotation, scale=1):
         res = []
@@ -190,6 +246,176 @@ class Viewer(object):
         self.close()
 
 
+class LineGroup(pyglet.graphics.OrderedGroup):
+    """Lines drawn with the given width, after the filled polygons with the same parent."""
+    def __init__(self, linewidth, parent=None):
+        super().__init__(1, parent)
+        self.linewidth = linewidth
+
+    def set_state(self):
+        glLineWidth(self.linewidth)
+
+    def unset_state(self):
+        glLineWidth(1)
+
+    def __eq__(self, other):
+        return super().__eq__(other) and self.linewidth == other.linewidth
+
+    def __hash__(self):
+        return hash((self.order, self.parent, self.linewidth))
+
+
+class Shape(object):
+    """
+    Retained geometry: a filled convex polygon, its outline, or both. The vertices are stored in a batch, and all
+    of the shapes in a layer are drawn with a single call per line width, no matter how many there are. Shapes
+    that aren't dynamic are given in world coordinates and uploaded once. Dynamic shapes are given in body
+    coordinates, and set_transform() writes the transformed vertices into the batch when the shape moves.
+    """
+    def __init__(self, batch, vertices, color, outline=None, linewidth=1, closed=True, layer=LAYER_OBJECTS,
+                 dynamic=True):
+        """
+        :param vertices: (n, 2) array of vertices, in body coordinates if dynamic and world coordinates otherwise
+        :param color: RGB fill colour, or None for no fill
+        :param outline: RGB colour of the outline, or None for no outline
+        :param closed: Whether the outline goes back to the first vertex
+        """
+        v = np.asarray(vertices, dtype=float).reshape(-1, 2)
+        n = len(v)
+        parent = pyglet.graphics.OrderedGroup(layer)
+        coords = tuple(v.ravel().tolist())
+        usage = 'stream' if dynamic else 'static'
+        self.dynamic = dynamic
+        self._vertices = v
+        self._transform = (0.0, 0.0, 0.0)
+        self._color = self._outline_color = None
+
+        self.fill = None
+        if color is not None and n >= 3:
+            indices = np.stack([np.zeros(n - 2, dtype=int), np.arange(1, n - 1), np.arange(2, n)], axis=1)
+            self.fill = batch.add_indexed(n, GL_TRIANGLES, pyglet.graphics.OrderedGroup(0, parent),
+                                          indices.ravel().tolist(), ('v2f/' + usage, coords), ('c4f/dynamic', (0,) * 4*n))
+            self.set_color(color)
+
+        self.outline = None
+        if outline is not None and n >= 2:
+            starts = np.arange(n if closed else n - 1)
+            indices = np.stack([starts, (starts + 1) % n], axis=1)
+            self.outline = batch.add_indexed(n, GL_LINES, LineGroup(linewidth, parent),
+                                             indices.ravel().tolist(), ('v2f/' + usage, coords),
+                                             ('c4f/dynamic', (0,) * 4*n))
+            self.set_outline_color(outline)
+
+    def set_transform(self, position, angle=0.0):
+        """Moves a dynamic shape. The vertices are only uploaded if the position or angle change."""
+        if not self.dynamic:
+            raise ValueError('Only dynamic shapes can be moved.')
+        transform = (float(position[0]), float(position[1]), float(angle))
+        if transform == self._transform:
+            return
+        self._transform = transform
+        c, s = cos(transform[2]), sin(transform[2])
+        coords = (self._vertices @ np.array([[c, s], [-s, c]]) + transform[:2]).ravel().tolist()
+        for vertex_list in (self.fill, self.outline):
+            if vertex_list is not None:
+                vertex_list.vertices[:] = coords
+
+    def set_color(self, color):
+        """Sets the fill colour. The colours are only uploaded if they change."""
+        if self.fill is not None and tuple(color) != self._color:
+            self.fill.colors[:] = (tuple(color[:3]) + (1.0,)) * self.fill.get_size()
+            self._color = tuple(color)
+
+    def set_outline_color(self, color):
+        if self.outline is not None and tuple(color) != self._outline_color:
+            self.outline.colors[:] = (tuple(color[:3]) + (1.0,)) * self.outline.get_size()
+            self._outline_color = tuple(color)
+
+    def delete(self):
+        for vertex_list in (self.fill, self.outline):
+            if vertex_list is not None:
+                vertex_list.delete()
+        self.fill = self.outline = None
+
+
+class FrameReader(object):
+    """
+    Reads the bottom left width x height pixels of the current framebuffer into a reused (height, width, 3) uint8
+    array. The frames are returned as flipped views of that array, so they are overwritten by the next read.
+
+    read() reads the frame synchronously. read_async() starts reading the frame into one of two pixel buffer
+    objects and returns the frame that was started by the previous call, so the GPU copies frame N while frame N+1
+    is drawn. Falls back to synchronous reads if pixel buffer objects aren't supported.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.buffer = np.zeros((height, width, 3), dtype=np.uint8)
+        self.pending = False
+        self._index = 0
+        self._pbos = None
+        if pyglet.gl.gl_info.have_version(2, 1) or pyglet.gl.gl_info.have_extension('GL_ARB_pixel_buffer_object'):
+            self._pbos = (GLuint * 2)()
+            glGenBuffers(2, self._pbos)
+            for pbo in self._pbos:
+                glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+                glBufferData(GL_PIXEL_PACK_BUFFER, self.buffer.nbytes, None, GL_STREAM_READ)
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+    @property
+    def frame(self):
+        """The last frame that was read, flipped so that the first row is the top of the window."""
+        return self.buffer[::-1]
+
+    def read(self):
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glReadPixels(0, 0, self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE,
+                     self.buffer.ctypes.data_as(ctypes.POINTER(GLubyte)))
+        return self.frame
+
+    def read_async(self):
+        """
+        Starts reading the current frame, and returns the frame started by the previous call, or None if there is no
+        previous frame.
+        """
+        if self._pbos is None:
+            return self.read()
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self._pbos[self._index])
+        glReadPixels(0, 0, self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE, 0)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self._index = 1 - self._index
+        frame = self._collect() if self.pending else None
+        self.pending = True
+        return frame
+
+    def flush(self):
+        """Waits for the frame started by the last call to read_async() and returns it, or None if there is none."""
+        if self._pbos is None or not self.pending:
+            return None
+        self._index = 1 - self._index
+        frame = self._collect()
+        self._index = 1 - self._index
+        self.pending = False
+        return frame
+
+    def _collect(self):
+        """Copies the pixel buffer object at the current index into the array, the only copy of the frame on the CPU."""
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self._pbos[self._index])
+        ptr = glMapBuffer(GL_PIXEL_PACK_BUFFER, GL_READ_ONLY)
+        if ptr:
+            ctypes.memmove(self.buffer.ctypes.data, ptr, self.buffer.nbytes)
+            glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return self.frame
+
+    def delete(self):
+        if self._pbos is not None:
+            glDeleteBuffers(2, self._pbos)
+            self._pbos = None
+        self.pending = False
+
+
 def _add_attrs(geom, attrs):
     if "color" in attrs:
         geom.set_color(*attrs["color"])
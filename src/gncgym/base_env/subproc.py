@@ -0,0 +1,225 @@
+import traceback
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+"""
+Runs BaseScenario envs in worker processes. This is meant for scenarios that can't be stepped in lockstep by
+VectorScenario, e.g. because generate_scenario() or the obstacles do things that aren't batched in NumPy.
+
+The observations, rewards, done flags and actions of all envs live in a single shared memory block, which the
+workers read from and write to directly, so only the commands and the (usually empty) info dicts are sent through
+the pipes at each step.
+"""
+
+
+def _buffer_views(buf, num_envs, obs_shape, action_shape):
+    """
+    Lays out the shared buffers in the memory block buf. Returns a dict of arrays that are views into buf, and
+    the number of bytes used. Called with buf=None to compute the size of the block without creating the views.
+    """
+    layout = (
+        ('obs', (num_envs,) + tuple(obs_shape), np.float64),
+        ('actions', (num_envs,) + tuple(action_shape), np.float64),
+        ('rewards', (num_envs,), np.float64),
+        ('dones', (num_envs,), np.bool_),
+    )
+    views = {}
+    offset = 0
+    for name, shape, dtype in layout:
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if buf is not None:
+            views[name] = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+        offset += nbytes
+    return views, offset
+
+
+def _worker(conn, scenario, num_envs, kwargs):
+    """
+    Main loop of the worker processes. The worker owns num_envs envs, which make up the rows start:stop of the
+    shared buffers. Every command gets exactly one reply, (True, result) or (False, traceback).
+    """
+    shm = None
+    try:
+        envs = [scenario(**kwargs) for _ in range(num_envs)]
+        # The scenarios don't declare an observation space, so the shape is found by resetting once
+        obs = np.asarray(envs[0].reset())
+        conn.send((True, (obs.shape, envs[0]._model_input_space.shape)))
+
+        while True:
+            cmd, data = conn.recv()
+            try:
+                if cmd == 'attach':
+                    name, start, stop, total, obs_shape, action_shape = data
+                    shm = shared_memory.SharedMemory(name=name)
+                    views, _ = _buffer_views(shm.buf, total, obs_shape, action_shape)
+                    obs, actions, rewards, dones = (views[k][start:stop] for k in ('obs', 'actions', 'rewards', 'dones'))
+                    result = None
+
+                elif cmd == 'seed':
+                    result = [env.seed(s)[0] for env, s in zip(envs, data)]
+
+                elif cmd == 'reset':
+                    for i, env in enumerate(envs):
+                        obs[i] = env.reset()
+                    result = None
+
+                elif cmd == 'step':
+                    result = []
+                    for i, env in enumerate(envs):
+                        ob, r, done, info = env.step(actions[i])
+                        if done:
+                            info = dict(info, terminal_observation=np.array(ob))
+                            ob = env.reset()
+                        obs[i], rewards[i], dones[i] = ob, r, done
+                        result.append(info)
+
+                elif cmd == 'close':
+                    for env in envs:
+                        env.close()
+                    conn.send((True, None))
+                    break
+
+                else:
+                    raise ValueError('Unknown command {}'.format(cmd))
+
+                conn.send((True, result))
+            except Exception:
+                conn.send((False, traceback.format_exc()))
+
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        conn.send((False, traceback.format_exc()))
+    finally:
+        if shm is not None:
+            # Drop the views before closing, the block can't be closed while they are exported
+            obs = actions = rewards = dones = views = None
+            shm.close()
+        conn.close()
+
+
+class SubprocVectorScenario:
+    """
+    Steps N envs that are spread over K worker processes. Each worker owns a contiguous block of the envs and steps
+    them one after the other, the workers run in parallel. Like VectorScenario, finished envs are reset
+    automatically during step(), and the last observation of the finished episode is returned in
+    info['terminal_observation'].
+
+    The workers are started with the forkserver start method by default, which preloads gncgym in the server so that
+    each worker is forked with gncgym and gym already imported. The envs are headless unless headless=False is passed,
+    in which case each worker imports pyglet and opens its own viewers. The scenario class and kwargs must be
+    picklable.
+
+    The arrays returned by reset() and step() are views into the shared memory, and are overwritten by the next call.
+    Copy them if they need to be kept.
+    """
+
+    def __init__(self, scenario, num_envs, num_workers=None, seed=None, start_method='forkserver', **kwargs):
+        """
+        :param scenario: Scenario class, a subclass of BaseScenario
+        :param num_envs: Number of envs to simulate
+        :param num_workers: Number of worker processes, defaults to one per core but no more than num_envs
+        :param seed: Env i is seeded with seed + i, or randomly if seed is None
+        :param start_method: multiprocessing start method of the workers
+        :param kwargs: Passed on to the scenario constructor
+        """
+        kwargs.setdefault('headless', True)
+        if num_workers is None:
+            num_workers = mp.cpu_count()
+        num_workers = max(1, min(num_workers, num_envs))
+
+        self.num_envs = num_envs
+        self.closed = False
+        self._shm = None
+
+        ctx = mp.get_context(start_method)
+        if start_method == 'forkserver':
+            ctx.set_forkserver_preload(['gncgym'])
+
+        # Split the envs into contiguous blocks, one per worker
+        bounds = np.linspace(0, num_envs, num_workers + 1).round().astype(int)
+        self._slices = [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:])]
+
+        self._conns, self._procs = [], []
+        for s in self._slices:
+            parent_conn, child_conn = ctx.Pipe()
+            proc = ctx.Process(target=_worker, args=(child_conn, scenario, s.stop - s.start, kwargs), daemon=True)
+            proc.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._procs.append(proc)
+
+        try:
+            self.obs_shape, self.action_shape = self._recv_all()[0]
+            _, nbytes = _buffer_views(None, num_envs, self.obs_shape, self.action_shape)
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._buffers, _ = _buffer_views(self._shm.buf, num_envs, self.obs_shape, self.action_shape)
+            for conn, s in zip(self._conns, self._slices):
+                conn.send(('attach', (self._shm.name, s.start, s.stop, num_envs, self.obs_shape, self.action_shape)))
+            self._recv_all()
+        except Exception:
+            self.close()
+            raise
+
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        for conn, s in zip(self._conns, self._slices):
+            conn.send(('seed', [None if seed is None else seed + i for i in range(s.start, s.stop)]))
+        return [x for seeds in self._recv_all() for x in seeds]
+
+    def reset(self):
+        self._send_all('reset')
+        self._recv_all()
+        return self._buffers['obs']
+
+    def step(self, actions):
+        """
+        :param actions: (N, m) array of inputs, one row per env
+        :return: (obs, rewards, dones, infos), with obs an (N, obs_dim) array, rewards and dones (N,) arrays and
+                 infos a list of N dicts.
+        """
+        self._buffers['actions'][...] = np.reshape(actions, self._buffers['actions'].shape)
+        self._send_all('step')
+        infos = [info for worker_infos in self._recv_all() for info in worker_infos]
+        return self._buffers['obs'], self._buffers['rewards'], self._buffers['dones'], infos
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        for conn, proc in zip(self._conns, self._procs):
+            if proc.is_alive():
+                try:
+                    conn.send(('close', None))
+                    conn.recv()
+                except (BrokenPipeError, EOFError):
+                    pass
+        for conn, proc in zip(self._conns, self._procs):
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+            conn.close()
+
+        if self._shm is not None:
+            self._buffers = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
+
+    def _send_all(self, cmd, data=None):
+        for conn in self._conns:
+            conn.send((cmd, data))
+
+    def _recv_all(self):
+        replies = [conn.recv() for conn in self._conns]
+        for ok, payload in replies:
+            if not ok:
+                raise RuntimeError('Error in worker process:\n' + payload)
+        return [payload for _, payload in replies]
@@ -0,0 +1,112 @@
+import numpy as np
+from types import SimpleNamespace
+
+from gncgym import simulator as sim
+from gncgym.simulator.solvers import make_solver
+import gncgym.definitions as gncdefs
+
+
+class VectorScenario:
+    """
+    Steps N copies of a scenario in lockstep. The states of all of the vessels are kept in one (N, n) array, and the
+    model, navigator and objective are evaluated for all of them at once with array operations, instead of calling
+    BaseScenario.step() on N envs in a Python loop.
+
+    The scenario instances are only used to generate new episodes with reset_objective() and their own seeded RNG,
+    so each episode is identical to the one the single env would generate. The scenario must mix in a model that
+    implements dynamics_batch(), a navigator that implements navigate_batch(), and an objective that implements
+    init_objective_batch(), load_objective_batch() and eval_objective_batch(), like SupplyShip3DOF,
+    IdentityNavigator and PathFollowing.
+
+    Envs whose episodes end are reset automatically during step(). The last observation of the finished episode is
+    then returned in info['terminal_observation'], and the observation returned for that env is the first one of
+    the new episode.
+    """
+
+    def __init__(self, scenario, num_envs, seed=None, **kwargs):
+        """
+        :param scenario: Scenario class, a subclass of BaseScenario
+        :param num_envs: Number of envs to simulate
+        :param seed: Env i is seeded with seed + i, or randomly if seed is None
+        :param kwargs: Passed on to the scenario constructor. The envs are never rendered, so headless defaults to True.
+        """
+        kwargs.setdefault('headless', True)
+        self.num_envs = num_envs
+        self.envs = [scenario(**kwargs) for _ in range(num_envs)]
+        self.template = self.envs[0]
+
+        self.sim_context = sim.SimContext(solver=self.template.sim_solver, step_size=self.template.sim_step_size)
+        self._solve = make_solver(self.sim_context.solver, axis=-1, **self.sim_context.solver_options)
+
+        # Columns of the model states in the full state vector, see gncgym.definitions.variables
+        self._state_index = [gncdefs.variables.index(k) for k in self.template.state_map]
+        self._input_shape = self.template._model_input_space.shape
+
+        self.states = np.zeros((num_envs, len(self._state_index)))
+        self.elapsed = np.zeros(num_envs)
+        self.objective = SimpleNamespace()
+        self.template.init_objective_batch(self.objective, num_envs)
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        return [env.seed(None if seed is None else seed + i)[0] for i, env in enumerate(self.envs)]
+
+    def reset(self):
+        self.sim_context.init(solver=self.sim_context.solver, step_size=self.sim_context.dt,
+                              **self.sim_context.solver_options)
+        return self._reset_envs(np.arange(self.num_envs))
+
+    def step(self, actions):
+        """
+        :param actions: (N, m) array of inputs, one row per env
+        :return: (obs, rewards, dones, infos), with obs an (N, obs_dim) array, rewards and dones (N,) arrays and
+                 infos a list of N dicts.
+        """
+        actions = np.reshape(np.asarray(actions, dtype=float), (self.num_envs,) + self._input_shape)
+        self.sim_context.step()
+        self.elapsed += self.sim_context.dt
+        self.states[...] = self._solve(self.template.dynamics_batch, self.states, actions, self.sim_context.dt)
+        for env in self.envs:
+            for o in env.objects:
+                o.update(self.sim_context)
+
+        obs, rewards, dones = self._evaluate(slice(None), actions)
+
+        infos = [{'contacts': contacts} for contacts in self.objective.contacts]
+        finished = np.flatnonzero(dones)
+        if len(finished) > 0:
+            for i in finished:
+                infos[i]['terminal_observation'] = obs[i].copy()
+                infos[i]['episode'] = {'r': float(self.objective.reward[i]), 't': float(self.elapsed[i])}
+            obs[finished] = self._reset_envs(finished)
+
+        return obs, rewards, dones, infos
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+    def _reset_envs(self, idx):
+        """Starts new episodes in the envs with the given indices, and returns their first observations."""
+        for i in idx:
+            env = self.envs[i]
+            env.objective = SimpleNamespace()
+            initial_state = env.reset_objective(env.objective, env.np_random)
+            self.states[i] = [float(np.squeeze(initial_state[k])) for k in env.state_map]
+            self.template.load_objective_batch(self.objective, i, env.objective)
+        self.elapsed[idx] = 0
+
+        # Like BaseScenario.reset(), step the model once with zero input before making the first observation
+        action = np.zeros((len(idx),) + self._input_shape)
+        self.states[idx] = self._solve(self.template.dynamics_batch, self.states[idx], action, self.sim_context.dt)
+        obs, _, _ = self._evaluate(idx, action)
+        return obs
+
+    def _evaluate(self, idx, actions):
+        states = self.states[idx]
+        full_states = np.zeros((len(states), len(gncdefs.variables)))
+        full_states[:, self._state_index] = states
+
+        states_est = self.template.navigate_batch(full_states)
+        objects = [self.envs[i].objects for i in np.arange(self.num_envs)[idx]]
+        return self.template.eval_objective_batch(self.objective, idx, actions, states_est, full_states, objects)
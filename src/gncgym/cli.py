@@ -1,8 +1,9 @@
 import click
 import inspect
 import gncgym.scenarios.example_scenarios as scenarios
-from gncgym.base_env.base import BaseScenario
+from gncgym.base_env.base import BaseScenario, FPS
 from gncgym.play import play_scenario
+from gncgym.recording import VideoRecorder
 
 
 @click.group()
@@ -24,14 +25,59 @@ def cli():
               default='ExampleScenario',
               help='The scenario that you want to run.')
 
-def play(model, scenario):
+@click.option('--record', default=None, help='Record the episodes to this video file, e.g. out.mp4.')
+@click.option('--frame-skip', default=1, help='Only record every n\'th frame.')
+@click.option('--scale', default=1.0, help='Downscale the recorded frames by this factor.')
+@click.option('--speed', default=1.0, help='Fast-forward the simulation by this factor.')
+@click.option('--fps', default=FPS, help='Target frame rate of the window.')
+def play(model, scenario, record, frame_skip, scale, speed, fps):
     """
 
     :param model:
     :param scenario:
     :return:
     """
-    play_scenario(scenario)
+    play_scenario(scenario, record=record, frame_skip=frame_skip, scale=scale, speed=speed, fps=fps)
+
+
+@cli.command()
+@click.argument('output')
+@click.option('--scenario', default='ExampleScenario', help='The scenario that you want to record.')
+@click.option('--steps', default=1000, help='Number of steps to simulate.')
+@click.option('--seed', default=None, type=int, help='Seed of the scenario.')
+@click.option('--action', default='0.5,0', help='Constant action applied at every step, comma separated.')
+@click.option('--frame-skip', default=1, help='Only record every n\'th frame.')
+@click.option('--scale', default=1.0, help='Downscale the frames by this factor.')
+@click.option('--ffmpeg', default='ffmpeg', help='The ffmpeg executable.')
+def record(output, scenario, steps, seed, action, frame_skip, scale, ffmpeg):
+    """
+    Records a video of a scenario without opening a window. The frames are drawn with the software rasteriser, so
+    this works on machines without a display.
+    """
+    env = getattr(scenarios, scenario)(headless=True)
+    env.seed(seed)
+    env.reset()
+    a = [float(x) for x in action.split(',')]
+    with VideoRecorder(output, fps=FPS / frame_skip, frame_skip=frame_skip, scale=scale, ffmpeg=ffmpeg) as recorder:
+        for _ in range(steps):
+            _, _, done, _ = env.step(a)
+            recorder.add_frame(env.render(mode='rgb_array'))
+            if done:
+                env.reset()
+    env.close()
+    click.echo('Recorded {} frames to {}'.format(recorder.frames_written, output))
+
+
+@cli.command()
+@click.argument('name')
+@click.option('--fps', default=FPS, help='Frame rate of the window.')
+def watch(name, fps):
+    """
+    Opens a window that shows an env running in another process, which publishes its snapshots to the shared memory
+    block NAME, see BaseScenario.publish_snapshots().
+    """
+    from gncgym.base_env.remote import watch
+    watch(name, fps=fps)
 
 
 @cli.command()
@@ -0,0 +1,290 @@
+import numpy as np
+from collections import namedtuple
+
+"""
+Collision detection between the vessel and the objects of a scenario.
+
+Bodies are circles or convex polygons. The broad phase sorts the bounding circles of the bodies along the x axis and
+sweeps over them (sweep and prune), so only bodies whose bounding boxes overlap are passed on to the narrow phase,
+which tests the exact shapes with the separating axis theorem.
+"""
+
+# Contact between a body and others[index]. depth is the penetration depth, and normal the unit vector along which
+# the bodies should be separated, pointing from the body towards the other.
+Contact = namedtuple('Contact', ['index', 'depth', 'normal'])
+
+
+class Body:
+    """
+    Collision shape of an object. A circle if vertices is None, otherwise a convex polygon given by its vertices in
+    body coordinates, which are rotated by angle and translated to position.
+    """
+    def __init__(self, position, radius=0.0, angle=0.0, vertices=None):
+        self.position = np.array(np.ravel(position)[:2], dtype=float)
+        self.angle = float(np.ravel(angle)[0]) if np.ndim(angle) > 0 else float(angle)
+        self.vertices = None if vertices is None else np.array(vertices, dtype=float)
+        if self.vertices is None:
+            self.radius = float(radius)
+        else:
+            # Bounding circle of the polygon
+            self.radius = float(np.max(np.linalg.norm(self.vertices, axis=1)))
+
+    @classmethod
+    def of(cls, obj):
+        """Collision shape of an EnvObject, a polygon if it has vertices and a circle otherwise."""
+        return cls(obj.position, radius=obj.radius, angle=obj.angle, vertices=getattr(obj, 'vertices', None))
+
+    def polygon(self):
+        """Vertices in world coordinates."""
+        c, s = np.cos(self.angle), np.sin(self.angle)
+        return self.vertices @ np.array([[c, s], [-s, c]]) + self.position
+
+
+class BodySet:
+    """
+    Bodies of the objects of an env, with the centers and radii of their bounding circles stacked in arrays for the
+    broad phase. It is built once for a list of objects, after which update() only moves the bodies of the objects
+    that move, i.e. those with a state (EnvObject.state_size > 0).
+    """
+    def __init__(self, bodies, objects=None):
+        """
+        :param bodies: List of Body
+        :param objects: The EnvObjects of the bodies, if any, which update() reads the poses from
+        """
+        self.bodies = list(bodies)
+        self.objects = objects
+        self.centers = np.reshape([b.position for b in self.bodies], (-1, 2)).astype(float)
+        self.radii = np.array([b.radius for b in self.bodies], dtype=float)
+        self.moving = [] if objects is None else [k for k, o in enumerate(objects) if o.state_size > 0]
+
+    @classmethod
+    def of(cls, objects):
+        return cls([Body.of(o) for o in objects], objects)
+
+    def __len__(self):
+        return len(self.bodies)
+
+    def body(self, k):
+        return self.bodies[k]
+
+    def update(self):
+        """Copies the poses of the moving objects into their bodies."""
+        for k in self.moving:
+            o, body = self.objects[k], self.bodies[k]
+            body.position[:] = np.ravel(o.position)[:2]
+            body.angle = float(np.ravel(o.angle)[0])
+            self.centers[k] = body.position
+
+
+class HullSet:
+    """
+    Convex polygons given by arrays of their poses and vertices, e.g. the hulls of the vessels of a vector env. Bodies
+    are only made for the polygons that the broad phase pairs with something.
+    """
+    def __init__(self, positions, angles, vertices):
+        """
+        :param positions: (n, 2) array
+        :param angles: (n,) array
+        :param vertices: (k, 2) array of vertices in body coordinates shared by all polygons, or an (n, k, 2) array
+        """
+        self.centers = np.reshape(np.asarray(positions, dtype=float), (-1, 2))
+        self.angles = np.ravel(np.asarray(angles, dtype=float))
+        self.vertices = np.broadcast_to(np.asarray(vertices, dtype=float), (len(self.centers),) + np.shape(vertices)[-2:])
+        self.radii = np.max(np.linalg.norm(self.vertices, axis=2), axis=1)
+
+    def __len__(self):
+        return len(self.centers)
+
+    def body(self, k):
+        return Body(self.centers[k], angle=self.angles[k], vertices=self.vertices[k])
+
+
+class WorldBodies:
+    """
+    The bodies of the objects of several independent worlds, e.g. the envs of a vector env, stacked into one
+    BodySet. owner is the world of each body and local its index among the objects of that world.
+    """
+    def __init__(self, worlds, objects=None):
+        """
+        :param worlds: List of n BodySet or lists of Body
+        :param objects: The lists of EnvObjects of the worlds, if any, which update() reads the poses from
+        """
+        counts = [len(w) for w in worlds]
+        if len(worlds) == 1 and isinstance(worlds[0], BodySet):
+            self.bodies = worlds[0]
+        else:
+            flat = None if objects is None else [o for world in objects for o in world]
+            self.bodies = BodySet([b for w in worlds for b in getattr(w, 'bodies', w)], flat)
+        self.counts = np.array(counts, dtype=int)
+        self.owner = np.repeat(np.arange(len(worlds)), self.counts)
+        self.local = np.arange(self.counts.sum()) - np.repeat(np.cumsum(self.counts) - self.counts, self.counts)
+        self._key = None if objects is None else (tuple(map(id, objects)), tuple(counts))
+
+    @classmethod
+    def of(cls, objects):
+        """:param objects: List of the lists of EnvObjects of each world"""
+        return cls([[Body.of(o) for o in world] for world in objects], objects)
+
+    def matches(self, objects):
+        """Whether this was built for the same lists of objects, with the same lengths."""
+        return self._key == (tuple(map(id, objects)), tuple(map(len, objects)))
+
+    def update(self):
+        self.bodies.update()
+
+
+def track_bodies(bodies, objects):
+    """
+    Returns the BodySet of objects, reusing bodies if it was built for the same list. Objects are added or removed by
+    changing the length of the list or replacing it, a list whose items are swapped in place is not noticed.
+    """
+    if bodies is None or bodies.objects is not objects or len(bodies) != len(objects):
+        return BodySet.of(objects)
+    bodies.update()
+    return bodies
+
+
+def track_worlds(worlds, objects):
+    """Like track_bodies(), for the lists of objects of several worlds."""
+    if worlds is None or not worlds.matches(objects):
+        return WorldBodies.of(objects)
+    worlds.update()
+    return worlds
+
+
+def sweep_and_prune(centers, radii, groups=None):
+    """
+    Finds the pairs of bodies whose bounding boxes overlap.
+
+    :param centers: (n, 2) array of the centers of the bounding circles
+    :param radii: (n,) array of the radii of the bounding circles
+    :param groups: Optional (n,) array of integer group labels. Only bodies in the same group are paired, which is
+                   used to check the bodies of several envs in one sweep.
+    :return: (i, j), arrays of the indices of the bodies in each pair, with i < j
+    """
+    centers = np.reshape(np.asarray(centers, dtype=float), (-1, 2))
+    radii = np.asarray(radii, dtype=float)
+    if len(centers) < 2:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+    x = centers[:, 0]
+    if groups is not None:
+        # Move the groups apart along the x axis, so that the intervals of different groups never overlap
+        span = np.ptp(x) + 2 * np.max(radii) + 1
+        x = x + np.asarray(groups) * span
+
+    lo, hi = x - radii, x + radii
+    order = np.argsort(lo)
+    lo_sorted = lo[order]
+
+    # Each body overlaps along x with the bodies after it in the sorted order whose intervals start before it ends
+    ends = np.searchsorted(lo_sorted, hi[order], side='right')
+    counts = ends - np.arange(len(order)) - 1
+    first = np.repeat(np.arange(len(order)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    second = first + 1 + offsets
+    i, j = order[first], order[second]
+
+    # Prune the pairs that don't overlap along y
+    y, r = centers[:, 1], radii
+    keep = np.abs(y[i] - y[j]) <= r[i] + r[j]
+    i, j = i[keep], j[keep]
+    return np.minimum(i, j), np.maximum(i, j)
+
+
+def collide(a, b):
+    """
+    Exact test between two bodies.
+    :return: (depth, normal) if they overlap, with the normal pointing from a to b, or None
+    """
+    if a.vertices is None and b.vertices is None:
+        d = b.position - a.position
+        dist = np.hypot(*d)
+        depth = a.radius + b.radius - dist
+        if depth <= 0:
+            return None
+        return depth, d / dist if dist > 0 else np.array([1.0, 0.0])
+
+    if a.vertices is None:
+        result = collide(b, a)
+        return None if result is None else (result[0], -result[1])
+
+    poly_a = a.polygon()
+    if b.vertices is None:
+        # The axes of a circle and a polygon are the edge normals and the axis through the closest vertex
+        closest = poly_a[np.argmin(np.sum((poly_a - b.position)**2, axis=1))]
+        axes = np.vstack([_edge_normals(poly_a), [b.position - closest]])
+        project_b = lambda n: (np.dot(b.position, n) - b.radius, np.dot(b.position, n) + b.radius)
+    else:
+        poly_b = b.polygon()
+        axes = np.vstack([_edge_normals(poly_a), _edge_normals(poly_b)])
+        project_b = lambda n: (np.min(poly_b @ n), np.max(poly_b @ n))
+
+    depth, normal = np.inf, None
+    for n in axes:
+        length = np.hypot(*n)
+        if length == 0:
+            continue
+        n = n / length
+        a_min, a_max = np.min(poly_a @ n), np.max(poly_a @ n)
+        b_min, b_max = project_b(n)
+        overlap = min(a_max - b_min, b_max - a_min)
+        if overlap <= 0:
+            return None
+        if overlap < depth:
+            depth, normal = overlap, n
+
+    # Orient the normal from a to b
+    if np.dot(b.position - a.position, normal) < 0:
+        normal = -normal
+    return depth, normal
+
+
+def _edge_normals(polygon):
+    edges = np.roll(polygon, -1, axis=0) - polygon
+    return np.stack([-edges[:, 1], edges[:, 0]], axis=1)
+
+
+def find_contacts(body, others):
+    """
+    Finds the bodies in others that overlap with body.
+    :param body: Body
+    :param others: BodySet or list of Body
+    :return: List of Contact, sorted by index
+    """
+    return find_contacts_batch([body], [others])[0]
+
+
+def find_contacts_batch(bodies, others):
+    """
+    Finds contacts for several independent worlds at once, e.g. the vessels of a vector env, with a single sweep.
+
+    :param bodies: n bodies, one per world, as a list of Body, a BodySet or a HullSet
+    :param others: The objects of each world, as a WorldBodies or a list of n BodySet or lists of Body
+    :return: List of n lists of Contact
+    """
+    if isinstance(bodies, list):
+        bodies = BodySet(bodies)
+    if not isinstance(others, WorldBodies):
+        others = WorldBodies(others)
+    n = len(bodies)
+    contacts = [[] for _ in range(n)]
+    if len(others.owner) == 0:
+        return contacts
+
+    centers = np.concatenate([bodies.centers, others.bodies.centers])
+    radii = np.concatenate([bodies.radii, others.bodies.radii])
+    owner = np.concatenate([np.arange(n), others.owner])
+
+    # Bodies come before objects, so in each pair between a body and an object, i is the body
+    i, j = sweep_and_prune(centers, radii, groups=owner)
+    keep = (i < n) & (j >= n)
+    for i, k in zip(i[keep], j[keep] - n):
+        result = collide(bodies.body(i), others.bodies.body(k))
+        if result is not None:
+            contacts[i].append(Contact(int(others.local[k]), *result))
+
+    for c in contacts:
+        if len(c) > 1:
+            c.sort(key=lambda contact: contact.index)
+    return contacts
@@ -1,4 +1,6 @@
 import sys
+import copy
+import numpy as np
 from math import sqrt
 from collections import namedtuple
 
@@ -11,11 +13,11 @@ us to do things like:
 or
     distance(state1.position, state2.position)
 which is more resusable and clear when compared to numeric indexing.
-"""
-
 
-# TODO Numpy has something called Record Arrays, which can be used exactly the same as these named tuples, but based on
-#  the power of numpy arrays. This is the next step...
+States are StateArrays, which keep the variables in a NumPy structured array, so that one state and a batch of N
+states have the same attributes:
+    state.x, states.position[:, :2]
+"""
 
 this = sys.modules[__name__]
 
@@ -50,45 +52,136 @@ AngVel = namedtuple('AngVelocity', angvel_vars)
 Velocity = namedtuple('Velocity', [*linvel_vars, *angvel_vars])
 
 
-class State6DOF:
+# Structured dtype of a state. Besides the 12 variables, it has fields for the groups of variables that overlap them,
+# so that state['position'] is a (..., 3) view of x, y, z, and state['vector'] a (..., 12) view of all of them.
+STATE_DTYPE = np.dtype({
+    'names': [*this.variables, 'position', 'orientation', 'pose', 'linvel', 'angvel', 'velocity', 'vector'],
+    'formats': [np.float64] * 12 + [(np.float64, 3)] * 2 + [(np.float64, 6)] + [(np.float64, 3)] * 2 +
+               [(np.float64, 6), (np.float64, 12)],
+    'offsets': [8 * i for i in range(12)] + [0, 24, 0, 48, 72, 48, 0],
+})
+
+
+def _field(name):
+    def get(self):
+        return self.data[name]
+
+    def set(self, value):
+        self.data[name] = value
+    return property(get, set)
+
+
+class StateArray:
+    """
+    One state, or a batch of states, stored in a structured array of STATE_DTYPE. The attributes are views of the
+    array, so reading state.x or state.position doesn't copy anything, and writing to them changes the state:
+
+        states = StateArray((N,))
+        states.surge[:] = 1
+        states.position[:, :2]      # (N, 2) view of x and y
+        states[0].yaw               # 0-d view of the heading of the first state
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, shape=(), data=None):
+        """
+        :param shape: () for a single state, (N,) for a batch of N states
+        :param data: Structured array of STATE_DTYPE to wrap, used instead of allocating a new one
+        """
+        self.data = np.zeros(shape, dtype=STATE_DTYPE) if data is None else data
+
+    @classmethod
+    def from_vector(cls, values, keys=None):
+        """
+        :param values: (..., n) array of the values of the variables in keys
+        :param keys: Names of the n variables, in order. Defaults to all of the variables.
+        """
+        values = np.asarray(values, dtype=float)
+        state = cls.__new__(cls)
+        StateArray.__init__(state, values.shape[:-1])
+        if keys is None:
+            state.data['vector'] = values
+        else:
+            for i, k in enumerate(keys):
+                state.data[k] = values[..., i]
+        return state
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return StateArray(data=self.data[index, ...])
+
+    def copy(self):
+        state = copy.copy(self)
+        state.data = self.data.copy()
+        return state
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={}'.format(k, np.array2string(self.data[k], precision=3)) for k in this.variables))
+
+
+for _name in STATE_DTYPE.names:
+    setattr(StateArray, _name, _field(_name))
+
+
+class State6DOF(StateArray):
+    """
+    A single state, kept for the code that was written before StateArray. The variables are returned as floats, and
+    the groups of variables as named tuples, which are new objects at every access. New code should read the
+    variables directly, e.g. state.x instead of state.position.x.
+    """
+    __slots__ = ()
+
     def __init__(self, x=0, y=0, z=0, roll=0, pitch=0, yaw=0, surge=0, sway=0, heave=0, rollrate=0, pitchrate=0, yawrate=0):
-        self.x,         self.y,         self.z = x, y, z
-        self.roll,      self.pitch,     self.yaw = roll, pitch, yaw
-        self.surge,     self.sway,      self.heave = surge, sway, heave
-        self.rollrate,  self.pitchrate, self.yawrate = rollrate, pitchrate, yawrate
+        super().__init__()
+        self.data['vector'] = (x, y, z, roll, pitch, yaw, surge, sway, heave, rollrate, pitchrate, yawrate)
 
     @property
     def position(self):
-        return Position(self.x, self.y, self.z)
+        return Position(*self.data['position'].tolist())
 
     @property
     def orientation(self):
-        return Orientation(self.roll, self.pitch, self.yaw)
+        return Orientation(*self.data['orientation'].tolist())
 
     @property
     def pose(self):
-        return Pose(self.x, self.y, self.z, self.surge, self.sway, self.heave)
+        return Pose(*self.data['pose'].tolist())
 
     @property
     def linVelocity(self):
-        return LinVel(self.surge, self.sway, self.heave)
+        return LinVel(*self.data['linvel'].tolist())
 
     @property
     def angVelocity(self):
-        return AngVel(self.rollrate, self.pitchrate, self.yawrate)
+        return AngVel(*self.data['angvel'].tolist())
 
     @property
     def velocity(self):
-        return Velocity(self.surge, self.sway, self.heave, self.rollrate, self.pitchrate, self.yawrate)
+        return Velocity(*self.data['velocity'].tolist())
 
     @velocity.setter
-    def velocity(self, surge, sway, heave, rollrate, pitchrate, yawrate):
-        self.surge = surge
-        self.sway = sway
-        self.heave = heave
-        self.rollrate = rollrate
-        self.pitchrate = pitchrate
-        self.yawrate = yawrate
+    def velocity(self, velocity):
+        self.data['velocity'] = velocity
+
+
+def _scalar_field(name):
+    def get(self):
+        return float(self.data[name])
+
+    def set(self, value):
+        self.data[name] = value
+    return property(get, set)
+
+
+for _name in this.variables:
+    setattr(State6DOF, _name, _scalar_field(_name))
 
 
 def add(v1, v2):
@@ -1,9 +1,7 @@
 import numpy as np
 from gym.spaces import Box
-from .gncUtilities import m2c, Rzyx
-from gncgym.utils import angwrap
 from gncgym.models import Model
-from gncgym.simulator.blocks import make_integrator_block
+from gncgym.simulator.blocks import make_ode_block
 
 """
 Originally made by Camilla Sterud.
@@ -56,6 +54,37 @@ def B(u):
     ])
 
 
+# Maps inputs in the model input space to thrust and rudder angle
+INPUT_SCALE = np.array([THRUST_MAX_AUV, RUDDER_MAX_AUV])
+INPUT_SCALE_COLUMN = INPUT_SCALE[:, None]
+
+
+def auv_dynamics(states, f):
+    """
+    Dynamics of N AUVs at once. D(u, v, r) is diagonal and B(u) only has two non-zero elements, so
+    D(u, v, r) @ nu and B(u) @ f are evaluated elementwise instead of building the matrices.
+
+    :param states: (N, 6) array of states [x, y, psi, u, v, r]
+    :param f: (N, 2) array of scaled inputs [thrust, rudder angle]
+    :return: (N, 6) array of state derivatives
+    """
+    psi, u, v, r = states[:, 2], states[:, 3], states[:, 4], states[:, 5]
+    nu = states[:, 3:]
+    cpsi, spsi = np.cos(psi), np.sin(psi)
+
+    D_nu = nu * np.abs(nu) * np.diag(D_quad)
+    B_f = np.zeros_like(D_nu)
+    B_f[:, 0] = f[:, 0]
+    B_f[:, 2] = N_uudr * u * u * f[:, 1]
+
+    state_dot = np.empty_like(states, dtype=float)
+    state_dot[:, 0] = cpsi*u - spsi*v
+    state_dot[:, 1] = spsi*u + cpsi*v
+    state_dot[:, 2] = r
+    state_dot[:, 3:] = (B_f - D_nu) @ M_inv.T
+    return state_dot
+
+
 """
 ####### Model #######
 """
@@ -68,39 +97,30 @@ class AUV2D(Model):
     def reset_model(self, x0):
         # Initialise the integrator and the model dynamics
         x0 = np.vstack(x0)  # Column vector
-        self._model_state = x0
-        self._model_integrate = make_integrator_block(x0)
+        self._model_integrate = make_ode_block(self._dynamics, x0, ctx=self.sim_context)
+        self._model_state = self._model_integrate.state
+        self._model_force = np.zeros((2, 1))
 
     def step_model(self, u, v=None):
-        f = np.vstack(u)  # f is always a column vector, no matter if u is either a row or column vector
+        # f is always a column vector, no matter if u is either a row or column vector
         # TODO move rescaling inside model equations
-        f[0, :] *= THRUST_MAX_AUV  # Rescale thrust
-        f[1, :] = f[1,:] * RUDDER_MAX_AUV  # Rescale angle
-        state_dot = self._dynamics(self._model_state, f)
-        self._model_state = self._model_integrate(state_dot)
+        f = self._model_force
+        f[:, 0] = np.ravel(u)
+        f *= INPUT_SCALE_COLUMN  # Rescale thrust and angle
+        self._model_state = self._model_integrate(f)
         return self._model_state
 
     def _dynamics(self, state, f):
         """
-        The dynamic model of the supply ship.
+        The dynamic model of the AUV.
         :param state: [eta, nu] = [x,y,psi,u,v,r]
         :param f: [u_des, delta_r]
         :return: state_dot
         """
+        return auv_dynamics(np.reshape(state, (1, 6)), np.reshape(f, (1, 2))).reshape(6, 1)
+
+    def dynamics_batch(self, states, u):
+        return auv_dynamics(states, u * INPUT_SCALE)
 
-        # Unpack state values and construct the velocity vector nu
-        _, _, psi, u, v, r = state
-        nu = np.array([u, v, r])
-        _D = D(u, v, r) @ nu
-        _B = B(u) @ f
-        eta_dot = Rzyx(0, 0, angwrap(psi)).dot(nu)
-        nu_dot = M_inv @ (B(u) @ f - D(u, v, r) @ nu)
-        return np.concatenate([eta_dot, nu_dot])
-
-    @property
-    def model_input_space(self):
-        return Box(low=np.array([0, -1]), high=np.array([+1, +1]), dtype=np.float32)
-
-    @property
-    def state_map(self):
-        return ('x','y','yaw','surge','sway','yawrate')
+    model_input_space = Box(low=np.array([0, -1]), high=np.array([+1, +1]), dtype=np.float32)
+    state_map = ('x', 'y', 'yaw', 'surge', 'sway', 'yawrate')
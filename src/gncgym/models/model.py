@@ -1,9 +1,20 @@
 import numpy as np
 import gym
 import logging
+from collections import namedtuple
 import gncgym.definitions as gncdefs
 
 
+# Checks done by Model._model() at every step, see Model.debug_level
+DEBUG_OFF = 0       # No checks
+DEBUG_WARN = 1      # Log a warning if the input has the wrong shape or lies outside of the input space
+DEBUG_STRICT = 2    # Raise a ValueError instead
+
+# The input space and state map of a model class, resolved once by Model.model_specs
+ModelSpecs = namedtuple('ModelSpecs', ['input_shape', 'input_low', 'input_high', 'state_map', 'state_index'])
+_model_specs = {}
+
+
 class Model:
     """
     Standard interface for models for use in the gncgym. Requires that the shape of the state, inputs (optional), and
@@ -14,13 +25,23 @@ class Model:
         u: input
         v: disturbances
         y: measurement
+    The blocks that a model creates (e.g. its integrator) should be given the model's sim_context, which is
+    set by the environment that owns the model.
+    Models are mixed into scenarios, so __init__() passes any arguments on to the next class in the MRO.
+    The input space and state map are read once per class, so they must be the same for every instance, e.g. class
+    attributes.
     """
 
-    def __init__(self, x0=None):
+    sim_context = None          # SimContext that the model's blocks belong to, the default context is used if None
+    debug_level = DEBUG_WARN    # Checks done on the input at every step, DEBUG_OFF for the fastest steps
+
+    def __init__(self, *args, **kwargs):
         # Initialise the integrator and the model dynamics
         self._model_state = None
         self._model_integrate = None
         self.ship_dynamics = None
+        self._model_output = None
+        super().__init__(*args, **kwargs)
 
     def reset_model(self, initial_state):
         raise NotImplementedError
@@ -28,11 +49,30 @@ class Model:
     def step_model(self, u, v=None):
         raise NotImplementedError('The _step() method must be defined by any subclass of Model.')
 
+    def get_model_state(self):
+        """The state that the model integrates, as a flat array in the order of the state map."""
+        return np.ravel(self._model_state)
+
+    def set_model_state(self, values):
+        """Overwrites the state that the model integrates, and the state returned by the last step."""
+        self._model_state[...] = np.reshape(values, np.shape(self._model_state))
+        self._model_output.vector[self.model_specs.state_index] = values
+
+    def dynamics_batch(self, states, u):
+        """
+        OPTIONAL method of a Model, used by the vectorised environments to simulate many vessels at once.
+        Takes an (N, n) array of states and an (N, m) array of inputs from the model input space, and returns
+        the (N, n) array of state derivatives, which must match what the model itself integrates.
+        """
+        raise NotImplementedError('The dynamics_batch() method has not been implemented by this model.')
+
     def _reset_model(self, initial_state):
+        # A new buffer per episode, so that the last state of the previous episode is not overwritten
+        self._model_output = gncdefs.State6DOF()
         if type(initial_state) is dict:
             self.reset_model([initial_state[k] for k in self.state_map])
-        elif type(initial_state) is gncdefs.State6DOF:
-            self.reset_model(np.array([v for v in initial_state if v is not None]))
+        elif isinstance(initial_state, gncdefs.StateArray):
+            self.reset_model(np.array([initial_state.data[k] for k in self.state_map]))
         else:
             raise ValueError('Invalid state type passed to _reset_model')
 
@@ -43,19 +83,45 @@ class Model:
         :param u: The input to the model. Must lie within the input_space for the model.
         :param v: The disturbance at this timestep. Optional. If included, must lied within the disturbance
                   space of the model.
-        :return:  State6DOF
+        :return:  State6DOF, a buffer owned by the model that is overwritten by the next step. Use copy() to keep it.
         """
-        u = np.array(u)
-        v = np.array(v) if v is not None else v
-        if not self._model_input_space.contains(u):
-            logging.warning("Input {} is out of input_space.")
+        specs = self.model_specs
+        u = np.asarray(u, dtype=float)
+        if self.debug_level > DEBUG_OFF:
+            self._check_input(u, specs)
 
-        if self.supports_disturbances():
-            raw_state = self.step_model(u, v)
+        if v is not None and self.supports_disturbances():
+            raw_state = self.step_model(u, np.asarray(v, dtype=float))
         else:
             raw_state = self.step_model(u)
 
-        return gncdefs.State6DOF(**{self.state_map[i]: float(value) for i, value in enumerate(raw_state)})
+        self._model_output.vector[specs.state_index] = raw_state.ravel()
+        return self._model_output
+
+    def _check_input(self, u, specs):
+        if u.shape != specs.input_shape:
+            error = 'Input {} should have shape {}.'.format(u, specs.input_shape)
+        elif np.any(u < specs.input_low) or np.any(u > specs.input_high):
+            error = 'Input {} is out of input_space.'.format(u)
+        else:
+            return
+        if self.debug_level >= DEBUG_STRICT:
+            raise ValueError(error)
+        logging.warning(error)
+
+    @property
+    def model_specs(self):
+        """The input space and state map of the model's class, resolved the first time they are needed."""
+        specs = _model_specs.get(type(self))
+        if specs is None:
+            space = self._model_input_space
+            specs = ModelSpecs(input_shape=space.shape,
+                               input_low=np.array(space.low, dtype=float),
+                               input_high=np.array(space.high, dtype=float),
+                               state_map=self.state_map,
+                               state_index=np.array([gncdefs.variables.index(k) for k in self.state_map]))
+            _model_specs[type(self)] = specs
+        return specs
 
     @property
     def _model_input_space(self):
@@ -105,7 +171,7 @@ class Model:
             raise TypeError("The output_map attribute must be of type tuple")
         if not all(key in gncdefs.variables for key in o_map):
             raise ValueError('One of the values in given output_map {} does not match'
-                             'one of the state fields: {}'.format(o_map, gncdefs.State6DOF._fields))
+                             'one of the state fields: {}'.format(o_map, gncdefs.variables))
         if len(set(o_map)) != len(o_map):
             raise ValueError('The output map does not specify unique keys.')
         self._output_map = o_map
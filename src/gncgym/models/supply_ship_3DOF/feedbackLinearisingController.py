@@ -6,7 +6,7 @@ from gncgym.simulator.blocks import \
     make_rate_limiting_block
 
 
-def make_feedback_linearising_controller_block():
+def make_feedback_linearising_controller_block(ctx=None):
     from .modelConstants import K1, K2, M_p, D_p
 
     # Controller constants (uses the supply ship model parameters)
@@ -15,14 +15,14 @@ def make_feedback_linearising_controller_block():
     D_r = 0.9
 
     # Create derivative blocks for each signal
-    der_u_r_dot = make_derivative_block()
-    der_psi_r_dot = make_derivative_block()
-    der_psi_r_dot_dot = make_derivative_block()
+    der_u_r_dot = make_derivative_block(ctx=ctx)
+    der_psi_r_dot = make_derivative_block(ctx=ctx)
+    der_psi_r_dot_dot = make_derivative_block(ctx=ctx)
 
     # Create saturation and rate-limiting blocks
-    saturate_rudder_angle = make_saturation_block(np.pi)
-    saturate_thruster_force = make_saturation_block(100000000)
-    rate_limit_thruster_force = make_rate_limiting_block(500000)
+    saturate_rudder_angle = make_saturation_block(np.pi, ctx=ctx)
+    saturate_thruster_force = make_saturation_block(100000000, ctx=ctx)
+    rate_limit_thruster_force = make_rate_limiting_block(500000, ctx=ctx)
 
     def feedback_linearizing_controller(state, nu_r, reference):
         _, _, psi, _, _, r = state.flatten()
@@ -10,15 +10,15 @@ from .shipDynamics import make_supply_ship_dynamics_block
 
 
 @sim.declare_block
-def make_supply_ship_block(initial_state=np.vstack([0, 0, 0, 0, 0, 0]), linearising_feedback=False):
+def make_supply_ship_block(initial_state=np.vstack([0, 0, 0, 0, 0, 0]), linearising_feedback=False, ctx=None):
     # Make sure that the given state is not changed
     state = deepcopy(initial_state)
 
     # Blocks
-    integrate = make_integrator_block(initial_state)
+    integrate = make_integrator_block(initial_state, ctx=ctx)
     model = make_supply_ship_dynamics_block()
     if linearising_feedback:
-        controller = make_feedback_linearising_controller_block()
+        controller = make_feedback_linearising_controller_block(ctx=ctx)
 
     def supply_ship(reference, disturbances=None):
         nonlocal state, integrate, model, controller
@@ -1,12 +1,10 @@
 import numpy as np
-from numpy import pi, vstack
+from numpy import pi
 from gym.spaces import Box
 from gncgym.models import Model
-from gncgym.simulator.blocks import make_integrator_block
+from gncgym.simulator.blocks import make_ode_block
 
-from gncgym.utils import angwrap
 from numpy.linalg import inv
-from .gncUtilities import m2c, Rzyx
 
 
 """
@@ -58,6 +56,38 @@ M_6DOF[5, 5] = M_p[2, 2]
 
 M_p_inv = inv(M_p)
 
+# Maps inputs in the model input space to thrust and rudder angle
+INPUT_SCALE = np.array([THRUST_MAX, pi])
+INPUT_SCALE_COLUMN = INPUT_SCALE[:, None]
+
+
+def ship_dynamics(states, f):
+    """
+    Dynamics of N supply ships at once, evaluated in closed form.
+
+    The Coriolis matrix is the 3DOF (surge, sway, yaw) part of m2c(M_6DOF, nu_6DOF), written out by hand:
+        C(nu) nu = [-a1*r, a0*r, a1*u - a0*v],  a0 = m00*u + m01*v,  a1 = m01*u + m11*v + m12*r
+    where m are elements of M_p.
+
+    :param states: (N, 6) array of states [x, y, psi, u, v, r]
+    :param f: (N, 2) array of scaled inputs [thrust, rudder angle]
+    :return: (N, 6) array of state derivatives
+    """
+    psi, u, v, r = states[:, 2], states[:, 3], states[:, 4], states[:, 5]
+    nu = states[:, 3:]
+    cpsi, spsi = np.cos(psi), np.sin(psi)
+
+    a0 = M_p[0, 0]*u + M_p[0, 1]*v
+    a1 = M_p[0, 1]*u + M_p[1, 1]*v + M_p[1, 2]*r
+    C_nu = np.stack([-a1*r, a0*r, a1*u - a0*v], axis=1)
+
+    state_dot = np.empty_like(states, dtype=float)
+    state_dot[:, 0] = cpsi*u - spsi*v
+    state_dot[:, 1] = spsi*u + cpsi*v
+    state_dot[:, 2] = r
+    state_dot[:, 3:] = (f @ B_p.T - C_nu - nu @ D_p.T) @ M_p_inv.T
+    return state_dot
+
 
 """
 ####### Model #######
@@ -71,16 +101,17 @@ class SupplyShip3DOF(Model):
     def reset_model(self, x0):
         # Initialise the integrator and the model dynamics
         x0 = np.vstack(x0)  # Column vector
-        self._model_state = x0
-        self._model_integrate = make_integrator_block(x0)
+        self._model_integrate = make_ode_block(self._dynamics, x0, ctx=self.sim_context)
+        self._model_state = self._model_integrate.state
+        self._model_force = np.zeros((2, 1))
 
     def step_model(self, u, v=None):
-        f = vstack(u)  # f is always a column vector, no matter if u is either a row or column vector
+        # f is always a column vector, no matter if u is either a row or column vector
         # TODO move rescaling inside model equations
-        f[0, :] *= THRUST_MAX  # Rescale thrust
-        f[1, :] = f[1,:] * pi  # Rescale angle
-        state_dot = self._dynamics(self._model_state, f)
-        self._model_state = self._model_integrate(state_dot)
+        f = self._model_force
+        f[:, 0] = np.ravel(u)
+        f *= INPUT_SCALE_COLUMN  # Rescale thrust and angle
+        self._model_state = self._model_integrate(f)
         return self._model_state
 
     def _dynamics(self, state, f):
@@ -90,31 +121,11 @@ class SupplyShip3DOF(Model):
         :param f: [u_des, delta_r]
         :return: state_dot
         """
+        return ship_dynamics(np.reshape(state, (1, 6)), np.reshape(f, (1, 2))).reshape(6, 1)
 
-        # Unpack state values and construct the velocity vector nu
-        _, _, psi, u, v, r = state
-        nu = np.array([u, v, r])
-
-        # Express nu in the 6 DOF system
-        nu_6DOF = np.array([u, v, 0, 0, 0, r])
-
-        # Calculate Coriolis matrix
-        C_6DOF = m2c(M_6DOF, nu_6DOF)
-
-        # Transform back to the 3 DOF representation
-        C_p = C_6DOF
-        C_p = np.delete(C_p, [3, 4, 5], axis=0)
-        C_p = np.delete(C_p, [3, 4, 5], axis=1)
-
-        eta_dot = Rzyx(0, 0, angwrap(psi)).dot(nu)
-        nu_dot = M_p_inv.dot(B_p.dot(f) - C_p.dot(nu) - D_p.dot(nu))
-        return np.concatenate([eta_dot, nu_dot])
-
-    @property
-    def model_input_space(self):
-        return Box(low=np.array([0, -1]), high=np.array([+1, +1]), dtype=np.float32)
+    def dynamics_batch(self, states, u):
+        return ship_dynamics(states, u * INPUT_SCALE)
 
-    @property
-    def state_map(self):
-        return ('x','y','yaw','surge','sway','yawrate')
+    model_input_space = Box(low=np.array([0, -1]), high=np.array([+1, +1]), dtype=np.float32)
+    state_map = ('x', 'y', 'yaw', 'surge', 'sway', 'yawrate')
 
@@ -2,7 +2,13 @@ class Navigator:
     def navigate(self):
         raise NotImplementedError("The navigate function has not been implemented.")
 
+    def navigate_batch(self, states):
+        raise NotImplementedError("The navigate_batch function has not been implemented.")
+
 
 class IdentityNavigator:
     def navigate(self, state):
         return state
+
+    def navigate_batch(self, states):
+        return states
@@ -17,3 +17,13 @@ class ControlObjective:
 
     def render_objective(self, obj: SimpleNamespace, viewer):
         raise NotImplementedError("ControlObjective.render_objective() has not been implemented.")
+
+    def init_objective_batch(self, obj: SimpleNamespace, num_envs):
+        raise NotImplementedError("ControlObjective.init_objective_batch() has not been implemented.")
+
+    def load_objective_batch(self, obj: SimpleNamespace, i, env_obj: SimpleNamespace):
+        raise NotImplementedError("ControlObjective.load_objective_batch() has not been implemented.")
+
+    def eval_objective_batch(self, obj: SimpleNamespace, idx, action: ndarray,
+                             measured_states: ndarray, real_states: ndarray, objects=None):
+        raise NotImplementedError("ControlObjective.eval_objective_batch() has not been implemented.")
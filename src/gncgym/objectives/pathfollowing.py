@@ -2,8 +2,11 @@ import numpy as np
 from .objective import ControlObjective
 from types import SimpleNamespace
 from gncgym.utils import distance, rotate, angwrap
-from gncgym.definitions import State6DOF
+from gncgym.definitions import State6DOF, variables
 from gncgym.reference_generation.parametrised_curves import RandomCurveThroughOrigin
+from gncgym.spatial import ObstacleIndex, assign_slots
+from gncgym.collision import Body, BodySet, HullSet, track_bodies, track_worlds, find_contacts, find_contacts_batch
+from gncgym.base_env.objects import make_hull
 
 MAX_SURGE = 10
 LOS_DISTANCE = 75
@@ -22,6 +25,31 @@ REF_SPACE = np.array([[-1, 0], [1, 1]])
 STATE_SPACE = np.array([[-1]*NS, [1]*NS])
 STATIC_OBST_SPACE = np.tile(np.array([[-1, 0], [1, 1]]), (1, STATIC_OBST_SLOTS))
 DYNAMIC_OBST_SPACE = np.tile(np.array([[-1, 0, -1, 0], [1, 1, 1, 1]]), (1, DYNAMIC_OBST_SLOTS))
+OBS_SIZE = NR + NS + 2 * STATIC_OBST_SLOTS + 4 * DYNAMIC_OBST_SLOTS
+
+# Collision shape of the vessel, the same hull that Vessel2D draws
+VESSEL_HULL = make_hull(4)
+
+# The batched objective uses tables of points sampled along each path instead of the path objects
+PATH_TABLE_SIZE = 2048
+PROJECTION_STRIDE = 32      # Spacing of the coarse samples that rule out the rest of the path in _closest_s_batch()
+PROJECTION_WINDOW = 64      # Samples searched on either side of the previous projection, at least 2 strides
+
+# Columns of the batched state arrays, which follow the order of gncgym.definitions.variables
+X, Y, YAW, SURGE = (variables.index(v) for v in ('x', 'y', 'yaw', 'surge'))
+
+
+def make_path_table(path, n=PATH_TABLE_SIZE):
+    """
+    Samples a path at n evenly spaced arc lengths from 0 to path.length + LOS_DISTANCE, which is the furthest
+    the objective ever looks ahead.
+    :return: (points, angles, ds), an (n, 2) array of points, the (n,) unwrapped tangent angles and the spacing
+    """
+    s = np.linspace(0, path.length + LOS_DISTANCE, n)
+    points = np.transpose(np.reshape(path(s), (2, n)))
+    d = np.gradient(points, axis=0)
+    angles = np.unwrap(np.arctan2(d[:, 1], d[:, 0]))
+    return points, angles, s[1] - s[0]
 
 
 class PathFollowing(ControlObjective):
@@ -40,21 +68,27 @@ class PathFollowing(ControlObjective):
         initial_state = dict(x=init_x, y=init_y, yaw=init_yaw, surge=0, sway=0, yawrate=0)
 
         obj.path = path
-        obj.path_points = np.transpose(obj.path(np.linspace(0, obj.path.length, 500)))
+        obj.path_points = np.transpose(obj.path.get_points(500))
         obj.desired_speed = desired_speed
         obj.static_obstacles = []
         obj.dynamic_obstacles = []
         obj.active_static = dict()
         obj.active_dynamic = dict()
+        obj.static_index = ObstacleIndex()
+        obj.dynamic_index = ObstacleIndex(static=False)
+        obj.bodies = BodySet.of(self.objects)
+        obj.contacts = []
         obj.reward = 0
         obj.s = 0
 
         return initial_state
 
     def eval_objective(self, obj: SimpleNamespace, action: np.ndarray, measured_state: State6DOF, real_state: State6DOF):
-        s_new = obj.path.get_closest_s(measured_state.position[0:2])
+        s_new = obj.path.get_closest_s(measured_state.position[0:2], s0=obj.s)
         obj.ds, obj.s = s_new - obj.s, s_new
         obs = self._calculate_errors(obj, real_state)
+        obj.bodies = track_bodies(obj.bodies, self.objects)
+        obj.contacts = find_contacts(self._vessel_body(real_state), obj.bodies)
 
         sr = self._step_reward(obj, action, obs, real_state)
         obj.reward += sr
@@ -63,31 +97,208 @@ class PathFollowing(ControlObjective):
         return obs, sr, done
 
     def render_objective(self, obj, viewer):
-        # Draw path
-        viewer.draw_polyline(obj.path_points, linewidth=3, color=(0.3, 0.3, 0.3))
+        # Draw path, which is uploaded once per episode
+        viewer.retained('path', lambda v: v.make_polyline_shape(obj.path_points, color=(0.3, 0.3, 0.3), linewidth=3))
 
         # Draw closest point on path
         p = obj.path(obj.s).flatten()
-        viewer.draw_circle(origin=p, radius=1, res=30, color=(0.8, 0.3, 0.3))
+        marker = viewer.retained('progress', lambda v: v.make_circle_shape(1, color=(0.8, 0.3, 0.3),
+                                                                           layer=v.LAYER_VESSEL))
+        marker.set_transform(p)
+
+    def raster_objective(self, obj, scene):
+        scene.polyline(obj.path_points, color=(0.3, 0.3, 0.3), linewidth=3)
+        scene.circle(obj.path(obj.s).flatten(), 1, color=(0.8, 0.3, 0.3))
+
+    def snapshot_objective(self, obj, snapshot):
+        n = min(len(obj.path_points), len(snapshot['path']))
+        snapshot['path'][:n] = obj.path_points[:n]
+        snapshot['num_path_points'] = n
+        snapshot['marker'] = obj.path(obj.s).flatten()
+
+    def get_objective_state(self, obj):
+        # The obstacles in each observation slot, -1 for free slots
+        slots = np.full(STATIC_OBST_SLOTS + DYNAMIC_OBST_SLOTS, -1.0)
+        for i, slot in obj.active_static.items():
+            slots[slot] = i
+        for i, slot in obj.active_dynamic.items():
+            slots[STATIC_OBST_SLOTS + slot] = i
+        return np.concatenate([(obj.s, obj.ds, obj.reward), slots])
+
+    def set_objective_state(self, obj, values):
+        obj.s, obj.ds, obj.reward = (float(v) for v in values[:3])
+        slots = values[3:]
+        obj.active_static = {int(i): slot for slot, i in enumerate(slots[:STATIC_OBST_SLOTS]) if i >= 0}
+        obj.active_dynamic = {int(i): slot for slot, i in enumerate(slots[STATIC_OBST_SLOTS:]) if i >= 0}
+        obj.contacts = []
+
+    """
+    ### Batched objective ###
+    Used by VectorScenario, which keeps the objective variables of N envs in one namespace of stacked arrays.
+    The methods take an index into the stacked arrays, which is either slice(None) for all envs or an array of
+    env indices, and (n, 12) arrays of states with columns in the order of gncgym.definitions.variables.
+    """
+
+    def init_objective_batch(self, obj: SimpleNamespace, num_envs):
+        obj.path_table = np.zeros((num_envs, PATH_TABLE_SIZE, 2))
+        obj.path_table_angles = np.zeros((num_envs, PATH_TABLE_SIZE))
+        obj.path_table_ds = np.ones(num_envs)
+        obj.path_length = np.zeros(num_envs)
+        obj.desired_speed = np.zeros(num_envs)
+        obj.reward = np.zeros(num_envs)
+        obj.s = np.zeros(num_envs)
+        obj.ds = np.zeros(num_envs)
+        obj.contacts = [[] for _ in range(num_envs)]
+        obj.worlds = None   # WorldBodies of the objects of all envs
+
+    def load_objective_batch(self, obj: SimpleNamespace, i, env_obj: SimpleNamespace):
+        """Copies the objective of one env, as initialised by reset_objective(), into slot i of the batch."""
+        obj.path_table[i], obj.path_table_angles[i], obj.path_table_ds[i] = make_path_table(env_obj.path)
+        obj.path_length[i] = env_obj.path.length
+        obj.desired_speed[i] = env_obj.desired_speed
+        obj.reward[i] = env_obj.reward
+        obj.s[i] = env_obj.s
+        obj.ds[i] = 0
+        obj.contacts[i] = []
+
+    def eval_objective_batch(self, obj: SimpleNamespace, idx, action: np.ndarray,
+                             measured_states: np.ndarray, real_states: np.ndarray, objects=None):
+        """
+        :param objects: Optional list with the list of env objects of each of the envs, which the vessels can
+                        collide with. The contacts of env i are stored in obj.contacts[i].
+        """
+        s_new = self._closest_s_batch(obj, idx, measured_states[:, [X, Y]])
+        obj.ds[idx], obj.s[idx] = s_new - obj.s[idx], s_new
+        obs = self._calculate_errors_batch(obj, idx, real_states)
+
+        collided = np.zeros(len(real_states), dtype=bool)
+        if objects is not None:
+            vessels = HullSet(real_states[:, [X, Y]], real_states[:, YAW], VESSEL_HULL)
+            if len(objects) == len(obj.s):
+                obj.worlds = worlds = track_worlds(obj.worlds, objects)
+                contacts = obj.contacts = find_contacts_batch(vessels, worlds)
+            else:
+                # Some of the envs are being reset, the bodies of all envs are kept for the next step
+                contacts = find_contacts_batch(vessels, track_worlds(None, objects))
+                for k, i in enumerate(np.arange(len(obj.s))[idx]):
+                    obj.contacts[i] = contacts[k]
+            collided = np.fromiter(map(len, contacts), dtype=int, count=len(contacts)) > 0
+
+        sr = self._step_reward_batch(obj, idx, action, obs, real_states) - OBST_PENALTY * collided
+        obj.reward[idx] += sr
+        done = (obj.reward[idx] < -50) | (np.abs(obj.s[idx] - obj.path_length[idx]) < 1)
+
+        return obs, sr, done
+
+    def _closest_s_batch(self, obj, idx, p):
+        """
+        Finds the closest sample of each path table, and refines it on the segments on either side. Like
+        get_closest_s() with s0, the search starts from the previous solution obj.s: only the samples within
+        PROJECTION_WINDOW of it are searched, unless a coarse subset of the table can't rule out that another part
+        of the path is closer, in which case the whole table of that env is searched.
+        """
+        table, ds, length = obj.path_table[idx], obj.path_table_ds[idx], obj.path_length[idx]
+        n, K = table.shape[:2]
+        rows = np.arange(n)
+        last = np.minimum((length / ds).astype(int), K - 1)     # The table extends past the end of the path
+
+        center = np.clip(np.round(obj.s[idx] / ds).astype(int), 0, last)
+        window = np.clip(center[:, None] + np.arange(-PROJECTION_WINDOW, PROJECTION_WINDOW + 1), 0, last[:, None])
+        d2 = np.sum((table[rows[:, None], window] - p[:, None, :]) ** 2, axis=2)
+        w = np.argmin(d2, axis=1)
+        k, best_d2 = window[rows, w], d2[rows, w]
+
+        # Every sample outside the window is within half a stride of a coarse sample more than a stride from the
+        # center, so it can't be closer to p than the distance to that sample minus half a stride
+        coarse = np.arange(0, K, PROJECTION_STRIDE)
+        coarse_d2 = np.sum((table[:, coarse] - p[:, None, :]) ** 2, axis=2)
+        coarse_d2[(np.abs(coarse - center[:, None]) <= PROJECTION_STRIDE)
+                  | (coarse > last[:, None] + PROJECTION_STRIDE // 2)] = np.inf
+        bound = np.sqrt(np.min(coarse_d2, axis=1)) - PROJECTION_STRIDE * ds / 2
+        far = np.flatnonzero(bound < np.sqrt(best_d2))
+        if len(far) > 0:
+            d2 = np.sum((table[far] - p[far, None, :]) ** 2, axis=2)
+            d2[np.arange(K) > last[far, None]] = np.inf
+            k[far] = np.argmin(d2, axis=1)
+            best_d2[far] = d2[np.arange(len(far)), k[far]]
+
+        best_s = k * ds
+        for k0 in (np.clip(k - 1, 0, K - 2), np.clip(k, 0, K - 2)):
+            a, b = table[rows, k0], table[rows, k0 + 1]
+            ab = b - a
+            t = np.clip(np.sum((p - a) * ab, axis=1) / np.maximum(np.sum(ab * ab, axis=1), 1e-12), 0, 1)
+            q_d2 = np.sum((a + t[:, None] * ab - p) ** 2, axis=1)
+            better = q_d2 < best_d2
+            best_s = np.where(better, (k0 + t) * ds, best_s)
+            best_d2 = np.where(better, q_d2, best_d2)
+
+        return np.clip(best_s, 0, length)
+
+    def _interpolate_path_batch(self, obj, idx, s):
+        """Returns the points (n, 2) and tangent angles (n,) of the paths at arc lengths s."""
+        table, angles, ds = obj.path_table[idx], obj.path_table_angles[idx], obj.path_table_ds[idx]
+        n, K = table.shape[:2]
+        rows = np.arange(n)
+
+        f = np.clip(s / ds, 0, K - 1)
+        k0 = np.minimum(f.astype(int), K - 2)
+        t = f - k0
+        points = table[rows, k0] * (1 - t)[:, None] + table[rows, k0 + 1] * t[:, None]
+        angle = angles[rows, k0] * (1 - t) + angles[rows, k0 + 1] * t
+        return points, angwrap(angle)
+
+    def _calculate_errors_batch(self, obj, idx, states):
+        s = obj.s[idx]
+        closest_point, closest_angle = self._interpolate_path_batch(obj, idx, s)
+        target, target_angle = self._interpolate_path_batch(obj, idx, s + LOS_DISTANCE)
+
+        # State and path errors
+        position = states[:, [X, Y]]
+        surge_error = obj.desired_speed[idx] - states[:, SURGE]
+        heading_error = angwrap(target_angle - states[:, YAW])
+        d = closest_point - position
+        cross_track_error = d[:, 1] * np.cos(closest_angle) - d[:, 0] * np.sin(closest_angle)
+        target_dist = np.sqrt(np.sum((position - target) ** 2, axis=1))
+
+        # Construct observation vectors
+        obs = np.zeros((len(s), OBS_SIZE))
+        obs[:, NR + 0] = np.clip(surge_error / MAX_SURGE, -1, 1)
+        obs[:, NR + 1] = np.clip(heading_error / np.pi, -1, 1)
+        obs[:, NR + 2] = np.clip(cross_track_error / OBST_RANGE, -1, 1)
+        obs[:, NR + 3] = np.clip(target_dist / OBST_RANGE, 0, 1)
+
+        return obs
+
+    def _step_reward_batch(self, obj, idx, action, obs, states):
+        step_reward = obj.ds[idx] / 4
+        # Penalise cross track error if too far away from path
+        surge_error = obs[:, NR + 0]
+        cross_track_error = obs[:, NR + 2]
+        step_reward -= np.abs(cross_track_error) * 0.5 + np.maximum(0, -surge_error) * 0.5
+
+        return step_reward
+
+    @staticmethod
+    def _vessel_body(state):
+        return Body((state.x, state.y), angle=state.yaw, vertices=VESSEL_HULL)
 
     def _calculate_errors(self, obj, state):
 
         self._update_closest_obstacles(obj, state)
 
-        closest_point = obj.path(obj.s).flatten()
-        closest_angle = obj.path.get_angle(obj.s)
-        target = obj.path(obj.s + LOS_DISTANCE).flatten()
-        target_angle = obj.path.get_angle(obj.s + LOS_DISTANCE)
+        points, angles, _ = obj.path.pose_at([obj.s, obj.s + LOS_DISTANCE])
+        closest_point, target = points[:, 0], points[:, 1]
+        closest_angle, target_angle = angles
 
         # State and path errors
-        velocity = state.velocity
-        surge_error = obj.desired_speed - velocity.surge
-        heading_error = float(angwrap(target_angle - state.orientation.yaw))
-        cross_track_error = rotate(closest_point - np.array(state.position[0:2]), -closest_angle)[1]
-        target_dist = distance(state.position[0:2], target)
+        position = np.array((state.x, state.y))
+        surge_error = obj.desired_speed - state.surge
+        heading_error = float(angwrap(target_angle - state.yaw))
+        cross_track_error = rotate(closest_point - position, -closest_angle)[1]
+        target_dist = distance(position, target)
 
         # Construct observation vector
-        obs = np.zeros((NR + NS + 2 * STATIC_OBST_SLOTS + 4 * DYNAMIC_OBST_SLOTS,))
+        obs = np.zeros((OBS_SIZE,))
         obs[NR + 0] = np.clip(surge_error / MAX_SURGE, -1, 1)
         obs[NR + 1] = np.clip(heading_error / np.pi, -1, 1)
         obs[NR + 2] = np.clip(cross_track_error / OBST_RANGE, -1, 1)
@@ -96,54 +307,12 @@ class PathFollowing(ControlObjective):
         return obs
 
     def _update_closest_obstacles(base_env, obj: SimpleNamespace, state):
-
-        # Deallocate static obstacles that are out of range
-        for i, slot in obj.active_static.copy().items():
-            if distance(state.position, obj.static_obstacles[i].position) > OBST_RANGE * 1.05:
-                obj.active_static.pop(i)
-
-        # Deallocate dynamic obstacles that are out of range
-        for i, slot in obj.active_dynamic.copy().items():
-            if distance(state.position, obj.dynamic_obstacles[i].position) > OBST_RANGE * 1.05:
-                obj.active_dynamic.pop(i)
-
-        # TODO Replace duplicated code with something that just iterates through self.objects
-        if STATIC_OBST_SLOTS > 0:
-            # Allocate static obstacles
-            distances = {i: distance(state.position, obst.position) for i, obst in enumerate(obj.static_obstacles)}
-            for obsti, obst in enumerate(obj.static_obstacles):
-                dist = distances[obsti]
-                if dist < OBST_RANGE and obsti not in obj.active_static:
-                    available_slots = tuple(set(range(STATIC_OBST_SLOTS)) - set(obj.active_static.values()))
-                    if len(available_slots) > 0:
-                        slot = np.random.choice(available_slots)
-                        obj.active_static[obsti] = slot
-                    else:
-                        active_distances = {k: distances[k] for k in obj.active_static.keys()}
-                        i_max = max(active_distances, key=active_distances.get)
-                        if dist < active_distances[i_max]:
-                            slot_max = obj.active_static[i_max]
-                            obj.active_static.pop(i_max)
-                            obj.active_static[obsti] = slot_max
-
-        if DYNAMIC_OBST_SLOTS > 0:
-            # Allocate dynamic obstacles
-            distances = {i: distance(state.position, obst.position) for i, obst in
-                         enumerate(obj.dynamic_obstacles)}
-            for obsti, obst in enumerate(obj.dynamic_obstacles):
-                dist = distances[obsti]
-                if dist < OBST_RANGE and obsti not in obj.active_dynamic:
-                    available_slots = tuple(set(range(DYNAMIC_OBST_SLOTS)) - set(obj.active_dynamic.values()))
-                    if len(available_slots) > 0:
-                        slot = np.random.choice(available_slots)
-                        obj.active_dynamic[obsti] = slot
-                    else:
-                        active_distances = {k: distances[k] for k in obj.active_dynamic.keys()}
-                        i_max = max(active_distances, key=active_distances.get)
-                        if dist < active_distances[i_max]:
-                            slot_max = obj.active_dynamic[i_max]
-                            obj.active_dynamic.pop(i_max)
-                            obj.active_dynamic[obsti] = slot_max
+        # Obstacles within OBST_RANGE are allocated to a slot, and keep it until they are 5% further away than that
+        position = np.array((state.x, state.y))
+        obj.static_index.update(obj.static_obstacles)
+        obj.dynamic_index.update(obj.dynamic_obstacles)
+        assign_slots(obj.active_static, obj.static_index, position, STATIC_OBST_SLOTS, OBST_RANGE, OBST_RANGE * 1.05)
+        assign_slots(obj.active_dynamic, obj.dynamic_index, position, DYNAMIC_OBST_SLOTS, OBST_RANGE, OBST_RANGE * 1.05)
 
     def _stop_criterion(base_env, obj: SimpleNamespace):
         done = False
@@ -159,12 +328,8 @@ class PathFollowing(ControlObjective):
 
     def _step_reward(base_env, obj: SimpleNamespace, action, obs, state):
         step_reward = 0
-
-        # TODO check why obstacle collision does not work anymore (probably because of numpy)
-        for o in base_env.objects:
-            if distance(state.position, o.position) < state.radius + o.radius:
-                step_reward -= OBST_PENALTY
-                break
+        if obj.contacts:
+            step_reward -= OBST_PENALTY
 
         step_reward += obj.ds / 4
         # Penalise cross track error if too far away from path
@@ -1,11 +1,22 @@
 import inspect
 import numpy as np
-from time import time
-from gncgym.base_env.base import BaseScenario
+from gncgym.base_env.base import BaseScenario, FPS
+from gncgym.recording import VideoRecorder
+from gncgym.scheduler import RealTimeScheduler
 import gncgym.scenarios as scenarios
 
 
-def play_scenario(game):
+def play_scenario(game, record=None, frame_skip=1, scale=1.0, speed=1.0, fps=FPS):
+    """
+    Runs a scenario in a window, controlled with the arrow keys. R restarts the episode and Q quits. The simulation
+    runs in real time, and + and - double or halve its speed, except while recording.
+    :param game: Name of the scenario class
+    :param record: Optional path of a video file that the episodes are recorded to, see gncgym.recording
+    :param frame_skip: Only every frame_skip'th frame is recorded
+    :param scale: Factor by which the recorded frames are downscaled
+    :param speed: Simulated seconds per real second, e.g. 4 to fast-forward 4x
+    :param fps: Target frame rate of the window
+    """
     scenarios.autoload()  # Auto-imports all Scenario classes found in the scenarios directory.
 
     if game not in scenarios.available_scenarios:
@@ -20,6 +31,16 @@ def play_scenario(game):
         if k == key.RIGHT: a[1] = -1
         if k == key.UP:    a[0] = 1
         if k == key.DOWN:  a[0] = -1
+        if k in (key.PLUS, key.EQUAL, key.NUM_ADD, key.MINUS, key.NUM_SUBTRACT) and recorder is not None:
+            # The frame rate of the video is fixed when the recording starts
+            print('The speed can\'t be changed while recording')
+            return
+        if k in (key.PLUS, key.EQUAL, key.NUM_ADD):
+            scheduler.speed *= 2
+            print('Speed x{:g}'.format(scheduler.speed))
+        if k in (key.MINUS, key.NUM_SUBTRACT):
+            scheduler.speed /= 2
+            print('Speed x{:g}'.format(scheduler.speed))
 
     def key_release(k, mod):
         nonlocal restart, quit
@@ -36,33 +57,50 @@ def play_scenario(game):
 
     env.reset()
     env.render()
-    record_video = False
-    if record_video:
-        env.monitor.start('/tmp/video-test', force=True)
+    recorder = None
+    if record is not None:
+        # Frames are only drawn after a step, so the video runs in real time at the slower of the two rates
+        video_fps = min(fps, speed / env.sim_context.dt) / frame_skip
+        recorder = VideoRecorder(record, fps=video_fps, frame_skip=frame_skip, scale=scale)
+        env.async_readback = True
     env.viewer.window.on_key_press = key_press
     env.viewer.window.on_key_release = key_release
+    scheduler = RealTimeScheduler(env.sim_context.dt, fps=fps, speed=speed)
 
     try:
         while True:
             a = np.array([0.0, 0.0])
             total_reward = 0.0
             steps = 0
-            t = time()
             restart = False
             quit = False
+            done = False
+            scheduler.reset()
             while True:
-                t, dt = time(), time()-t
-                a[0] = np.clip(a[0], 0, 1)
-                a[1] = np.clip(a[1], -1, 1)
-                obs, r, done, info = env.step(a)
-                total_reward += r
-
-                if False and steps % 200 == 0 or done:
-                    print("\nObservation: {}".format(obs))
-                    print("action " + str(["{:0.2f}".format(x) for x in a]))
-                    print("step {} total_reward {:+0.2f}".format(steps, total_reward))
-                steps += 1
-                env.render()
+                # Step the simulation in real time, and only draw when something has changed
+                n = scheduler.wait()
+                for _ in range(n):
+                    a[0] = np.clip(a[0], 0, 1)
+                    a[1] = np.clip(a[1], -1, 1)
+                    obs, r, done, info = env.step(a)
+                    total_reward += r
+
+                    if False and steps % 200 == 0 or done:
+                        print("\nObservation: {}".format(obs))
+                        print("action " + str(["{:0.2f}".format(x) for x in a]))
+                        print("step {} total_reward {:+0.2f}".format(steps, total_reward))
+                    steps += 1
+                    if done:
+                        break
+
+                if n > 0:
+                    env.render()
+                    if recorder is not None:
+                        frame = env.render(mode='rgb_array')
+                        if frame is not None:
+                            recorder.add_frame(frame)
+                else:
+                    env.viewer.window.dispatch_events()
 
                 if quit: raise KeyboardInterrupt
                 if done or restart: break
@@ -71,6 +109,12 @@ def play_scenario(game):
 
     except KeyboardInterrupt:
         pass
+    finally:
+        if recorder is not None:
+            frame = env.flush_frame()
+            if frame is not None:
+                recorder.add_frame(frame)
+            recorder.close()
 
     env.close()
 
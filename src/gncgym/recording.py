@@ -0,0 +1,125 @@
+import queue
+import shutil
+import threading
+import subprocess
+import numpy as np
+
+"""
+Streams rendered frames to an ffmpeg subprocess, so that long episodes can be recorded without keeping the frames
+in memory.
+
+Frames are copied (and downscaled) when they are added, put in a bounded queue, and written to ffmpeg's stdin by a
+background thread. When the encoder can't keep up the queue fills, and add_frame() blocks until there is room,
+so the memory used by a recording never grows beyond the size of the queue.
+"""
+
+DEFAULT_FPS = 50
+
+
+class VideoRecorder:
+    def __init__(self, path, fps=DEFAULT_FPS, frame_skip=1, scale=1.0, queue_size=16, ffmpeg='ffmpeg',
+                 codec='libx264', extra_args=()):
+        """
+        :param path: Output file, the container is chosen by ffmpeg from the extension
+        :param fps: Frame rate of the video. Frames that are skipped are not counted, so with frame_skip=2 the video
+                    plays twice as fast as the simulation unless fps is halved.
+        :param frame_skip: Only every frame_skip'th frame that is added is recorded
+        :param scale: Factor by which the frames are downscaled before they are sent to ffmpeg, e.g. 0.5
+        :param queue_size: Number of frames that can wait to be encoded before add_frame() blocks
+        :param ffmpeg: ffmpeg executable
+        :param codec: Video codec passed to ffmpeg
+        :param extra_args: Extra output arguments for ffmpeg
+        """
+        if shutil.which(ffmpeg) is None:
+            raise FileNotFoundError('Could not find the ffmpeg executable "{}", which is needed to record videos. '
+                                    'Install ffmpeg or pass its path to VideoRecorder.'.format(ffmpeg))
+        if frame_skip < 1 or not 0 < scale <= 1:
+            raise ValueError('frame_skip must be at least 1, and scale must be in (0, 1].')
+
+        self.path = path
+        self.fps = fps
+        self.frame_skip = frame_skip
+        self.scale = scale
+        self.ffmpeg = ffmpeg
+        self.codec = codec
+        self.extra_args = tuple(extra_args)
+        self.frames_added = 0
+        self.frames_written = 0
+        self.closed = False
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._proc = None
+        self._thread = None
+        self._error = None
+        self._rows = self._cols = None
+
+    def add_frame(self, frame):
+        """
+        Records an (H, W, 3) uint8 frame, e.g. from env.render(mode='rgb_array'). The frame is copied, so it may be
+        a view of a buffer that is reused. Blocks while the queue is full.
+        """
+        if self.closed:
+            raise RuntimeError('The recorder has been closed.')
+        self._check()
+        self.frames_added += 1
+        if (self.frames_added - 1) % self.frame_skip != 0:
+            return
+
+        if self._proc is None:
+            self._start(frame.shape)
+        # Nearest neighbour downscaling, which also makes the contiguous copy that is queued
+        self._queue.put(np.ascontiguousarray(frame[self._rows][:, self._cols, :3], dtype=np.uint8))
+
+    def close(self):
+        """Waits for the queued frames to be encoded and finishes the file."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._proc is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._proc.stdin.close()
+            self._proc.wait()
+            if self._proc.returncode != 0 and self._error is None:
+                self._error = RuntimeError('ffmpeg exited with code {}: {}'.format(
+                    self._proc.returncode, self._proc.stderr.read().decode(errors='replace').strip()))
+            self._proc.stderr.close()
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start(self, shape):
+        height, width = shape[:2]
+        # Most codecs need even dimensions, so the last row or column is dropped if needed
+        out_h, out_w = max(2, int(height * self.scale)) // 2 * 2, max(2, int(width * self.scale)) // 2 * 2
+        self._rows = (np.arange(out_h) * height / out_h).astype(int)
+        self._cols = (np.arange(out_w) * width / out_w).astype(int)
+
+        cmd = [self.ffmpeg, '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '{}x{}'.format(out_w, out_h), '-r', str(self.fps),
+               '-i', '-', '-an', '-vcodec', self.codec, '-pix_fmt', 'yuv420p'] + list(self.extra_args) + [self.path]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def _write(self):
+        """Writes the queued frames to ffmpeg, until the None that is queued by close()."""
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                return
+            if self._error is not None:
+                continue  # Keep draining the queue so that add_frame() doesn't block forever
+            try:
+                self._proc.stdin.write(memoryview(frame).cast('B'))
+                self.frames_written += 1
+            except (BrokenPipeError, OSError) as e:
+                self._error = RuntimeError('Writing to ffmpeg failed: {}'.format(e))
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
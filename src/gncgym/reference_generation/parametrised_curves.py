@@ -1,5 +1,4 @@
 import math
-from copy import deepcopy
 import numpy as np
 from numpy import pi
 
@@ -7,6 +6,12 @@ from numpy import pi
 from scipy import interpolate
 from scipy.optimize import fminbound
 from gncgym.utils import angwrap
+from .path_cache import path_cache, make_key
+
+# Number of points in the arc length table that ParamCurve.get_closest_s() searches before refining
+PROJECTION_TABLE_SIZE = 2048
+PROJECTION_COARSE_STEP = 16
+PROJECTION_MAX_ITER = 20
 
 
 class ParamLine():
@@ -33,19 +38,23 @@ class ParamLine():
     def get_angle(self, s=None):
         if s is None:
             return self.angle
-        s = np.array(s)
-        if s.shape == ():
-            s = np.array([s])
-        return np.array([self.angle for i in s])
+        return np.full(np.shape(np.atleast_1d(s)), self.angle)
+
+    def pose_at(self, s):
+        """Returns (position, heading, curvature) at s, with shapes (2, n), (n,) and (n,)."""
+        s = np.atleast_1d(np.array(s, dtype=float))
+        return self(s), np.full(s.shape, self.angle), np.zeros(s.shape)
 
     def get_endpoint(self):
         return self(self.length)
 
-    def get_closest_s(self, p):
-        p = np.vstack(p)
-        # if p.shape != 2:
-        #     p = np.transpose(p)
-        return fminbound(lambda s: np.linalg.norm(self(s) - p), 0, self.length, xtol=1e-2)
+    def get_points(self, n):
+        return self(np.linspace(0, self.length, n))
+
+    def get_closest_s(self, p, s0=None):
+        """Orthogonal projection of p onto the line, clipped to the ends. s0 is accepted for compatibility."""
+        p = np.reshape(np.array(p, dtype=float), (2, 1))
+        return float(np.clip(np.sum(self.A * (p - self.p0)), 0, self.length))
 
     def plot(self, ax, s, *opts):
 
@@ -57,21 +66,44 @@ class ParamLine():
 
 
 class ParamCurve():
-    def __init__(self, waypoints):
-        waypoints = np.array(waypoints)
+    def __init__(self, waypoints, cache=path_cache):
+        """
+        :param waypoints: Points that the curve passes through, as a (2, n) or (n, 2) array
+        :param cache: PathCache for the reparametrised curve, so that curves with the same waypoints are only
+                      constructed once. None disables caching.
+        """
+        waypoints = np.array(waypoints, dtype=float)
         if waypoints.shape[0] != 2:
             waypoints = np.transpose(waypoints)
 
-        Z = waypoints
-        for i in range(3):
-            S = arc_len(Z)
-            C = interpolate.pchip(x=S, y=Z, axis=1)
-            Z = C(np.linspace(S[0], S[-1], 1000))
-
-        self.C = C
-        self.s_min = S[0]
-        self.s_max = S[-1]
+        key = make_key('ParamCurve', waypoints)
+        entry = cache.get(key) if cache is not None else None
+        if entry is None:
+            # Reparametrise by arc length, a few times since the arc length of the interpolant differs from the
+            # arc length of the points it was made from
+            Z = waypoints
+            for i in range(3):
+                S = arc_len(Z)
+                C = interpolate.pchip(x=S, y=Z, axis=1)
+                Z = C(np.linspace(S[0], S[-1], 1000))
+            entry = dict(x=C.x, c=C.c)
+            if cache is not None:
+                entry = cache.put(key, entry)
+
+        # The pchip and the projection tables are built once per entry, and shared by all curves with its waypoints
+        if 'tables' not in entry:
+            entry['tables'] = _CurveTables(entry['x'], entry['c'])
+        self._cache_entry = entry
+        tables = entry['tables']
+
+        self.C = tables.C
+        self.s_min = tables.C.x[0]
+        self.s_max = tables.C.x[-1]
         self.length = self.s_max
+        self._dC = tables.dC
+        self._s_table, self._p_table = tables.s_table, tables.p_table
+        self._s_coarse, self._p_coarse, self._coarse_spacing = tables.s_coarse, tables.p_coarse, tables.coarse_spacing
+        self._breaks, self._coeffs = tables.breaks, tables.coeffs
 
     def __call__(self, s, check_domain=False):
         s = np.array(s)
@@ -81,37 +113,103 @@ class ParamCurve():
         return self.C(s)
 
     def get_angle(self, s, check_domain=False):
-        s = np.array(s)
-        if check_domain and s.min() < self.s_min or s.max() > self.s_max:
-            pass
-            # logging.warning('Argument s outside of curve domain: {}'.format((self.s_min, self.s_max)))
-
-        if s.shape == ():
-            s = np.array([s])
-        output = []
-        for ss in s:
-            dx, dy = (self.C(ss + 0.05) - self.C(ss - 0.05)).flatten()
-            output.append(angwrap(np.arctan2(dy, dx)))
-        return np.array(output)
+        """Tangent angle at s, from the derivative of the pchip. Always returns an array, of shape (1,) for scalar s."""
+        dx, dy = self._dC[0](np.atleast_1d(s))
+        return angwrap(np.arctan2(dy, dx))
+
+    def pose_at(self, s):
+        """
+        Returns the position, heading and signed curvature of the curve at s in one pass.
+        :return: (position, heading, curvature), with shapes (2, n), (n,) and (n,)
+        """
+        s = np.atleast_1d(np.array(s, dtype=float))
+        (dx, dy), (ddx, ddy) = self._dC[0](s), self._dC[1](s)
+        heading = angwrap(np.arctan2(dy, dx))
+        curvature = (dx*ddy - dy*ddx) / np.maximum(dx**2 + dy**2, 1e-12)**1.5
+        return self.C(s), heading, curvature
 
     def get_endpoint(self):
         return self(self.s_max)
 
-    def get_closest_s(self, p):
-        # p = np.vstack(p)
-        # if p.shape != 2:
-        #     p = np.transpose(p)
-
-        def distance(p1, p2):
-            return np.sqrt((float(p1[0]) - float(p2[0]))**2 + (float(p1[1]) - float(p2[1]))**2)
-
-        return fminbound(lambda s: distance(self(s), p), x1=0, x2=self.length, xtol=1e-6, maxfun=10000)
+    def get_points(self, n):
+        """
+        Returns n points evenly spaced along the whole curve as a (2, n) array. The points are kept with the cached
+        curve, so all curves with the same waypoints share them.
+        """
+        name = 'points{}'.format(n)
+        if name not in self._cache_entry:
+            points = self.C(np.linspace(self.s_min, self.s_max, n))
+            points.flags.writeable = False
+            self._cache_entry[name] = points
+        return self._cache_entry[name]
+
+    def get_closest_s(self, p, s0=None, xtol=1e-6):
+        """
+        Finds the arc length of the point on the curve that is closest to p. The closest point in a table of
+        points along the curve is refined with Newton's method on the derivative of the squared distance.
+
+        :param p: Point (x, y)
+        :param s0: Previous solution, e.g. from the last time step. If given, the projection is first refined
+                   from s0, which usually converges in one or two iterations. The full table is then only searched
+                   if a coarse subset of it can't rule out that another part of the curve is closer to p.
+        :param xtol: Tolerance on s
+        """
+        p = np.reshape(np.array(p, dtype=float), 2)
+
+        if s0 is not None:
+            s = self._refine_closest_s(p, min(max(float(s0), self.s_min), self.s_max), self.s_min, self.s_max, xtol)
+            if s is not None:
+                c = self._eval_segment(s)[0]
+                dist = np.hypot(c[0] - p[0], c[1] - p[1])
+                # Newton has found the minimum of the neighbourhood of s. Every point on the rest of the curve is
+                # within half a coarse spacing of a coarse sample, since s is arc length, so it can't be closer to p
+                # than the distance to that sample minus half a spacing.
+                far = np.abs(self._s_coarse - s) > 2 * self._coarse_spacing
+                coarse_dist = np.sqrt(np.min(np.sum((self._p_coarse[:, far] - p[:, None])**2, axis=0), initial=np.inf))
+                if coarse_dist - self._coarse_spacing / 2 >= dist - xtol:
+                    return s
+
+        # The closest point is within one table spacing of the closest point in the table
+        i = int(np.argmin(np.sum((self._p_table - p[:, None])**2, axis=0)))
+        h = self._s_table[1] - self._s_table[0]
+        lo, hi = max(self._s_table[i] - h, self.s_min), min(self._s_table[i] + h, self.s_max)
+        s = self._refine_closest_s(p, self._s_table[i], lo, hi, xtol)
+        if s is None:
+            s = fminbound(lambda s: np.sum((self.C(s) - p)**2), x1=lo, x2=hi, xtol=xtol)
+        return s
+
+    def _refine_closest_s(self, p, s, lo, hi, xtol):
+        """Newton iterations on d/ds |C(s) - p|^2 = 0 within [lo, hi]. Returns None if they don't converge."""
+        px, py = p
+        for _ in range(PROJECTION_MAX_ITER):
+            (x, y), (dx, dy), (ddx, ddy) = self._eval_segment(s)
+            rx, ry = x - px, y - py
+            g = rx*dx + ry*dy
+            dg = dx*dx + dy*dy + rx*ddx + ry*ddy
+            if dg <= 0:
+                return None
+            s_next = min(max(s - g / dg, lo), hi)
+            if abs(s_next - s) < xtol:
+                return s_next
+            s = s_next
+        return None
+
+    def _eval_segment(self, s):
+        """
+        Evaluates the curve and its first and second derivatives at a scalar s, directly from the cubic
+        coefficients of the pchip segment that s is in. This is much cheaper than calling the PPoly three times.
+        :return: ((x, y), (dx, dy), (ddx, ddy))
+        """
+        i = min(max(int(self._breaks.searchsorted(s, side='right')) - 1, 0), len(self._breaks) - 2)
+        t = s - float(self._breaks[i])
+        result = []
+        for c3, c2, c1, c0 in self._coeffs[i].tolist():
+            result.append((((c3*t + c2)*t + c1)*t + c0, (3*c3*t + 2*c2)*t + c1, 6*c3*t + 2*c2))
+        (x, dx, ddx), (y, dy, ddy) = result
+        return (x, y), (dx, dy), (ddx, ddy)
 
     def __reversed__(self):
-        curve = deepcopy(self)
-        C = curve.C
-        curve.C = lambda s: C(curve.length-s)
-        return curve
+        return ReversedCurve(self)
 
     def plot(self, ax, s, *opts):
         s = np.array(s)
@@ -119,6 +217,68 @@ class ParamCurve():
         ax.plot(-z[1,:],z[0,:], *opts)
 
 
+class _CurveTables:
+    """
+    The pchip of a ParamCurve, its derivatives and the tables used by get_closest_s(): points along the curve, a
+    coarse subset of them that includes both ends, and the breakpoints and cubic coefficients of each pchip segment
+    as [segment][axis][power]. Kept in memory with the cache entry, which only stores the breakpoints and
+    coefficients on disk.
+    """
+    def __init__(self, x, c):
+        # The cached arrays are read-only, and PPoly needs writable ones
+        self.C = C = interpolate.PPoly.construct_fast(np.array(c), np.array(x), extrapolate=True, axis=1)
+        self.dC = (C.derivative(1), C.derivative(2))
+        self.s_table = np.linspace(C.x[0], C.x[-1], PROJECTION_TABLE_SIZE)
+        self.p_table = C(self.s_table)
+        coarse = np.r_[0:PROJECTION_TABLE_SIZE:PROJECTION_COARSE_STEP, PROJECTION_TABLE_SIZE - 1]
+        self.s_coarse = self.s_table[coarse]
+        self.p_coarse = self.p_table[:, coarse]
+        self.coarse_spacing = np.max(np.diff(self.s_coarse))
+        self.breaks = C.x
+        self.coeffs = np.transpose(C.c, (1, 2, 0))
+        for table in (self.s_table, self.p_table, self.s_coarse, self.p_coarse):
+            table.flags.writeable = False
+
+
+class ReversedCurve:
+    """
+    View of a curve that is traversed from the end to the start, so that s = 0 is the endpoint of the original
+    curve. It only holds a reference to the original curve, so reversing is cheap, the spline data and the tables
+    are shared, and the view pickles like the curve itself.
+    """
+    def __init__(self, curve):
+        self.curve = curve
+        self.s_min = 0
+        self.s_max = curve.length
+        self.length = curve.length
+
+    def __call__(self, s):
+        return self.curve(self.length - np.array(s))
+
+    def get_angle(self, s):
+        return angwrap(self.curve.get_angle(self.length - np.array(s)) + pi)
+
+    def pose_at(self, s):
+        position, heading, curvature = self.curve.pose_at(self.length - np.array(s, dtype=float))
+        return position, angwrap(heading + pi), -curvature
+
+    def get_endpoint(self):
+        return self.curve(0)
+
+    def get_points(self, n):
+        return self.curve.get_points(n)[:, ::-1]
+
+    def get_closest_s(self, p, s0=None):
+        return self.length - self.curve.get_closest_s(p, s0=None if s0 is None else self.length - s0)
+
+    def __reversed__(self):
+        return self.curve
+
+    def plot(self, ax, s, *opts):
+        z = self(s)
+        ax.plot(-z[1, :], z[0, :], *opts)
+
+
 class ParamCircle:
     def __init__(self, center, radius):
         self.R = radius
@@ -132,23 +292,23 @@ class ParamCircle:
         return p + self.center
 
     def get_angle(self, s):
-        s = np.array(s)
-        if s.shape == ():
-            s = np.array([s])
-        return np.array([angwrap(pi/2 + ss/self.R) for ss in s])
+        return angwrap(pi/2 + np.atleast_1d(s)/self.R)
+
+    def pose_at(self, s):
+        """Returns (position, heading, curvature) at s, with shapes (2, n), (n,) and (n,)."""
+        s = np.atleast_1d(np.array(s, dtype=float))
+        return self(s), self.get_angle(s), np.full(s.shape, 1/self.R)
 
     def get_endpoint(self):
         return self(self.length-100)
 
-    def get_closest_s(self, p):
-        # p = np.vstack(p)
-        # if p.shape != 2:
-        #     p = np.transpose(p)
-
-        def distance(p1, p2):
-            return np.sqrt((float(p1[0]) - float(p2[0]))**2 + (float(p1[1]) - float(p2[1]))**2)
+    def get_points(self, n):
+        return self(np.linspace(0, self.length, n))
 
-        return fminbound(lambda s: distance(self(s), p), x1=0, x2=self.length, xtol=1e-3, maxfun=10000)
+    def get_closest_s(self, p, s0=None):
+        """The closest point on a circle is in the direction of p from the center. s0 is accepted for compatibility."""
+        dx, dy = np.reshape(np.array(p, dtype=float), (2, 1)) - self.center
+        return float(self.R * (np.arctan2(dy[0], dx[0]) % (2*pi)))
 
     def plot(self, ax, s, *opts):
         s = np.array(s)
@@ -0,0 +1,122 @@
+import os
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+import numpy as np
+
+"""
+Content addressed cache for the expensive parts of path construction. The key of a path is a hash of its type and
+the exact bytes of its waypoints, so paths that are generated from the same seed map to the same entry, no matter
+which env or process generates them.
+
+Entries are dicts of numpy arrays. They are kept in an in-memory LRU, and optionally written to a directory of .npz
+files so that they can be shared between processes and runs. Users of an entry may add objects derived from its
+arrays to it after put(), which are shared in memory but never written to disk. The directory of the default cache is taken from the
+GNCGYM_PATH_CACHE environment variable, and the disk store is disabled if it isn't set.
+"""
+
+# Bump when the way paths are constructed changes, so that old entries on disk are not used
+CACHE_VERSION = 1
+
+
+def make_key(kind, waypoints):
+    """
+    :param kind: Name of the path type, e.g. 'ParamCurve'
+    :param waypoints: Array of waypoints
+    :return: Hex digest that identifies the path
+    """
+    waypoints = np.ascontiguousarray(waypoints, dtype=np.float64)
+    h = hashlib.sha1('{}:{}:{}'.format(kind, CACHE_VERSION, waypoints.shape).encode())
+    h.update(waypoints.tobytes())
+    return h.hexdigest()
+
+
+class PathCache:
+    def __init__(self, maxsize=256, directory=None):
+        """
+        :param maxsize: Number of entries to keep in memory
+        :param directory: Directory of the on-disk store, which is created if it doesn't exist. None disables it.
+        """
+        self.maxsize = maxsize
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Returns the entry with the given key, or None if it isn't in memory or on disk."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        entry = self._load(key)
+        if entry is not None:
+            self._remember(key, entry)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, key, entry):
+        """Stores a dict of arrays. The arrays are made read-only, since the entry is shared by all users of the key."""
+        entry = {k: np.array(v) for k, v in entry.items()}
+        for v in entry.values():
+            v.flags.writeable = False
+        self._remember(key, entry)
+        self._save(key, entry)
+        return entry
+
+    def clear(self):
+        """Clears the in-memory entries. The on-disk store is left as it is."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def _load(self, key):
+        if self.directory is None or not os.path.exists(self._path(key)):
+            return None
+        try:
+            with np.load(self._path(key)) as data:
+                entry = {k: data[k] for k in data.files}
+        except (OSError, ValueError) as e:
+            logging.warning('Could not read path cache entry {}: {}'.format(self._path(key), e))
+            return None
+        for v in entry.values():
+            v.flags.writeable = False
+        return entry
+
+    def _save(self, key, entry):
+        if self.directory is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file and rename it, so other processes never see a partially written entry
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **entry)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            logging.warning('Could not write path cache entry {}: {}'.format(self._path(key), e))
+
+
+# Cache used by the parametrised curves unless they are given another one
+path_cache = PathCache(directory=os.environ.get('GNCGYM_PATH_CACHE'))
@@ -0,0 +1,89 @@
+import time
+
+"""
+Real-time pacing for interactive sessions. The simulation is stepped at its fixed time step in real time (or a
+multiple of it), independently of how often frames are drawn.
+"""
+
+
+class RealTimeScheduler:
+    """
+    Decides when to step and when to draw. Each call to wait() sleeps until the next frame is due, and returns the
+    number of simulation steps that are due by then, so that simulated time follows the wall clock. Frames that are
+    missed because a step or a draw took too long are dropped instead of being drawn late, and no frame is needed
+    when no step was taken, since nothing has changed.
+
+        scheduler = RealTimeScheduler(env.sim_context.dt, fps=50)
+        while True:
+            n = scheduler.wait()
+            for _ in range(n):
+                env.step(action)
+            if n > 0:
+                env.render()
+    """
+
+    def __init__(self, dt, fps=50, speed=1.0, max_steps_per_frame=10, clock=time.perf_counter, sleep=time.sleep):
+        """
+        :param dt: Time step of the simulation
+        :param fps: Target frame rate
+        :param speed: Simulated seconds per real second, e.g. 4 to fast-forward 4x
+        :param max_steps_per_frame: If the simulation can't keep up, at most this many steps are taken between two
+                                    frames, and the simulation falls behind real time instead
+        :param clock: Function that returns the current time in seconds
+        :param sleep: Function that sleeps for the given number of seconds
+        """
+        self.dt = dt
+        self.fps = fps
+        self.max_steps_per_frame = max_steps_per_frame
+        self.clock = clock
+        self.sleep = sleep
+        self._speed = speed
+        self.reset()
+
+    def reset(self):
+        """Restarts the clock, e.g. after the env has been reset."""
+        self.steps = 0
+        self.frames = 0
+        self.dropped_frames = 0
+        self.lagged_steps = 0
+        self._t0 = self.clock()
+        self._steps0 = 0
+        self._next_frame = self._t0
+
+    @property
+    def speed(self):
+        return self._speed
+
+    @speed.setter
+    def speed(self, speed):
+        # Count from now, so that changing the speed doesn't make the simulation jump
+        self._t0 = self.clock()
+        self._steps0 = self.steps
+        self._speed = speed
+
+    def wait(self):
+        """Sleeps until the next frame is due, and returns the number of simulation steps to take before drawing it."""
+        frame_time = 1.0 / self.fps
+        now = self.clock()
+        if now < self._next_frame:
+            self.sleep(self._next_frame - now)
+            now = self.clock()
+
+        # Skip the frames that are already too late to be drawn. The clock may read slightly before the frame is
+        # due after sleeping, because of rounding or an early wakeup, which is not a missed frame.
+        missed = max(0, int((now - self._next_frame) // frame_time))
+        self.dropped_frames += missed
+        self._next_frame += (missed + 1) * frame_time
+
+        due = self._steps0 + int((now - self._t0) * self._speed / self.dt) - self.steps
+        if due > self.max_steps_per_frame:
+            # The simulation can't keep up, give up on the missed steps instead of trying to catch up
+            self.lagged_steps += due - self.max_steps_per_frame
+            due = self.max_steps_per_frame
+            self._t0 = now
+            self._steps0 = self.steps + due
+
+        self.steps += due
+        if due > 0:
+            self.frames += 1
+        return due
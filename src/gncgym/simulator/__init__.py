@@ -1 +1 @@
-from .env import init, declare_block
\ No newline at end of file
+from .env import init, declare_block, SimContext
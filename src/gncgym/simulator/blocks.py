@@ -1,37 +1,57 @@
 import numpy as np
 from copy import deepcopy
 # from . import base_env
-from . import env
 from .env import declare_block
+from .solvers import make_solver
 
 
 @declare_block
-def make_integrator_block(initial_value):
+def make_integrator_block(initial_value, ctx=None):
     # np.array actually creates a new object, similarly to copy
     buffer = np.array(initial_value)
 
     def integrate(val):
         nonlocal buffer
-        buffer += val * env.dt
+        buffer += val * ctx.dt
         return buffer
 
     return integrate
 
 
 @declare_block
-def make_derivative_block(n=3):
+def make_ode_block(dynamics, initial_value, ctx=None):
+    """
+    Integrates x_dot = dynamics(x, u) using the solver that is selected in the context. Unlike the integrator
+    block, which is handed a derivative, this block evaluates the dynamics itself, as the higher order solvers
+    need to evaluate them several times per step. The state is updated in place and returned, and is also
+    available as integrate.state, e.g. to overwrite it.
+    """
+    buffer = np.array(initial_value, dtype=float)
+    solve = make_solver(ctx.solver, **ctx.solver_options)
+
+    def integrate(u):
+        nonlocal buffer
+        buffer[...] = solve(dynamics, buffer, u, ctx.dt)
+        return buffer
+
+    integrate.state = buffer
+    return integrate
+
+
+@declare_block
+def make_derivative_block(n=3, ctx=None):
     buffer = [0]*n
 
     def update(val):
         nonlocal buffer
         buffer = buffer[1:] + [float(val)]
-        return np.mean(np.diff(buffer) / env.dt)
+        return np.mean(np.diff(buffer) / ctx.dt)
 
     return update
 
 
 @declare_block
-def make_saturation_block(max_bound, min_bound=None):
+def make_saturation_block(max_bound, min_bound=None, ctx=None):
 
     if min_bound is None:
         min_bound = -max_bound
@@ -49,7 +69,7 @@ def make_saturation_block(max_bound, min_bound=None):
 
 
 @declare_block
-def make_rate_limiting_block(rising_bound, falling_bound=None):
+def make_rate_limiting_block(rising_bound, falling_bound=None, ctx=None):
     if falling_bound is None:
         falling_bound = -rising_bound
 
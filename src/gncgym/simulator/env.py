@@ -1,39 +1,130 @@
 import sys
 import logging
+import weakref
+from .solvers import SOLVERS
 
 
-env = sys.modules[__name__]
+# Block types that have been announced with @declare_block, shared by all contexts
+block_types = set()
 
-# Public
-env.data_log = dict()
 
+class SimContext:
+    """
+    Holds everything that belongs to one running simulation: the clock, the data log and the registry of
+    blocks that have been created in it. Each environment owns its own context and passes it on to the blocks
+    and objects that it creates, so several environments can be simulated side by side in the same process
+    without sharing a clock.
 
-# Private
-blocks = dict()
+    The registry only holds weak references to the blocks, so a block is dropped from it as soon as nothing else
+    uses it, and it is cleared by init(), which starts a new episode, and close().
+    """
+    def __init__(self, **kwargs):
+        self.data_log = dict()
+        self.blocks = dict()        # BlockData of the blocks of the current episode, by block id
+        self._block_counts = dict()
+        self.dt = None
+        self.time = 0
+        self.solver = 'fixed_step'
+        self.solver_options = dict()
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, **kwargs):
+        """
+        This function must be called before starting simulation. It interprets the kwargs as simulation options,
+        enabling those options that are valid, emitting a warning to the log if an option isn't recognised or
+        valid, and raising Exceptions when the configuration as a whole is invalid and the simulation cannot be
+        run. Returns the simulation time, which is reset to zero.
+
+        Options:
+            solver:     One of 'fixed_step' (forward Euler), 'semi_implicit_euler', 'rk4' or 'dopri5'
+                        (Dormand-Prince 5(4) with error control, which takes as many substeps as it needs
+                        within each step).
+            step_size:  The time step of the simulation.
+            rtol, atol: Relative and absolute error tolerances of the dopri5 solver.
+
+        :param kwargs: simulation options
+        :return: The simulation time
+        """
+        options = dict(kwargs)
+        solver = options.pop('solver', 'fixed_step')
+        if solver not in SOLVERS:
+            raise ValueError('Unknown solver {}, must be one of {}'.format(solver, SOLVERS))
+        if 'step_size' not in options:
+            raise ValueError('The {} solver needs a step_size.'.format(solver))
+
+        self.solver = solver
+        self.dt = options.pop('step_size')
+        self.solver_options = {k: options.pop(k) for k in ('rtol', 'atol') if k in options}
+        for k in options:
+            logging.warning('Unknown simulation option {} was ignored.'.format(k))
+
+        self.time = 0
+        self.clear_blocks()
+        return self.time
+
+    def step(self):
+        self.time += self.dt
+        return self.time
+
+    def add_block(self, block_type):
+        """Registers a new block of the given type, and returns its BlockData with a unique id."""
+        if block_type not in block_types:
+            logging.error("Unknown block type {} was initialised.".format(block_type))
+
+        count = self._block_counts.get(block_type, 0)
+        self._block_counts[block_type] = count + 1
+        data = BlockData(id=str(block_type) + str(count), type=block_type)
+        self.blocks[data.id] = data
+        return data
+
+    def attach_block(self, data, block):
+        """Keeps a weak reference to the block, which removes it from the registry when it is garbage collected."""
+        def forget(_):
+            if self.blocks.get(data.id) is data:
+                del self.blocks[data.id]
+        try:
+            data.ref = weakref.ref(block, forget)
+        except TypeError:
+            data.ref = lambda: block    # Can't be referenced weakly, kept until the registry is cleared
+
+    def clear_blocks(self):
+        """Drops all blocks from the registry, and restarts the numbering of the block ids."""
+        for data in self.blocks.values():
+            data.ref = None
+        self.blocks.clear()
+        self._block_counts.clear()
+
+    def block_memory(self):
+        """Approximate number of bytes held by each live block, by block id."""
+        return {block_id: data.nbytes for block_id, data in self.blocks.items() if data.alive}
+
+    def close(self):
+        self.clear_blocks()
+        self.data_log.clear()
+
+
+# Context used by blocks that are created without one
+default_context = SimContext()
 
 
 def init(**kwargs):
     """
-    This function must be called before starting simulation. It interprets the kwargs as simulation options,
-    enabling those options that are valid, emitting a warning to the log if an option isn't recognised or valid,
-    and raising Exceptions when the configuration as a whole is invalid and the simulation cannot be run. It does not
-    return anything as simEnv is meant to be used as a 'global' module, where anything that imports simEnv has access
-    to its variables.
-
-    :param kwargs: kwargs that
-    :return: None
+    Initialises the default context, see SimContext.init(). Kept for code that simulates a single
+    environment and doesn't manage its own context.
     """
+    return default_context.init(**kwargs)
 
-    if kwargs['solver'] == 'fixed_step':
-        env.dt = kwargs['step_size']
 
-    env.time = 0
-    return env.time
+def step():
+    return default_context.step()
 
 
-def step():
-    env.time += env.dt
-    return env.time
+def __getattr__(name):
+    # Keeps reads like sim.env.dt and sim.env.time working, they refer to the default context
+    if name in ('dt', 'time', 'data_log'):
+        return getattr(default_context, name)
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
 
 
 class BlockData:
@@ -41,28 +132,53 @@ class BlockData:
     Data class that keeps track of block metadata. The only required values are the block id
     and the block type. The blocks can otherwise store whatever values they like in the class.
     """
+    ref = None  # Weak reference to the block, set by SimContext.attach_block()
+
     def __init__(self, id, type, **kwargs):
         self.id = id
         self.type = type
         for k,v in kwargs.items():
             self.__dict__[k] = v
 
+    @property
+    def block(self):
+        """The block, or None if it has been garbage collected or removed from the registry."""
+        return None if self.ref is None else self.ref()
 
-def initialise_block_with_type(block_type):
+    @property
+    def alive(self):
+        return self.block is not None
+
+    @property
+    def nbytes(self):
+        """
+        Approximate size of the block: the function and the values captured by its closure, counting the data of
+        arrays, but not the objects that they refer to.
+        """
+        block = self.block
+        if block is None:
+            return 0
+        total = sys.getsizeof(block)
+        for cell in getattr(block, '__closure__', None) or ():
+            try:
+                value = cell.cell_contents
+            except ValueError:  # Empty cell
+                continue
+            total += getattr(value, 'nbytes', None) or sys.getsizeof(value)
+        return total
+
+
+def initialise_block_with_type(block_type, ctx=None):
     """
-    Adds an entry to the blocks dict, and generates an id for the block.
+    Adds an entry to the blocks dict of the context, and generates an id for the block.
 
     :param block_type:
+    :param ctx: SimContext that the block belongs to, the default context is used if None
     :return: BlockData object containing the initial metadata of the block
     """
-    try:
-        block_id = str(block_type) + str(len(blocks[block_type]))
-    except KeyError:
-        logging.error("Unknown block type {} was initialised.".format(block_type))
-
-    block_metadata = BlockData(id=id, type=block_type)
-    blocks[block_id] = block_metadata
-    return block_metadata
+    if ctx is None:
+        ctx = default_context
+    return ctx.add_block(block_type)
 
 
 def declare_block(make_block_fun):
@@ -71,6 +187,10 @@ def declare_block(make_block_fun):
     blocks of its type exist. It also wraps the make_block function in a closure
     that allocates block ids at runtime.
 
+    The make_block function must accept a ctx keyword argument, which is the SimContext
+    that the block belongs to. Blocks that depend on the simulation clock should read
+    ctx.dt and ctx.time instead of any global state.
+
     :param make_block_fun: function that creates the block.
     :return: closure containing the make_block fun
     """
@@ -82,11 +202,11 @@ def declare_block(make_block_fun):
                      "its name does not start with 'make_'. "
                      "This may make the logs harder to read."))
     else:
-        block_type = block_type[4:]
+        block_type = block_type[len('make_'):]
 
-    blocks[block_type] = []
+    block_types.add(block_type)
 
-    def fwrapper(*args, **kwargs):
+    def fwrapper(*args, ctx=None, **kwargs):
         """
         Wrapper around the block creation function. Initialises the block metadata object
         and makes it available to the nested functions as the 'self' keyword, similar to
@@ -95,11 +215,16 @@ def declare_block(make_block_fun):
         Javascript.
 
         :param args: args that are passed on to make_block_fun
+        :param ctx: SimContext that the block belongs to, the default context is used if None
         :param kwargs: kwargs that are passed on to make_block_fun
         :return: The result of making the block (should be a function)
         """
         nonlocal block_type
-        this = initialise_block_with_type(block_type)
-        return make_block_fun(*args, **kwargs)
-
-    return fwrapper
\ No newline at end of file
+        if ctx is None:
+            ctx = default_context
+        this = initialise_block_with_type(block_type, ctx)
+        block = make_block_fun(*args, ctx=ctx, **kwargs)
+        ctx.attach_block(this, block)
+        return block
+
+    return fwrapper
@@ -0,0 +1,133 @@
+import numpy as np
+
+"""
+ODE solvers for the simulator. Each solver advances x_dot = f(x, u) by one step of length dt, holding the input u
+constant over the step. The solvers only use elementwise array operations, so they work for column vector states
+as well as for batches of states, as long as f accepts the same shapes.
+
+Use make_solver() to get a step function for one of the names in SOLVERS.
+"""
+
+
+def euler_step(f, x, u, dt):
+    """Forward Euler, first order. This is what the 'fixed_step' solver has always done."""
+    return x + dt * f(x, u)
+
+
+def semi_implicit_euler_step(f, x, u, dt, axis=0):
+    """
+    Semi-implicit (symplectic) Euler, first order. The velocities are updated first, and the positions are then
+    integrated using the new velocities. This is much more stable than forward Euler for lightly damped
+    mechanical systems, for the cost of one extra evaluation of f.
+    Assumes that the state is ordered as [eta, nu] along the given axis, i.e. positions first and velocities second.
+    """
+    n = x.shape[axis] // 2
+    eta = [slice(None)] * x.ndim
+    nu = [slice(None)] * x.ndim
+    eta[axis], nu[axis] = slice(0, n), slice(n, None)
+    eta, nu = tuple(eta), tuple(nu)
+
+    x_next = np.array(x, dtype=float)
+    x_next[nu] += dt * f(x, u)[nu]
+    x_next[eta] += dt * f(x_next, u)[eta]
+    return x_next
+
+
+def rk4_step(f, x, u, dt):
+    """Classical fourth order Runge-Kutta."""
+    k1 = f(x, u)
+    k2 = f(x + 0.5 * dt * k1, u)
+    k3 = f(x + 0.5 * dt * k2, u)
+    k4 = f(x + dt * k3, u)
+    return x + (dt / 6.0) * (k1 + 2 * k2 + 2 * k3 + k4)
+
+
+# Dormand-Prince 5(4) tableau
+DP_C = (0, 1/5, 3/10, 4/5, 8/9, 1, 1)
+DP_A = (
+    (),
+    (1/5,),
+    (3/40, 9/40),
+    (44/45, -56/15, 32/9),
+    (19372/6561, -25360/2187, 64448/6561, -212/729),
+    (9017/3168, -355/33, 46732/5247, 49/176, -5103/18656),
+    (35/384, 0, 500/1113, 125/192, -2187/6784, 11/84),
+)
+DP_B5 = (35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0)
+DP_B4 = (5179/57600, 0, 7571/16695, 393/640, -92097/339200, 187/2100, 1/40)
+DP_E = tuple(b5 - b4 for b5, b4 in zip(DP_B5, DP_B4))
+
+
+def dopri5_step(f, x, u, dt, h=None, rtol=1e-6, atol=1e-8, max_substeps=1000):
+    """
+    Embedded Dormand-Prince 5(4). The interval dt is covered by as many substeps as needed to keep the
+    estimated local error below atol + rtol*|x| for every element of the state. The step size that was
+    accepted last is returned along with the state, so that the next call can start from it.
+
+    :param h: Initial substep length, dt is used if None.
+    :return: (x_next, h_next)
+    """
+    t = 0.0
+    h = dt if h is None else min(h, dt)
+    x = np.array(x, dtype=float)
+    k1 = f(x, u)
+
+    for _ in range(max_substeps):
+        h = min(h, dt - t)
+        k = [k1]
+        for i in range(1, 7):
+            xi = x + h * sum(a * kj for a, kj in zip(DP_A[i], k) if a != 0)
+            k.append(f(xi, u))
+        # The seventh stage is evaluated at the fifth order solution (first same as last)
+        x_new = xi
+        err = h * sum(e * kj for e, kj in zip(DP_E, k) if e != 0)
+
+        scale = atol + rtol * np.maximum(np.abs(x), np.abs(x_new))
+        err_norm = np.sqrt(np.mean((err / scale) ** 2))
+
+        if err_norm <= 1:
+            t += h
+            x, k1 = x_new, k[6]
+        factor = 0.9 * err_norm ** -0.2 if err_norm > 0 else 5
+        h_next = h * min(5, max(0.2, factor))
+        if err_norm <= 1 and t >= dt * (1 - 1e-12):
+            return x, h_next
+        h = h_next
+
+    raise RuntimeError('dopri5 did not reach the end of the step after {} substeps.'.format(max_substeps))
+
+
+SOLVERS = ('fixed_step', 'euler', 'semi_implicit_euler', 'rk4', 'dopri5')
+
+
+def make_solver(name, **options):
+    """
+    Returns a step function step(f, x, u, dt) -> x_next for the named solver. The dopri5 solver remembers
+    its step size between calls, so each integrated system should get its own step function.
+
+    :param name: One of SOLVERS. 'fixed_step' and 'euler' are both forward Euler.
+    :param options: Solver options, rtol and atol for dopri5, axis for semi_implicit_euler.
+    """
+    if name in ('fixed_step', 'euler'):
+        return euler_step
+
+    elif name == 'semi_implicit_euler':
+        axis = options.get('axis', 0)
+        return lambda f, x, u, dt: semi_implicit_euler_step(f, x, u, dt, axis=axis)
+
+    elif name == 'rk4':
+        return rk4_step
+
+    elif name == 'dopri5':
+        rtol = options.get('rtol', 1e-6)
+        atol = options.get('atol', 1e-8)
+        h = None
+
+        def step(f, x, u, dt):
+            nonlocal h
+            x_next, h = dopri5_step(f, x, u, dt, h=h, rtol=rtol, atol=atol)
+            return x_next
+
+        return step
+
+    raise ValueError('Unknown solver {}, must be one of {}'.format(name, SOLVERS))
@@ -0,0 +1,121 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+"""
+Spatial queries over the obstacles of a scenario, used to decide which obstacles the vessel can see.
+"""
+
+
+class ObstacleIndex:
+    """
+    Index over the positions of a list of obstacles, for nearest neighbour queries.
+
+    For static obstacles the positions are put in a KD-tree, which is only rebuilt when the list of obstacles changes,
+    so a query costs about the same for a few obstacles as for hundreds. Obstacles that move are indexed with
+    static=False, in which case the positions are gathered at every update and searched by brute force with array
+    operations.
+    """
+    def __init__(self, static=True):
+        self.static = static
+        self.positions = np.zeros((0, 2))
+        self._tree = None
+        self._ids = ()
+
+    def update(self, obstacles):
+        """Updates the index if obstacles have been added, removed or replaced, or always if the index isn't static."""
+        ids = tuple(map(id, obstacles))
+        if self.static and ids == self._ids:
+            return
+        self._ids = ids
+        self.positions = np.array([np.ravel(o.position)[:2] for o in obstacles], dtype=float).reshape(-1, 2)
+        self._tree = cKDTree(self.positions) if self.static and len(obstacles) > 0 else None
+
+    def __len__(self):
+        return len(self.positions)
+
+    def query(self, points, k, max_distance=np.inf):
+        """
+        Finds the k nearest obstacles of each point, sorted by distance. Missing neighbours, when there are fewer than
+        k obstacles within max_distance, have an infinite distance and the index len(self).
+
+        :param points: (n, 2) array of points, or a single point
+        :param k: Number of neighbours
+        :param max_distance: Obstacles further away than this are not returned
+        :return: (distances, indices), both of shape (n, k), or (k,) for a single point
+        """
+        points = np.asarray(points, dtype=float)
+        single = points.ndim == 1
+        points = np.reshape(points, (-1, 2))
+        n = len(self.positions)
+
+        if n == 0 or k == 0:
+            distances, indices = np.full((len(points), k), np.inf), np.full((len(points), k), n)
+        elif self._tree is not None:
+            distances, indices = self._tree.query(points, k=k, distance_upper_bound=max_distance)
+            distances, indices = np.reshape(distances, (len(points), k)), np.reshape(indices, (len(points), k))
+        else:
+            d = np.hypot(*(points[:, None, :] - self.positions[None, :, :]).transpose(2, 0, 1))
+            kk = min(k, n)
+            nearest = np.argpartition(d, kk - 1, axis=1)[:, :kk]
+            d_nearest = np.take_along_axis(d, nearest, axis=1)
+            order = np.argsort(d_nearest, axis=1)
+            distances = np.full((len(points), k), np.inf)
+            indices = np.full((len(points), k), n)
+            distances[:, :kk] = np.take_along_axis(d_nearest, order, axis=1)
+            indices[:, :kk] = np.take_along_axis(nearest, order, axis=1)
+            outside = distances > max_distance
+            distances[outside], indices[outside] = np.inf, n
+
+        if single:
+            return distances[0], indices[0]
+        return distances, indices
+
+    def distances(self, point, indices):
+        """Distances from point to the obstacles with the given indices."""
+        indices = np.asarray(list(indices), dtype=int)
+        return np.hypot(*(self.positions[indices] - np.ravel(point)[:2]).T)
+
+
+def assign_slots(active, index, point, num_slots, max_distance, release_distance):
+    """
+    Deterministic allocation of a fixed number of observation slots to the obstacles closest to point.
+
+    Obstacles keep their slot until they are further away than release_distance. The nearest obstacles within
+    max_distance are then considered in order of distance. Each one takes the lowest free slot, or the slot of the
+    furthest active obstacle if there is no free slot and it is closer than that obstacle.
+
+    :param active: Dict from obstacle index to slot, updated in place
+    :param index: ObstacleIndex over the obstacles
+    :param point: Position (x, y) of the vessel
+    :param num_slots: Number of slots
+    :param max_distance: Obstacles are only allocated a slot within this distance
+    :param release_distance: Obstacles lose their slot beyond this distance
+    :return: active
+    """
+    if num_slots == 0:
+        return active
+
+    active_distances = dict(zip(active, index.distances(point, active))) if active else {}
+    for i, dist in list(active_distances.items()):
+        if dist > release_distance:
+            active.pop(i)
+            del active_distances[i]
+
+    distances, indices = index.query(np.ravel(point)[:2], num_slots, max_distance=max_distance)
+
+    for dist, i in zip(distances, indices):
+        i = int(i)
+        if not np.isfinite(dist) or i in active:
+            continue
+        free = set(range(num_slots)) - set(active.values())
+        if free:
+            active[i] = min(free)
+        else:
+            furthest = max(active_distances, key=active_distances.get)
+            if dist >= active_distances[furthest]:
+                break
+            active[i] = active.pop(furthest)
+            del active_distances[furthest]
+        active_distances[i] = dist
+
+    return active
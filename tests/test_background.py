@@ -0,0 +1,23 @@
+import numpy as np
+from gncgym.base_env.background import make_tile, choose_variant, TILE_SIZE, CELL_SIZE, BASE_COLOR, COLOR_NOISE
+
+
+class TestBackground:
+    def test_tile(self):
+        tile = make_tile(3)
+        assert tile.shape == (TILE_SIZE, TILE_SIZE, 3) and tile.dtype == np.uint8
+        assert not tile.flags.writeable
+        # The tile is made of uniformly coloured squares, with colours close to the base colour
+        cell = tile[CELL_SIZE:2*CELL_SIZE, :CELL_SIZE]
+        assert np.all(cell == cell[0, 0])
+        assert np.all(np.abs(tile / 255 - np.array(BASE_COLOR)) <= COLOR_NOISE)
+
+    def test_cached(self):
+        assert make_tile(1) is make_tile(1)
+        assert not np.array_equal(make_tile(1), make_tile(2))
+
+    def test_rng_unchanged(self):
+        """Choosing a tile does not change the random numbers used to generate the scenario."""
+        a, b = np.random.RandomState(5), np.random.RandomState(5)
+        choose_variant(a)
+        assert np.array_equal(a.random_sample(10), b.random_sample(10))
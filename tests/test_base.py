@@ -1,5 +1,9 @@
 from gncgym.scenarios.example_scenarios import ExampleScenario
+import subprocess
+import sys
+import gym
 import numpy as np
+import pytest
 
 
 class TestBase:
@@ -15,3 +19,77 @@ class TestBase:
         assert(first_obs.shape == obs.shape)
         assert(type(float(sr)) is float)  # Just make sure that you can interpret the output as float
         assert (type(done) is bool)
+
+
+class TestHeadless:
+    def test_same_output(self):
+        """A headless env returns exactly the same observations and rewards as one that draws."""
+        env, headless = ExampleScenario(), ExampleScenario(headless=True)
+        env.seed(4)
+        headless.seed(4)
+        assert np.array_equal(env.reset(), headless.reset())
+        assert headless.viewer is None and headless.vessel is None and headless.bg is None
+        for _ in range(50):
+            a, b = env.step([0.5, 0.1]), headless.step([0.5, 0.1])
+            assert np.array_equal(a[0], b[0])
+            assert a[1] == b[1] and a[2] == b[2]
+        with pytest.raises(RuntimeError):
+            headless.render()
+        env.close()
+
+    def test_registered(self):
+        env = gym.make('shipExampleScenarioHeadless-v0')
+        assert env.unwrapped.headless
+        env.reset()
+        env.step([0, 0])
+
+    def test_no_pyglet(self):
+        """Importing gncgym and stepping a headless env never imports pyglet."""
+        code = ("import sys, gym, gncgym\n"
+                "env = gym.make('shipExampleScenarioHeadless-v0')\n"
+                "env.reset()\n"
+                "env.step([0, 0])\n"
+                "assert 'pyglet' not in sys.modules, 'pyglet was imported'\n")
+        subprocess.run([sys.executable, '-c', code], check=True)
+
+
+class TestState:
+    def setup_method(self):
+        from gncgym.base_env.objects import DynamicObstacle
+        self.env = ExampleScenario(headless=True)
+        self.env.seed(0)
+        self.env.reset()
+        self.env.objects = [DynamicObstacle(self.env.objective.path, speed=3, init_s=40)]
+        for _ in range(20):
+            self.env.step([0.5, 0.1])
+
+    def rollout(self):
+        steps = [self.env.step([0.6, -0.2]) for _ in range(30)]
+        return steps, self.env.objects[0].position.copy(), self.env.objective.reward, self.env.np_random.rand()
+
+    def test_restore(self):
+        """Rollouts from a restored state are identical, including the obstacles and the random numbers."""
+        state = self.env.get_state()
+        time = self.env.sim_context.time
+        steps, obstacle, total, r = self.rollout()
+
+        self.env.set_state(state)
+        assert self.env.sim_context.time == time
+        steps2, obstacle2, total2, r2 = self.rollout()
+        for (obs, reward, done, _), (obs2, reward2, done2, _) in zip(steps, steps2):
+            assert np.array_equal(obs, obs2) and reward == reward2 and done == done2
+        assert np.array_equal(obstacle, obstacle2)
+        assert total == total2 and r == r2
+
+    def test_without_rng(self):
+        state = self.env.get_state(rng=False)
+        assert state.sizes[-1] == 0
+        r = self.env.np_random.rand()
+        self.env.set_state(state)
+        assert self.env.np_random.rand() != r
+
+    def test_other_episode(self):
+        state = self.env.get_state()
+        self.env.reset()
+        with pytest.raises(ValueError):
+            self.env.set_state(state)
@@ -0,0 +1,141 @@
+import numpy as np
+from gncgym.collision import Body, BodySet, HullSet, collide, sweep_and_prune, find_contacts, find_contacts_batch
+from gncgym.base_env.objects import make_hull, StaticObstacle, DynamicObstacle
+from gncgym.base_env.vector import VectorScenario
+from gncgym.scenarios.example_scenarios import ExampleScenario
+
+
+class TestNarrowPhase:
+    def test_circles(self):
+        a, b = Body((0, 0), radius=1), Body((1.5, 0), radius=1)
+        depth, normal = collide(a, b)
+        assert np.isclose(depth, 0.5) and np.allclose(normal, [1, 0])
+        assert collide(a, Body((2.5, 0), radius=1)) is None
+
+    def test_circle_and_polygon(self):
+        square = Body((0, 0), vertices=[(-1, -1), (-1, 1), (1, 1), (1, -1)])
+        depth, normal = collide(square, Body((1.5, 0), radius=1))
+        assert np.isclose(depth, 0.5) and np.allclose(normal, [1, 0])
+        # Outside the corner, but inside the bounding boxes
+        assert collide(square, Body((1.8, 1.8), radius=1)) is None
+        depth, normal = collide(Body((1.5, 0), radius=1), square)
+        assert np.allclose(normal, [-1, 0])
+
+    def test_rotated_polygons(self):
+        hull = make_hull(4)
+        a = Body((0, 0), angle=0, vertices=hull)
+        # The bow of a reaches x = 12, so a hull turned around with its bow at x = 11 overlaps it
+        assert collide(a, Body((23, 0), angle=np.pi, vertices=hull)) is not None
+        assert collide(a, Body((25, 0), angle=np.pi, vertices=hull)) is None
+        # Side by side with a gap between them
+        assert collide(a, Body((0, 9), angle=0, vertices=hull)) is None
+
+
+class TestBroadPhase:
+    def test_sweep_and_prune_matches_brute_force(self):
+        rng = np.random.RandomState(0)
+        centers = rng.uniform(-100, 100, (200, 2))
+        radii = rng.uniform(1, 10, 200)
+        i, j = sweep_and_prune(centers, radii)
+        found = set(zip(i.tolist(), j.tolist()))
+
+        expected = set()
+        for a in range(200):
+            for b in range(a + 1, 200):
+                if np.all(np.abs(centers[a] - centers[b]) <= radii[a] + radii[b]):
+                    expected.add((a, b))
+        assert found == expected
+
+    def test_groups_are_not_paired(self):
+        centers = np.zeros((4, 2))
+        i, j = sweep_and_prune(centers, np.ones(4), groups=[0, 0, 1, 1])
+        assert set(zip(i.tolist(), j.tolist())) == {(0, 1), (2, 3)}
+
+    def test_batch_matches_single(self):
+        rng = np.random.RandomState(1)
+        vessels = [Body(rng.uniform(-20, 20, 2), angle=rng.uniform(-3, 3), vertices=make_hull(4)) for _ in range(5)]
+        worlds = [[Body(rng.uniform(-30, 30, 2), radius=rng.uniform(1, 5)) for _ in range(20)] for _ in range(5)]
+        batch = find_contacts_batch(vessels, worlds)
+        for vessel, world, contacts in zip(vessels, worlds, batch):
+            assert [c.index for c in contacts] == [c.index for c in find_contacts(vessel, world)]
+
+
+class TestBodySet:
+    def test_bodies_are_kept_across_steps(self):
+        """The bodies are built once, and only those of moving objects are updated."""
+        env = ExampleScenario(headless=True)
+        env.seed(0)
+        env.reset()
+        path = env.objective.path
+        env.objects = [StaticObstacle(position=path(60).flatten(), radius=5), DynamicObstacle(path, speed=3, init_s=40)]
+        env.step([1, 0])
+        bodies = env.objective.bodies
+        static, moving = bodies.bodies
+        assert bodies.moving == [1]
+        for _ in range(5):
+            fresh = BodySet.of(env.objects)     # The objective sees the objects before they are moved by step()
+            env.step([1, 0])
+            assert env.objective.bodies is bodies and bodies.bodies[0] is static
+            assert np.allclose(bodies.centers, fresh.centers) and np.allclose(bodies.radii, fresh.radii)
+            assert np.isclose(moving.angle, fresh.bodies[1].angle)
+
+        env.objects = env.objects[:1]
+        env.step([1, 0])
+        assert env.objective.bodies is not bodies and len(env.objective.bodies) == 1
+        env.close()
+
+    def test_body_set_matches_list(self):
+        rng = np.random.RandomState(2)
+        vessel = Body((0, 0), vertices=make_hull(4))
+        world = [Body(rng.uniform(-30, 30, 2), radius=rng.uniform(1, 5)) for _ in range(30)]
+        contacts = find_contacts(vessel, BodySet(world))
+        assert len(contacts) > 0
+        assert [(c.index, c.depth) for c in contacts] == [(c.index, c.depth) for c in find_contacts(vessel, world)]
+
+
+    def test_hull_set_matches_bodies(self):
+        rng = np.random.RandomState(3)
+        positions, angles = rng.uniform(-20, 20, (6, 2)), rng.uniform(-3, 3, 6)
+        vessels = [Body(p, angle=a, vertices=make_hull(4)) for p, a in zip(positions, angles)]
+        worlds = [[Body(rng.uniform(-30, 30, 2), radius=rng.uniform(1, 5)) for _ in range(20)] for _ in range(6)]
+        batch = find_contacts_batch(HullSet(positions, angles, make_hull(4)), worlds)
+        assert sum(len(c) for c in batch) > 0
+        for contacts, expected in zip(batch, find_contacts_batch(vessels, worlds)):
+            assert [(c.index, c.depth) for c in contacts] == [(c.index, c.depth) for c in expected]
+
+    def test_vector_env_keeps_bodies(self):
+        vec = VectorScenario(ExampleScenario, 2, seed=0)
+        vec.reset()
+        vec.envs[1].objects = [StaticObstacle(position=vec.states[1, :2] + 50, radius=5)]
+        vec.step(np.zeros((2, 2)))
+        worlds = vec.objective.worlds
+        vec.step(np.zeros((2, 2)))
+        assert vec.objective.worlds is worlds and list(worlds.owner) == [1]
+        vec.envs[0].objects = [StaticObstacle(position=vec.states[0, :2], radius=5)]
+        _, _, _, infos = vec.step(np.zeros((2, 2)))
+        assert vec.objective.worlds is not worlds and len(infos[0]['contacts']) == 1
+
+
+class TestEnvContacts:
+    def test_collision_is_penalised_and_reported(self):
+        env = ExampleScenario()
+        env.seed(0)
+        env.reset()
+        x, y = env.objective.path(20).flatten()
+        env.objects = [StaticObstacle(position=(x, y), radius=5)]
+        hit = False
+        for _ in range(400):
+            _, reward, done, info = env.step([1, 0])
+            hit = hit or bool(info['contacts'])
+            if info['contacts']:
+                assert reward < -20
+                break
+        assert hit
+
+    def test_vector_env_reports_contacts(self):
+        vec = VectorScenario(ExampleScenario, 2, seed=0)
+        vec.reset()
+        vec.envs[1].objects = [StaticObstacle(position=vec.states[1, :2], radius=5)]
+        _, rewards, _, infos = vec.step(np.zeros((2, 2)))
+        assert infos[0]['contacts'] == [] and len(infos[1]['contacts']) == 1
+        assert rewards[1] < rewards[0] - 20
@@ -63,3 +63,41 @@ class TestDefinitions:
             Ly = np.linalg.norm(np.array(y))
             assert np.linalg.norm(np.array(defs.normalise(x)) - tuple(np.array(x)/Lx)) < 0.00001
             assert np.linalg.norm(np.array(defs.normalise(y)) - tuple(np.array(y)/Ly)) < 0.00001
+
+
+class TestStateArray:
+    def test_views(self):
+        """The fields of a batch are views of one structured array."""
+        states = defs.StateArray((3,))
+        states.x[:] = [1, 2, 3]
+        states.yaw[1] = 0.5
+        assert np.all(states.position[:, 0] == [1, 2, 3])
+        assert states.position.base is states.data
+        assert states.vector.shape == (3, 12)
+        assert states[1].yaw == 0.5
+        states[2].surge = 4
+        assert states.velocity[2, 0] == 4
+
+    def test_from_vector(self):
+        state = defs.StateArray.from_vector([1, 2, 0.3, 4, 5, 6], ['x', 'y', 'yaw', 'surge', 'sway', 'yawrate'])
+        assert state.shape == ()
+        assert np.all(state.pose == [1, 2, 0, 0, 0, 0.3])
+        assert np.all(state.vector == [1, 2, 0, 0, 0, 0.3, 4, 5, 0, 0, 0, 6])
+
+        batch = defs.StateArray.from_vector(np.arange(24).reshape(2, 12))
+        assert len(batch) == 2 and batch.yawrate[1] == 23
+
+    def test_state6dof(self):
+        """The old State6DOF API returns floats and named tuples."""
+        state = defs.State6DOF(x=1, y=2, yaw=0.5, surge=3)
+        assert isinstance(state, defs.StateArray)
+        assert type(state.x) is float and state.x == 1
+        assert state.position == defs.Position(1, 2, 0)
+        assert state.position.x == 1 and state.orientation.yaw == 0.5
+        assert state.velocity.surge == 3
+        state.velocity = (1, 2, 3, 4, 5, 6)
+        assert state.linVelocity == defs.LinVel(1, 2, 3)
+
+        copy = state.copy()
+        copy.x = 10
+        assert state.x == 1 and type(copy) is defs.State6DOF
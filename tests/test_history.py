@@ -0,0 +1,96 @@
+import os
+import numpy as np
+from gncgym.scenarios.example_scenarios import ExampleScenario
+
+
+def run(episodes=2, steps=30, **kwargs):
+    env = ExampleScenario(headless=True)
+    env.seed(0)
+    history = env.record_history(**kwargs)
+    rewards = []
+    for _ in range(episodes):
+        env.reset()
+        for _ in range(steps):
+            _, r, _, _ = env.step([0.5, 0.1])
+            rewards.append(r)
+    return env, history, rewards
+
+
+class TestEnvHistory:
+    def test_record(self):
+        env, history, rewards = run(chunk_size=16)
+        assert len(history) == 62
+        assert history._capacity == 64
+        assert history.nbytes / 64 < 1000    # Bytes per step
+        assert list(history.episodes()) == [1, 2]
+
+        last = history.columns
+        assert np.allclose(last['state'][-1], env.last_state.vector)
+        assert np.allclose(last['obs'][-1], env.last_obs)
+        assert np.allclose(last['action'][-1], [0.5, 0.1])
+        assert last['time'][-1] == env.sim_context.time
+        assert np.allclose(last['reward'][history['time'] > 0], rewards)
+        assert last['num_objects'][-1] == len(env.objects)
+
+    def test_between(self):
+        env, history, _ = run(chunk_size=16)
+        dt = env.sim_context.dt
+
+        episode = history.get_episode(2)
+        assert len(episode['time']) == 31 and np.all(episode['episode'] == 2)
+        assert episode['state'].base is not None   # A view
+
+        steps = history.between(5 * dt - dt / 2, 10 * dt - dt / 2, episode=1)
+        assert np.allclose(steps['time'], dt * np.arange(5, 10))
+
+        both = history.between(5 * dt - dt / 2, 10 * dt - dt / 2)
+        assert list(both['episode']) == [1] * 5 + [2] * 5
+
+    def test_spill(self, tmp_path):
+        """Beyond spill_size the columns are moved to files, and keep growing there."""
+        _, history, _ = run(chunk_size=8, spill_size=10000, directory=str(tmp_path))
+        _, memory, _ = run(chunk_size=8, spill_size=None)
+
+        assert history.spilled and not memory.spilled
+        assert isinstance(history._arrays['state'], np.memmap)
+        assert os.path.exists(tmp_path / 'state.dat')
+        for name, column in memory.columns.items():
+            assert np.array_equal(history[name], column)
+
+    def test_temporary_directory(self):
+        _, history, _ = run(episodes=1, steps=5, chunk_size=8, spill_size=0)
+        directory = history.directory
+        assert history.spilled and os.path.isdir(directory)
+        history.close()
+        assert not os.path.exists(directory)
+
+    def test_reuse_after_close(self):
+        """A closed history that is still attached to the env starts over, and can spill again."""
+        env, history, _ = run(episodes=1, steps=20, chunk_size=8, spill_size=1000)
+        assert history.spilled
+        history.close()
+        assert len(history) == 0 and not history.spilled
+
+        env.reset()
+        for _ in range(20):
+            env.step([0.5, 0.1])
+        assert len(history) == 21 and history.spilled
+        assert list(history.episodes()) == [1]
+        assert np.allclose(history['state'][-1], env.last_state.vector)
+        history.close()
+
+    def test_between_after_set_state(self):
+        """Branched rollouts rewind the time within an episode, which between() must still handle."""
+        env, history, _ = run(episodes=1, steps=10, chunk_size=16)
+        dt = env.sim_context.dt
+        env.reset()
+        state = env.get_state()
+        for _ in range(2):
+            env.set_state(state)
+            for _ in range(5):
+                env.step([0.5, 0.1])
+
+        steps = history.between(2 * dt - dt / 2, 4 * dt - dt / 2, episode=2)
+        assert np.allclose(steps['time'], dt * np.array([2, 3, 2, 3]))
+        assert np.all(steps['episode'] == 2)
+        assert np.allclose(history.between(2 * dt - dt / 2, 4 * dt - dt / 2, episode=1)['time'], dt * np.arange(2, 4))
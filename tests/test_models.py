@@ -1,3 +1,5 @@
+import numpy as np
+import pytest
 import gncgym.models as models
 
 
@@ -8,3 +10,99 @@ class TestModelLoading:
 
     def test_model_interfaces(self):
         loaded_models = models.autoload()  # Result is cached after models are loaded for the first time
+
+
+class TestSupplyShipBatch:
+    def test_batch_matches_matrix_form(self):
+        """The closed form must match M_p_inv @ (B_p @ f - C(nu) @ nu - D_p @ nu), with C taken from m2c()."""
+        from gncgym.models.supplyship3DOF import SupplyShip3DOF, INPUT_SCALE, M_6DOF, M_p_inv, B_p, D_p
+        from gncgym.models.gncUtilities import m2c, Rzyx
+        model = SupplyShip3DOF()
+        rng = np.random.RandomState(0)
+        states = rng.randn(50, 6) * [100, 100, 3, 5, 1, 0.1]
+        u = rng.rand(50, 2) * [1, 2] - [0, 1]
+
+        batch = model.dynamics_batch(states, u)
+        assert batch.shape == (50, 6)
+        for i in range(50):
+            _, _, psi, uu, vv, rr = states[i]
+            nu = np.array([uu, vv, rr])
+            f = u[i] * INPUT_SCALE
+            C = m2c(M_6DOF, np.array([uu, vv, 0, 0, 0, rr]))[np.ix_([0, 1, 5], [0, 1, 5])]
+            eta_dot = Rzyx(0, 0, psi).dot(nu)
+            nu_dot = M_p_inv @ (B_p @ f - C @ nu - D_p @ nu)
+            assert np.allclose(batch[i], np.concatenate([eta_dot, nu_dot]), rtol=1e-10, atol=1e-12)
+
+    def test_coriolis_matches_6dof_matrix(self):
+        """The closed form Coriolis terms must equal the surge, sway and yaw part of m2c(M_6DOF, nu_6DOF)."""
+        from gncgym.models.supplyship3DOF import ship_dynamics, M_6DOF, M_p_inv, D_p
+        from gncgym.models.gncUtilities import m2c
+        u, v, r = 3.0, -0.4, 0.05
+        C = m2c(M_6DOF, np.array([u, v, 0, 0, 0, r]))[np.ix_([0, 1, 5], [0, 1, 5])]
+        nu = np.array([u, v, r])
+        expected = M_p_inv.dot(-C.dot(nu) - D_p.dot(nu))
+        state_dot = ship_dynamics(np.array([[0, 0, 0, u, v, r]]), np.zeros((1, 2)))
+        assert np.allclose(state_dot[0, 3:], expected)
+
+
+class TestAUVBatch:
+    def test_batch_matches_matrix_form(self):
+        """The elementwise evaluation must match the original M_inv @ (B(u) @ f - D(u, v, r) @ nu) form."""
+        from gncgym.models.auv import AUV2D, INPUT_SCALE, M_inv, B, D
+        from gncgym.models.gncUtilities import Rzyx
+        model = AUV2D()
+        rng = np.random.RandomState(1)
+        states = rng.randn(50, 6) * [10, 10, 3, 1.5, 0.5, 0.3]
+        u = rng.rand(50, 2) * [1, 2] - [0, 1]
+
+        batch = model.dynamics_batch(states, u)
+        for i in range(50):
+            _, _, psi, uu, vv, rr = states[i]
+            nu = np.array([uu, vv, rr])
+            f = u[i] * INPUT_SCALE
+            eta_dot = Rzyx(0, 0, psi).dot(nu)
+            nu_dot = M_inv @ (B(uu) @ f - D(uu, vv, rr) @ nu)
+            assert np.allclose(batch[i], np.concatenate([eta_dot, nu_dot]), rtol=1e-12, atol=1e-12)
+            assert np.allclose(model._dynamics(np.vstack(states[i]), np.vstack(f)).flatten(), batch[i])
+
+
+class TestModelStep:
+    def setup_method(self):
+        from gncgym.models.supplyship3DOF import SupplyShip3DOF
+        from gncgym.simulator import SimContext
+        self.model = SupplyShip3DOF()
+        self.model.sim_context = SimContext(solver='fixed_step', step_size=0.05)
+        self.model._reset_model({'x': 1, 'y': 2, 'yaw': 0.1, 'surge': 3, 'sway': 0, 'yawrate': 0})
+
+    def test_buffer(self):
+        """The state is written into the same buffer at every step, in the columns of the state map."""
+        state = self.model._model([0.5, 0.1])
+        assert self.model._model([0.5, 0.1]) is state
+        assert np.allclose(state.vector[[0, 1, 5, 6, 7, 11]], self.model._model_state.ravel())
+        assert state.z == 0 and state.roll == 0
+
+        previous = state
+        self.model._reset_model({'x': 0, 'y': 0, 'yaw': 0, 'surge': 0, 'sway': 0, 'yawrate': 0})
+        assert self.model._model([0.5, 0.1]) is not previous
+
+    def test_specs(self):
+        """The input space and state map are resolved once per class."""
+        from gncgym.models.supplyship3DOF import SupplyShip3DOF
+        specs = self.model.model_specs
+        assert SupplyShip3DOF().model_specs is specs
+        assert specs.input_shape == (2,)
+        assert list(specs.state_index) == [0, 1, 5, 6, 7, 11]
+
+    def test_debug_level(self, caplog):
+        from gncgym.models.model import DEBUG_OFF, DEBUG_STRICT
+        self.model._model([2, 0])
+        assert 'out of input_space' in caplog.text
+
+        caplog.clear()
+        self.model.debug_level = DEBUG_OFF
+        self.model._model([2, 0])
+        assert caplog.text == ''
+
+        self.model.debug_level = DEBUG_STRICT
+        with pytest.raises(ValueError):
+            self.model._model([0.5, 0, 0])
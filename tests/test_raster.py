@@ -0,0 +1,60 @@
+import numpy as np
+from gncgym.base_env.raster import Rasteriser, Scene
+from gncgym.base_env.base import STATE_W, STATE_H, VESSEL_COLOR
+from gncgym.scenarios.example_scenarios import ExampleScenario
+
+
+class TestRasteriser:
+    def test_polygon(self):
+        """A polygon covers exactly the pixels whose centres are inside it, and later primitives are drawn on top."""
+        r = Rasteriser(10, 10, background=(0, 0, 0))
+        scene = Scene()
+        scene.polygon([(-2, -2), (2, -2), (2, 2), (-2, 2)], (1, 0, 0))
+        scene.polygon([(0, 0), (2, 0), (2, 2), (0, 2)], (0, 0, 1))
+        image = r.render(scene, (0, 0, 0, 1))
+
+        # World y points up and image rows down, the centre of the view is at pixel (5, 5)
+        expected = np.zeros((10, 10, 3), dtype=np.uint8)
+        expected[3:7, 3:7] = (255, 0, 0)
+        expected[3:5, 5:7] = (0, 0, 255)
+        assert np.array_equal(image, expected)
+
+    def test_polyline(self):
+        r = Rasteriser(20, 20, background=(0, 0, 0))
+        scene = Scene()
+        scene.polyline([(-5, -0.5), (5.5, -0.5), (5.5, 4.5)], (1, 1, 1))
+        image = r.render(scene, (0, 0, 0, 1))
+        assert np.all(image[10, 5:15] == 255)
+        assert np.all(image[5:10, 15] == 255)
+        assert np.all(image[15] == 0)
+
+    def test_batch(self):
+        """Rendering a batch gives the same images as rendering the scenes one at a time."""
+        rng = np.random.RandomState(0)
+        scenes, cameras = [], []
+        for _ in range(4):
+            scene = Scene()
+            for _ in range(5):
+                scene.circle(rng.uniform(-20, 20, 2), rng.uniform(1, 5), rng.rand(3))
+            scene.polyline(rng.uniform(-20, 20, (10, 2)), rng.rand(3), linewidth=2)
+            scenes.append(scene)
+            cameras.append((rng.uniform(-5, 5), rng.uniform(-5, 5), rng.uniform(-np.pi, np.pi), 1.5))
+
+        r = Rasteriser(32, 24)
+        batch = r.render_batch(scenes, cameras).copy()
+        assert batch.shape == (4, 24, 32, 3)
+        single = Rasteriser(32, 24)
+        for i in range(4):
+            assert np.array_equal(batch[i], single.render(scenes[i], cameras[i]))
+
+    def test_env(self):
+        """Headless envs can make pixel observations, with the vessel at the centre of the view."""
+        env = ExampleScenario(headless=True)
+        env.seed(0)
+        env.reset()
+        for _ in range(30):
+            env.step([0.5, 0])
+        image = env.render(mode='state_pixels')
+        assert image.shape == (STATE_H, STATE_W, 3) and image.dtype == np.uint8
+        vessel = np.round(255 * np.array(VESSEL_COLOR))
+        assert np.all(image[STATE_H // 2, STATE_W // 2] == vessel)
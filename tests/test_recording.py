@@ -0,0 +1,64 @@
+import os
+import sys
+import numpy as np
+import pytest
+from click.testing import CliRunner
+from gncgym.recording import VideoRecorder
+from gncgym.cli import cli
+
+
+def fake_ffmpeg(tmp_path, delay=0.0, exit_code=0):
+    """Executable that copies stdin to its last argument, like ffmpeg writing raw video, or fails."""
+    path = tmp_path / 'ffmpeg'
+    path.write_text(
+        '#!{}\n'
+        'import sys, time, shutil\n'
+        'if {}: sys.exit({})\n'
+        'with open(sys.argv[-1], "wb") as f:\n'
+        '    while True:\n'
+        '        time.sleep({})\n'
+        '        data = sys.stdin.buffer.read(4096)\n'
+        '        if not data: break\n'
+        '        f.write(data)\n'.format(sys.executable, exit_code, exit_code, delay))
+    os.chmod(path, 0o755)
+    return str(path)
+
+
+class TestVideoRecorder:
+    def test_frames(self, tmp_path):
+        """Every frame_skip'th frame is downscaled and streamed to ffmpeg."""
+        out = str(tmp_path / 'out.raw')
+        frames = [np.full((40, 60, 3), i, dtype=np.uint8) for i in range(10)]
+        with VideoRecorder(out, frame_skip=3, scale=0.5, ffmpeg=fake_ffmpeg(tmp_path)) as recorder:
+            for f in frames:
+                recorder.add_frame(f)
+        assert recorder.frames_added == 10 and recorder.frames_written == 4
+
+        data = np.fromfile(out, dtype=np.uint8).reshape(-1, 20, 30, 3)
+        assert len(data) == 4
+        assert [int(d[0, 0, 0]) for d in data] == [0, 3, 6, 9]
+
+    def test_back_pressure(self, tmp_path):
+        """The queue is bounded, so a slow encoder blocks add_frame() instead of buffering all of the frames."""
+        recorder = VideoRecorder(str(tmp_path / 'out.raw'), queue_size=2, ffmpeg=fake_ffmpeg(tmp_path, delay=0.01))
+        frame = np.zeros((200, 200, 3), dtype=np.uint8)
+        for _ in range(20):
+            recorder.add_frame(frame)
+            assert recorder._queue.qsize() <= 2
+        recorder.close()
+        assert recorder.frames_written == 20
+
+    def test_error(self, tmp_path):
+        recorder = VideoRecorder(str(tmp_path / 'out.raw'), ffmpeg=fake_ffmpeg(tmp_path, exit_code=1))
+        with pytest.raises(RuntimeError):
+            for _ in range(100):
+                recorder.add_frame(np.zeros((400, 400, 3), dtype=np.uint8))
+            recorder.close()
+
+    def test_cli(self, tmp_path):
+        """The record command runs without a display."""
+        out = str(tmp_path / 'out.raw')
+        result = CliRunner().invoke(cli, ['record', out, '--steps', '20', '--seed', '0', '--frame-skip', '2',
+                                          '--ffmpeg', fake_ffmpeg(tmp_path)])
+        assert result.exit_code == 0, result.output
+        assert os.path.getsize(out) == 10 * 400 * 600 * 3
@@ -0,0 +1,147 @@
+import pickle
+import numpy as np
+from scipy.optimize import fminbound
+from gncgym.reference_generation.parametrised_curves import RandomCurveThroughOrigin, ParamCurve, ParamLine, ParamCircle
+from gncgym.reference_generation.path_cache import PathCache, make_key
+
+
+def brute_force_distance(curve, p, n=100001):
+    points = curve(np.linspace(0, curve.length, n))
+    return np.sqrt(np.min(np.sum((points - np.reshape(p, (2, 1)))**2, axis=0)))
+
+
+class TestClosestPoint:
+    def test_curve_projection_is_global(self):
+        rng = np.random.RandomState(0)
+        for k in range(10):
+            curve = RandomCurveThroughOrigin(rng, start=(200 * np.cos(k), 200 * np.sin(k)))
+            for _ in range(10):
+                p = rng.uniform(-200, 200, 2)
+                s = curve.get_closest_s(p)
+                assert np.linalg.norm(curve(s) - p) < brute_force_distance(curve, p) + 1e-6
+
+    def test_warm_start_gives_same_result(self):
+        rng = np.random.RandomState(1)
+        curve = RandomCurveThroughOrigin(rng, start=(200, 50))
+        for s_true in np.linspace(5, curve.length - 5, 20):
+            p = curve(s_true).flatten() + rng.uniform(-5, 5, 2)
+            s = curve.get_closest_s(p)
+            for s0 in (s - 0.5, s + 0.5, 0, curve.length):
+                assert abs(curve.get_closest_s(p, s0=s0) - s) < 1e-5
+
+    def test_matches_fminbound_near_path(self):
+        curve = RandomCurveThroughOrigin(np.random.RandomState(2), start=(-150, 100))
+        for s_true in np.linspace(10, curve.length - 10, 10):
+            p = curve(s_true).flatten() + np.array([1.0, -1.0])
+            expected = fminbound(lambda s: np.linalg.norm(curve(s).flatten() - p), 0, curve.length, xtol=1e-8)
+            assert abs(curve.get_closest_s(p) - expected) < 1e-5
+
+    def test_reversed_curve(self):
+        curve = RandomCurveThroughOrigin(np.random.RandomState(3), start=(200, 0))
+        p = np.array([10.0, 20.0])
+        assert abs(reversed(curve).get_closest_s(p) - (curve.length - curve.get_closest_s(p))) < 1e-5
+
+    def test_line_and_circle(self):
+        line = ParamLine([0, 0], [10, 10])
+        assert abs(line.get_closest_s([5, 0]) - 5 / np.sqrt(2)) < 1e-9
+        assert line.get_closest_s([-5, -9]) == 0
+        assert abs(line.get_closest_s([30, 30]) - line.length) < 1e-9
+
+        circle = ParamCircle((0, 1), 5)
+        assert abs(circle.get_closest_s([0, -5]) - 1.5 * np.pi * 5) < 1e-9
+
+
+class TestPose:
+    def test_curve_angle_matches_finite_difference(self):
+        curve = RandomCurveThroughOrigin(np.random.RandomState(0), start=(200, 50))
+        s = np.linspace(1, curve.length - 1, 50)
+        d = curve(s + 1e-4) - curve(s - 1e-4)
+        expected = np.arctan2(d[1], d[0])
+        assert np.allclose(np.angle(np.exp(1j * (curve.get_angle(s) - expected))), 0, atol=1e-6)
+        assert curve.get_angle(10.0).shape == (1,)
+
+    def test_curvature_of_circular_curve(self):
+        # pchip is monotone in each coordinate, so the arc avoids extrema of x and y, where it flattens the curve
+        a = np.linspace(0.1, 1.4, 30)
+        curve = ParamCurve(100 * np.array([np.cos(a), np.sin(a)]))
+        position, heading, curvature = curve.pose_at(np.linspace(20, curve.length - 20, 10))
+        assert position.shape == (2, 10)
+        assert np.allclose(curvature, 0.01, rtol=0.1)
+        _, _, reversed_curvature = reversed(curve).pose_at(curve.length - np.linspace(20, curve.length - 20, 10))
+        assert np.allclose(reversed_curvature, -curvature)
+
+    def test_line_and_circle_pose(self):
+        line = ParamLine([0, 0], [10, 10])
+        _, heading, curvature = line.pose_at([0, 5])
+        assert np.allclose(heading, np.pi / 4) and np.allclose(curvature, 0)
+
+        circle = ParamCircle((0, 0), 5)
+        _, heading, curvature = circle.pose_at([0, 2.5 * np.pi])
+        assert np.allclose(heading, [np.pi / 2, -np.pi]) or np.allclose(heading, [np.pi / 2, np.pi])
+        assert np.allclose(curvature, 0.2)
+
+
+WAYPOINTS = [[200, 50], [90, 30], [0, 0], [-110, -20], [-200, -50]]
+
+
+class TestPathCache:
+    def test_cached_curve_matches_uncached(self):
+        cache = PathCache()
+        first = ParamCurve(WAYPOINTS, cache=cache)
+        second = ParamCurve(WAYPOINTS, cache=cache)
+        uncached = ParamCurve(WAYPOINTS, cache=None)
+        assert cache.hits == 1 and cache.misses == 1
+
+        s = np.linspace(0, uncached.length, 100)
+        assert first.length == second.length == uncached.length
+        assert np.array_equal(second(s), uncached(s))
+        assert np.array_equal(second.get_angle(s), uncached.get_angle(s))
+
+        # A hit reuses the pchip and the projection tables instead of rebuilding them
+        assert second.C is first.C and second._p_table is first._p_table and second._dC is first._dC
+        assert second.get_closest_s((30, 10)) == uncached.get_closest_s((30, 10))
+
+    def test_lru_eviction(self):
+        cache = PathCache(maxsize=2)
+        keys = [make_key('ParamCurve', np.transpose(np.array(WAYPOINTS) + i)) for i in range(3)]
+        for i in range(3):
+            ParamCurve(np.array(WAYPOINTS) + i, cache=cache)
+        assert len(cache) == 2
+        assert keys[0] not in cache and keys[2] in cache
+
+    def test_disk_store_is_shared(self, tmp_path):
+        ParamCurve(WAYPOINTS, cache=PathCache(directory=str(tmp_path)))
+        assert len(list(tmp_path.glob('*.npz'))) == 1
+
+        other = PathCache(directory=str(tmp_path))
+        curve = ParamCurve(WAYPOINTS, cache=other)
+        assert other.hits == 1 and other.misses == 0
+        assert np.array_equal(curve(10.0), ParamCurve(WAYPOINTS, cache=None)(10.0))
+
+    def test_points_are_shared(self):
+        cache = PathCache()
+        first = ParamCurve(WAYPOINTS, cache=cache)
+        points = first.get_points(50)
+        assert ParamCurve(WAYPOINTS, cache=cache).get_points(50) is points
+        assert np.allclose(points, first(np.linspace(0, first.length, 50)))
+        assert np.allclose(reversed(first).get_points(50), points[:, ::-1])
+
+
+class TestReversedCurve:
+    def test_view_shares_curve(self):
+        curve = ParamCurve(WAYPOINTS)
+        view = reversed(curve)
+        assert view.curve is curve
+        assert reversed(view) is curve
+
+        s = np.linspace(0, curve.length, 20)
+        assert np.allclose(view(s), curve(curve.length - s))
+        assert np.allclose(np.cos(view.get_angle(s)), -np.cos(curve.get_angle(curve.length - s)))
+        assert np.allclose(view.get_endpoint(), curve(0))
+
+    def test_pickle(self):
+        view = reversed(ParamCurve(WAYPOINTS))
+        copy = pickle.loads(pickle.dumps(view))
+        s = np.linspace(0, view.length, 20)
+        assert np.array_equal(copy(s), view(s))
+        assert abs(copy.get_closest_s([10, 20]) - view.get_closest_s([10, 20])) < 1e-9
@@ -0,0 +1,92 @@
+import sys
+import subprocess
+import numpy as np
+import pytest
+from gncgym.scenarios.example_scenarios import ExampleScenario
+from gncgym.base_env.remote import SnapshotReader, NUM_SLOTS
+
+
+class TestSnapshots:
+    def setup_method(self):
+        self.env = ExampleScenario(headless=True)
+        self.env.seed(0)
+        self.name = self.env.publish_snapshots()
+        self.env.reset()
+        self.reader = SnapshotReader(self.name)
+
+    def teardown_method(self):
+        self.reader.close()
+        self.env.close()
+
+    def test_unwatched(self):
+        """Nothing is written until a viewer has sent a heartbeat."""
+        self.env.step([0.5, 0])
+        assert self.env.snapshots.published == 0
+        assert self.reader.read() is None
+
+    def test_roundtrip(self):
+        self.reader.heartbeat()
+        for _ in range(NUM_SLOTS + 1):
+            self.env.step([0.5, 0.1])
+        snapshot = self.reader.read()
+        state = self.env.last_state
+        assert np.allclose(snapshot['state'], [state.x, state.y, state.yaw, state.surge, state.sway, state.yawrate])
+        assert np.allclose(snapshot['action'], [0.5, 0.1])
+        assert snapshot['reward'] == self.env.objective.reward
+        assert snapshot['time'] == self.env.sim_context.time
+        assert snapshot['num_objects'] == len(self.env.objects)
+        assert snapshot['num_path_points'] == len(self.env.objective.path_points)
+
+        episode = int(snapshot['episode'])
+        self.env.reset()
+        assert int(self.reader.read()['episode']) == episode + 1
+
+    def test_torn(self):
+        """A slot that is being written is never returned."""
+        self.reader.heartbeat()
+        self.env.step([0.5, 0])
+        latest = int(self.reader.header['latest'])
+        self.reader.slots['seq'][latest] += 1
+        assert self.reader.read(retries=3) is None
+        assert self.reader.torn_reads == 3
+
+    def test_no_pyglet(self):
+        """Publishing from a headless env never imports pyglet."""
+        code = ("import sys\n"
+                "from gncgym.scenarios.example_scenarios import ExampleScenario\n"
+                "from gncgym.base_env.remote import SnapshotReader\n"
+                "env = ExampleScenario(headless=True)\n"
+                "reader = SnapshotReader(env.publish_snapshots())\n"
+                "reader.heartbeat()\n"
+                "env.reset()\n"
+                "env.step([0, 0])\n"
+                "assert reader.read() is not None\n"
+                "reader.close()\n"
+                "env.close()\n"
+                "assert 'pyglet' not in sys.modules, 'pyglet was imported'\n")
+        subprocess.run([sys.executable, '-c', code], check=True)
+
+
+class TestRemoteViewer:
+    def test_draw(self):
+        from gncgym.base_env.remote import RemoteViewer
+        env = ExampleScenario(headless=True)
+        env.seed(0)
+        viewer = RemoteViewer(env.publish_snapshots())
+        try:
+            assert not viewer.draw()
+            viewer.reader.heartbeat()
+            env.reset()
+            env.step([0.5, 0])
+            assert viewer.draw()
+            shapes = viewer.viewer.retained_shapes
+            assert 'path' in shapes
+            assert len([k for k in shapes if k[0] == 'object']) == len(env.objects)
+
+            # A new episode replaces the shapes
+            env.reset()
+            assert viewer.draw()
+            assert viewer.episode == 2
+        finally:
+            viewer.close()
+            env.close()
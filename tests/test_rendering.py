@@ -0,0 +1,150 @@
+import numpy as np
+import pytest
+from gncgym.scenarios.example_scenarios import ExampleScenario
+from gncgym.base_env.objects import StaticObstacle
+
+
+class TestRetained:
+    def setup_method(self):
+        self.env = ExampleScenario()
+        self.env.seed(0)
+        self.env.reset()
+        self.viewer = self.env.viewer
+
+    def teardown_method(self):
+        self.env.close()
+
+    def test_retained(self):
+        """Retained shapes are created once, and dropped by reset_retained()."""
+        calls = []
+        factory = lambda v: calls.append(1) or v.make_circle_shape(1, color=(1, 0, 0))
+        shape = self.viewer.retained('circle', factory)
+        assert self.viewer.retained('circle', factory) is shape
+        assert len(calls) == 1
+        self.viewer.reset_retained()
+        assert 'circle' not in self.viewer.retained_shapes
+
+    def test_transform(self):
+        """Moving a dynamic shape writes its transformed vertices, static shapes can't be moved."""
+        shape = self.viewer.make_shape([(1, 0), (0, 1), (-1, 0)], color=(1, 0, 0))
+        shape.set_transform((10, 20), np.pi / 2)
+        v = np.reshape(shape.fill.vertices[:], (-1, 2))
+        assert np.allclose(v, [(10, 21), (9, 20), (10, 19)])
+
+        static = self.viewer.make_shape([(1, 0), (0, 1), (-1, 0)], color=(1, 0, 0), dynamic=False)
+        with pytest.raises(ValueError):
+            static.set_transform((1, 1))
+
+    def test_render(self):
+        """The shapes of an episode are uploaded once, and replaced when the env is reset."""
+        self.env.objects = [StaticObstacle((10, 10), 3)]
+        for _ in range(3):
+            self.env.step([0.5, 0])
+            self.env.render()
+        shapes = dict(self.viewer.retained_shapes)
+        self.env.step([0.5, 0])
+        self.env.render()
+        assert all(self.viewer.retained_shapes[k] is s for k, s in shapes.items())
+
+        self.env.reset()
+        self.env.render()
+        assert not any(self.viewer.retained_shapes.get(k) is s for k, s in shapes.items())
+
+
+    def test_removed_objects(self):
+        """The shape of an object that is no longer drawn is deleted, and doesn't keep the object alive."""
+        import gc
+        import weakref
+        obstacle = StaticObstacle((10, 10), 3)
+        self.env.objects = [obstacle, StaticObstacle((-10, 10), 3)]
+        self.env.step([0.5, 0])
+        self.env.render()
+        shape = self.viewer.retained_shapes[obstacle]
+        ref = weakref.ref(obstacle)
+
+        self.env.objects = self.env.objects[1:]
+        del obstacle
+        self.env.step([0.5, 0])
+        self.env.render()
+        assert shape.fill is None and shape.outline is None     # Deleted
+        assert len([k for k in self.viewer.retained_shapes if isinstance(k, StaticObstacle)]) == 1
+        gc.collect()
+        assert ref() is None
+
+
+class TestFrameReader:
+    def setup_method(self):
+        self.env = ExampleScenario()
+        self.env.seed(0)
+        self.env.reset()
+        self.viewer = self.env.viewer
+
+    def teardown_method(self):
+        self.env.close()
+
+    def _draw(self, color):
+        """Clears the window to black and its top half to color."""
+        from pyglet import gl
+        w, h = self.viewer.width, self.viewer.height
+        self.viewer.window.switch_to()
+        gl.glClearColor(0, 0, 0, 1)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        gl.glEnable(gl.GL_SCISSOR_TEST)
+        gl.glScissor(0, h // 2, w, h - h // 2)
+        gl.glClearColor(*color, 1)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        gl.glDisable(gl.GL_SCISSOR_TEST)
+
+    def test_read(self):
+        """Frames are flipped views of a reused buffer, with the first row at the top of the window."""
+        reader = self.viewer.frame_reader()
+        self._draw((1, 0, 0))
+        frame = reader.read()
+        assert frame.shape == (self.viewer.height, self.viewer.width, 3)
+        assert np.shares_memory(frame, reader.buffer)
+        assert np.all(frame[0, 0] == (255, 0, 0)) and np.all(frame[-1, 0] == 0)
+
+    def test_viewer_render(self):
+        """Viewer.render() returns the frame through the same reader as get_array()."""
+        frame = self.viewer.render(return_rgb_array=True)
+        assert frame.shape == (self.viewer.height, self.viewer.width, 3) and frame.dtype == np.uint8
+        assert np.shares_memory(frame, self.viewer.frame_reader().buffer)
+        assert np.all(frame == 255)     # Cleared to white
+
+    def test_async(self):
+        """read_async() returns the frame started by the previous call, and flush() the last one."""
+        reader = self.viewer.frame_reader()
+        colors = [(1, 0, 0), (0, 1, 0), (0, 0, 1)]
+        frames = []
+        for c in colors:
+            self._draw(c)
+            frame = reader.read_async()
+            frames.append(None if frame is None else frame[0, 0].copy())
+        frames.append(reader.flush()[0, 0].copy())
+        assert frames[0] is None
+        for frame, c in zip(frames[1:], colors):
+            assert np.array_equal(frame, 255 * np.array(c))
+        assert reader.flush() is None
+
+    def test_async_render(self):
+        """With async_readback, render('rgb_array') returns the same frames one call later, in order."""
+        def frames(async_readback):
+            env = ExampleScenario()
+            env.seed(0)
+            env.async_readback = async_readback
+            env.reset()
+            result = []
+            for _ in range(4):
+                env.step([1, 0.3])
+                frame = env.render(mode='rgb_array')
+                result.append(None if frame is None else frame.copy())
+            result.append(env.flush_frame())
+            assert env.flush_frame() is None
+            env.close()
+            return result
+
+        expected, delayed = frames(False)[:-1], frames(True)
+        assert delayed[0] is None
+        assert not np.array_equal(expected[0], expected[-1])
+        for frame, reference in zip(delayed[1:], expected):
+            assert np.array_equal(frame, reference)
@@ -0,0 +1,70 @@
+from gncgym.scheduler import RealTimeScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+    def sleep(self, seconds):
+        self.t += seconds
+
+
+def run(scheduler, clock, seconds, work=0.0):
+    """Runs the loop for the given number of seconds, with each frame taking work seconds to step and draw."""
+    while clock.t < seconds - 1e-9:
+        scheduler.wait()
+        clock.t += work
+
+
+class TestRealTimeScheduler:
+    def make(self, **kwargs):
+        clock = FakeClock()
+        return RealTimeScheduler(0.05, clock=clock, sleep=clock.sleep, **kwargs), clock
+
+    def test_real_time(self):
+        """The simulation follows the clock, and frames are only drawn when a step was taken."""
+        scheduler, clock = self.make(fps=50)
+        run(scheduler, clock, 2.0)
+        assert scheduler.steps in (39, 40)
+        assert scheduler.frames == scheduler.steps
+        assert scheduler.dropped_frames == 0
+
+    def test_fast_forward(self):
+        scheduler, clock = self.make(fps=10, speed=4)
+        run(scheduler, clock, 2.0)
+        assert 159 <= scheduler.steps <= 160
+        assert scheduler.frames <= 20
+
+        # Changing the speed doesn't make the simulation jump
+        steps = scheduler.steps
+        scheduler.speed = 1
+        run(scheduler, clock, 3.0)
+        assert 19 <= scheduler.steps - steps <= 21
+
+    def test_drop_frames(self):
+        """Slow frames are dropped, while the simulation keeps up with the clock."""
+        scheduler, clock = self.make(fps=50)
+        run(scheduler, clock, 2.0, work=0.07)
+        assert 38 <= scheduler.steps <= 41
+        assert scheduler.dropped_frames > 50
+        assert scheduler.lagged_steps == 0
+
+    def test_lag(self):
+        """If the simulation can't keep up, it falls behind instead of trying to catch up."""
+        scheduler, clock = self.make(fps=50, max_steps_per_frame=2)
+        run(scheduler, clock, 2.0, work=0.5)
+        assert scheduler.steps <= 10
+        assert scheduler.lagged_steps > 0
+
+    def test_early_wakeup(self):
+        """Waking up slightly before the frame is due is not counted as a dropped frame."""
+        clock = FakeClock()
+        early = lambda seconds: clock.sleep(seconds - 1e-6)
+        scheduler = RealTimeScheduler(0.05, fps=50, clock=clock, sleep=early)
+        for _ in range(100):
+            scheduler.wait()
+        assert scheduler.dropped_frames == 0
+        assert abs(clock.t - 99 / 50) < 1e-3
@@ -0,0 +1,153 @@
+import gc
+import numpy as np
+import pytest
+import gncgym.simulator as sim
+from gncgym.simulator.blocks import make_integrator_block, make_ode_block
+from gncgym.simulator.solvers import make_solver
+from gncgym.scenarios.example_scenarios import ExampleScenario
+
+
+class TestSimContext:
+    def test_contexts_have_separate_clocks(self):
+        """Stepping one context must not advance the clock of another."""
+        ctx1 = sim.SimContext(solver='fixed_step', step_size=0.05)
+        ctx2 = sim.SimContext(solver='fixed_step', step_size=0.1)
+        for _ in range(10):
+            ctx1.step()
+        ctx2.step()
+        assert abs(ctx1.time - 0.5) < 1e-9
+        assert abs(ctx2.time - 0.1) < 1e-9
+
+    def test_blocks_use_their_own_context(self):
+        ctx1 = sim.SimContext(solver='fixed_step', step_size=0.05)
+        ctx2 = sim.SimContext(solver='fixed_step', step_size=0.5)
+        integrate1 = make_integrator_block(np.zeros(2), ctx=ctx1)
+        integrate2 = make_integrator_block(np.zeros(2), ctx=ctx2)
+        x1 = integrate1(np.ones(2))
+        x2 = integrate2(np.ones(2))
+        assert np.allclose(x1, 0.05)
+        assert np.allclose(x2, 0.5)
+
+    def test_envs_run_side_by_side(self):
+        """Two envs stepped in lockstep must give the same results as when run one after the other."""
+        env1, env2 = ExampleScenario(), ExampleScenario()
+        env1.seed(1)
+        env2.seed(1)
+        env1.reset()
+        env2.reset()
+        action = [1, 0.2]
+        side_by_side = []
+        for _ in range(20):
+            obs1, _, _, _ = env1.step(action)
+            obs2, _, _, _ = env2.step(action)
+            side_by_side.append(obs1)
+            assert np.allclose(obs1, obs2)
+        assert env1.sim_context is not env2.sim_context
+        assert abs(env1.sim_context.time - env2.sim_context.time) < 1e-9
+
+        env3 = ExampleScenario()
+        env3.seed(1)
+        env3.reset()
+        for obs in side_by_side:
+            assert np.allclose(env3.step(action)[0], obs)
+
+
+class TestBlockRegistry:
+    def setup_method(self):
+        self.ctx = sim.SimContext(solver='fixed_step', step_size=0.1)
+
+    def test_ids(self):
+        blocks = [make_ode_block(decay, np.zeros(1), ctx=self.ctx) for _ in range(3)]
+        assert sorted(self.ctx.blocks) == ['ode_block0', 'ode_block1', 'ode_block2']
+        assert all(self.ctx.blocks['ode_block{}'.format(i)].block is b for i, b in enumerate(blocks))
+
+    def test_dropped_blocks_are_forgotten(self):
+        keep = make_ode_block(decay, np.zeros(1), ctx=self.ctx)
+        make_ode_block(decay, np.zeros(1), ctx=self.ctx)
+        gc.collect()
+        assert list(self.ctx.blocks) == ['ode_block0']
+        assert self.ctx.blocks['ode_block0'].block is keep
+
+    def test_memory(self):
+        integrate = make_ode_block(decay, np.zeros(1000), ctx=self.ctx)
+        assert self.ctx.block_memory()['ode_block0'] >= integrate.state.nbytes
+
+    def test_init_and_close_clear(self):
+        integrate = make_ode_block(decay, np.zeros(1), ctx=self.ctx)
+        data = self.ctx.blocks['ode_block0']
+        self.ctx.init(solver='fixed_step', step_size=0.1)
+        assert self.ctx.blocks == {} and not data.alive
+        new = make_ode_block(decay, np.zeros(1), ctx=self.ctx)
+        del integrate
+        gc.collect()    # The old block had the same id, but must not remove the new one
+        assert self.ctx.blocks['ode_block0'].block is new
+        self.ctx.close()
+        assert self.ctx.blocks == {} and self.ctx.block_memory() == {}
+        assert np.allclose(new(0.0), 0)     # Blocks still work, they are only no longer tracked
+
+    def test_bounded_over_resets(self):
+        env = ExampleScenario(headless=True)
+        env.seed(0)
+        env.reset()
+        num_blocks = len(env.sim_context.blocks)
+        assert num_blocks > 0
+        for _ in range(20):
+            env.reset()
+            env.step([0.5, 0])
+        assert len(env.sim_context.blocks) == num_blocks
+        env.close()
+        assert env.sim_context.blocks == {}
+
+
+def decay(x, u):
+    return -x + u
+
+
+def oscillator(x, u):
+    """Undamped harmonic oscillator with the state ordered as [position, velocity]"""
+    return np.array([x[1], -x[0]])
+
+
+class TestSolvers:
+    def test_unknown_solver_raises(self):
+        with pytest.raises(ValueError):
+            sim.SimContext(solver='leapfrog', step_size=0.1)
+
+    @pytest.mark.parametrize('solver, tol', [
+        ('fixed_step', 5e-2), ('rk4', 1e-6), ('dopri5', 1e-6)])
+    def test_accuracy_on_linear_decay(self, solver, tol):
+        ctx = sim.SimContext(solver=solver, step_size=0.1)
+        integrate = make_ode_block(decay, np.array([1.0]), ctx=ctx)
+        for _ in range(10):
+            x = integrate(0.0)
+        assert abs(float(x) - np.exp(-1)) < tol
+
+    def test_higher_order_solvers_allow_larger_steps(self):
+        """rk4 at 10x the step size must still beat forward Euler."""
+        x0 = np.array([1.0, 0.0])
+        euler, rk4 = make_solver('fixed_step'), make_solver('rk4')
+        x_euler, x_rk4 = x0.copy(), x0.copy()
+        for _ in range(100):
+            x_euler = euler(oscillator, x_euler, None, 0.01)
+        for _ in range(10):
+            x_rk4 = rk4(oscillator, x_rk4, None, 0.1)
+        exact = np.array([np.cos(1), -np.sin(1)])
+        assert np.linalg.norm(x_rk4 - exact) < np.linalg.norm(x_euler - exact)
+
+    def test_semi_implicit_euler_conserves_energy(self):
+        x = np.array([1.0, 0.0])
+        step = make_solver('semi_implicit_euler')
+        for _ in range(10000):
+            x = step(oscillator, x, None, 0.1)
+        assert abs(0.5 * (x[0]**2 + x[1]**2) - 0.5) < 0.05
+
+    def test_env_runs_with_every_solver(self):
+        for solver in ('semi_implicit_euler', 'rk4', 'dopri5'):
+            env = ExampleScenario()
+            env.sim_solver = solver
+            env.sim_step_size = 0.2
+            env.seed(3)
+            env.reset()
+            for _ in range(10):
+                obs, _, _, _ = env.step([1, 0.1])
+            assert np.all(np.isfinite(obs))
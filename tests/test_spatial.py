@@ -0,0 +1,65 @@
+import numpy as np
+from gncgym.spatial import ObstacleIndex, assign_slots
+from gncgym.base_env.objects import StaticObstacle
+
+
+def make_obstacles(positions):
+    return [StaticObstacle(position=p, radius=1) for p in positions]
+
+
+class TestObstacleIndex:
+    def test_query_matches_brute_force(self):
+        rng = np.random.RandomState(0)
+        positions = rng.uniform(-500, 500, (300, 2))
+        points = rng.uniform(-500, 500, (20, 2))
+        for static in (True, False):
+            index = ObstacleIndex(static=static)
+            index.update(make_obstacles(positions))
+            distances, indices = index.query(points, k=5)
+            d = np.linalg.norm(points[:, None] - positions[None], axis=2)
+            assert np.allclose(distances, np.sort(d, axis=1)[:, :5])
+            assert np.allclose(np.take_along_axis(d, indices, axis=1), distances)
+
+    def test_missing_neighbours(self):
+        for static in (True, False):
+            index = ObstacleIndex(static=static)
+            index.update(make_obstacles([(0, 0), (100, 0)]))
+            distances, indices = index.query(np.array([1.0, 0.0]), k=3, max_distance=50)
+            assert np.allclose(distances[0], 1) and indices[0] == 0
+            assert np.all(np.isinf(distances[1:])) and np.all(indices[1:] == 2)
+
+    def test_rebuilt_only_when_obstacles_change(self):
+        obstacles = make_obstacles([(0, 0), (10, 0)])
+        index = ObstacleIndex()
+        index.update(obstacles)
+        tree = index._tree
+        index.update(obstacles)
+        assert index._tree is tree
+
+        obstacles.append(StaticObstacle(position=(5, 5), radius=1))
+        index.update(obstacles)
+        assert index._tree is not tree and len(index) == 3
+
+
+class TestAssignSlots:
+    def test_nearest_get_lowest_free_slots(self):
+        index = ObstacleIndex()
+        index.update(make_obstacles([(30, 0), (10, 0), (20, 0), (500, 0)]))
+        active = assign_slots({}, index, (0, 0), num_slots=2, max_distance=150, release_distance=160)
+        assert active == {1: 0, 2: 1}
+
+    def test_closer_obstacle_takes_slot_of_furthest(self):
+        obstacles = make_obstacles([(10, 0), (20, 0), (100, 0)])
+        index = ObstacleIndex()
+        index.update(obstacles)
+        active = {2: 0, 1: 1}
+        assign_slots(active, index, (0, 0), num_slots=2, max_distance=150, release_distance=160)
+        assert active == {1: 1, 0: 0}
+
+    def test_release_with_hysteresis(self):
+        index = ObstacleIndex()
+        index.update(make_obstacles([(155, 0)]))
+        active = assign_slots({0: 3}, index, (0, 0), num_slots=4, max_distance=150, release_distance=157.5)
+        assert active == {0: 3}
+        assign_slots(active, index, (-5, 0), num_slots=4, max_distance=150, release_distance=157.5)
+        assert active == {}
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from multiprocessing import shared_memory
+from gncgym.base_env.vector import VectorScenario
+from gncgym.base_env.subproc import SubprocVectorScenario
+from gncgym.scenarios.example_scenarios import ExampleScenario
+from gncgym.objectives.pathfollowing import OBS_SIZE
+
+
+class TestVectorScenario:
+    @pytest.mark.parametrize('num_envs', [1, 2, 4])
+    def test_matches_single_envs(self, num_envs):
+        """Each env of the vector must follow the same trajectory as a single env with the same seed."""
+        vec = VectorScenario(ExampleScenario, num_envs, seed=10)
+        envs = [ExampleScenario() for _ in range(num_envs)]
+        for i, env in enumerate(envs):
+            env.seed(10 + i)
+
+        obs = vec.reset()
+        assert obs.shape == (num_envs, OBS_SIZE)
+        assert np.allclose(obs, [env.reset() for env in envs], atol=1e-3)
+
+        actions = np.tile([1, 0.1], (num_envs, 1))
+        for _ in range(100):
+            obs, rewards, dones, infos = vec.step(actions)
+            results = [env.step(a) for env, a in zip(envs, actions)]
+            assert np.allclose(obs, [r[0] for r in results], atol=1e-2)
+            assert np.allclose(rewards, [r[1] for r in results], atol=1e-2)
+            assert np.array_equal(dones, [r[2] for r in results])
+
+    def test_finished_envs_are_reset(self):
+        vec = VectorScenario(ExampleScenario, 2, seed=3)
+        vec.reset()
+        vec.objective.reward[0] = -100
+        obs, rewards, dones, infos = vec.step(np.zeros((2, 2)))
+
+        assert dones[0] and not dones[1]
+        assert 'terminal_observation' in infos[0]
+        assert 'terminal_observation' not in infos[1]
+        assert vec.objective.reward[0] > -50
+        assert not np.allclose(obs[0], infos[0]['terminal_observation'])
+
+
+    def test_windowed_projection(self, monkeypatch):
+        """Searching around the previous projection finds the same points as searching the whole table."""
+        import gncgym.objectives.pathfollowing as pf
+        from types import SimpleNamespace
+        from gncgym.reference_generation.parametrised_curves import ParamCurve
+
+        # A figure of eight, which crosses itself at the origin
+        t = np.linspace(0, 2 * np.pi, 40)
+        path = ParamCurve([100 * np.sin(t), 50 * np.sin(2 * t)], cache=None)
+        objective, obj = pf.PathFollowing(), SimpleNamespace()
+        objective.init_objective_batch(obj, 500)
+        obj.path_table[:], obj.path_table_angles[:], obj.path_table_ds[:] = pf.make_path_table(path)
+        obj.path_length[:] = path.length
+
+        rng = np.random.RandomState(0)
+        obj.s[:] = rng.uniform(0, path.length, 500)
+        near = np.transpose(np.reshape(path(obj.s + rng.uniform(-5, 5, 500)), (2, -1)))
+        points = np.concatenate([near[:250] + rng.normal(0, 3, (250, 2)), rng.uniform(-120, 120, (250, 2))])
+
+        s = objective._closest_s_batch(obj, slice(None), points)
+        monkeypatch.setattr(pf, 'PROJECTION_WINDOW', pf.PATH_TABLE_SIZE)
+        assert np.allclose(s, objective._closest_s_batch(obj, slice(None), points))
+
+
+class TestSubprocVectorScenario:
+    def test_matches_single_envs(self):
+        """Three envs on two workers must step exactly like three single envs with the same seeds."""
+        vec = SubprocVectorScenario(ExampleScenario, 3, num_workers=2, seed=5)
+        envs = [ExampleScenario() for _ in range(3)]
+        for i, env in enumerate(envs):
+            env.seed(5 + i)
+        try:
+            assert np.array_equal(vec.reset(), [env.reset() for env in envs])
+            actions = np.tile([1, 0.1], (3, 1))
+            for _ in range(20):
+                obs, rewards, dones, infos = vec.step(actions)
+                results = [env.step(a) for env, a in zip(envs, actions)]
+                assert np.array_equal(obs, [r[0] for r in results])
+                assert np.array_equal(rewards, [r[1] for r in results])
+                assert not dones.any()
+        finally:
+            vec.close()
+
+    def test_close_releases_workers_and_memory(self):
+        vec = SubprocVectorScenario(ExampleScenario, 2, num_workers=2, seed=0)
+        vec.reset()
+        name = vec._shm.name
+        vec.close()
+        assert not any(p.is_alive() for p in vec._procs)
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)